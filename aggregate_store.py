@@ -0,0 +1,137 @@
+"""
+Incremental aggregation store for button analytics
+Keeps per-day, per-button partial aggregates in SQLite so recurring runs only
+fetch days that are missing or still open to late-arriving GA4 data. Days are
+keyed by their data source too, so aggregates of one source (a GA4 endpoint,
+the collector log) are never served for another
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional
+
+DEFAULT_STORE_PATH = 'button_aggregates.db'
+
+# GA4 keeps processing events for a few days; days inside this window are refetched
+DEFAULT_LOOKBACK_DAYS = 3
+
+PARTIAL_FIELDS = ('clicks', 'hovers', 'hover_duration_sum', 'engagement_sum')
+# Quantile and HyperLogLog sketches are stored as JSON text next to the sums, with their empty values
+SKETCH_FIELDS = {
+    'hover_duration_sketch': '{}',
+    'engagement_sketch': '{}',
+    'visitor_hll': '""',
+    'clicker_hll': '""',
+    'session_hll': '""'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS aggregated_days (
+    property_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    day TEXT NOT NULL,
+    total_events INTEGER NOT NULL,
+    pages INTEGER NOT NULL,
+    is_final INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (property_id, source, day)
+);
+CREATE TABLE IF NOT EXISTS daily_aggregates (
+    property_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    day TEXT NOT NULL,
+    button_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    clicks INTEGER NOT NULL,
+    hovers INTEGER NOT NULL,
+    hover_duration_sum REAL NOT NULL,
+    engagement_sum REAL NOT NULL,
+    hover_duration_sketch TEXT NOT NULL DEFAULT '{}',
+    engagement_sketch TEXT NOT NULL DEFAULT '{}',
+    visitor_hll TEXT NOT NULL DEFAULT '""',
+    clicker_hll TEXT NOT NULL DEFAULT '""',
+    session_hll TEXT NOT NULL DEFAULT '""',
+    PRIMARY KEY (property_id, source, day, button_id)
+);
+"""
+
+def is_final_day(day: str, lookback_days: int = DEFAULT_LOOKBACK_DAYS, today: Optional[datetime] = None) -> bool:
+    """A day is final once it is older than the late-data lookback window"""
+    today = (today or datetime.now(timezone.utc)).date()
+    return datetime.strptime(day, "%Y-%m-%d").date() < today - timedelta(days=lookback_days)
+
+class AggregateStore:
+    """SQLite-backed store of fetch_ga4_aggregates results, one entry per property and day"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get('AGGREGATE_STORE_PATH', DEFAULT_STORE_PATH)
+        with closing(self._connect()) as conn:
+            # Days stored before the source was recorded may hold mock data; they are refetched
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(aggregated_days)")}
+            if columns and 'source' not in columns:
+                conn.executescript("DROP TABLE aggregated_days; DROP TABLE IF EXISTS daily_aggregates;")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def days_to_fetch(self, property_id: str, source: str, days: List[str]) -> List[str]:
+        """Days that have no stored aggregates yet or were stored before they were final"""
+        with closing(self._connect()) as conn:
+            final = {
+                row[0] for row in conn.execute(
+                    f"SELECT day FROM aggregated_days WHERE property_id = ? AND source = ? AND is_final = 1 "
+                    f"AND day IN ({','.join('?' * len(days))})",
+                    [property_id, source, *days]
+                )
+            }
+        return [day for day in days if day not in final]
+
+    def save_day(self, property_id: str, source: str, day: str, result: Dict[str, Any], is_final: bool):
+        """Replace the stored aggregates of one day atomically"""
+        partials = result.get("partials", {})
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM daily_aggregates WHERE property_id = ? AND source = ? AND day = ?",
+                         (property_id, source, day))
+            conn.executemany(
+                f"INSERT INTO daily_aggregates (property_id, source, day, button_id, position, "
+                f"{', '.join((*PARTIAL_FIELDS, *SKETCH_FIELDS))}) "
+                f"VALUES ({', '.join('?' * (5 + len(PARTIAL_FIELDS) + len(SKETCH_FIELDS)))})",
+                [
+                    (property_id, source, day, button_id, position, *(group[field] for field in PARTIAL_FIELDS),
+                     *(json.dumps(group[field]) if field in group else empty for field, empty in SKETCH_FIELDS.items()))
+                    for position, (button_id, group) in enumerate(partials.items())
+                ]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO aggregated_days "
+                "(property_id, source, day, total_events, pages, is_final, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (property_id, source, day, result.get("total_events", 0), result.get("pages", 0), int(is_final),
+                 datetime.now(timezone.utc).isoformat())
+            )
+
+    def load_days(self, property_id: str, source: str, days: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored results for the requested days, shaped like fetch_ga4_aggregates output"""
+        placeholders = ','.join('?' * len(days))
+        with closing(self._connect()) as conn:
+            results = {
+                day: {"partials": {}, "total_events": total_events, "pages": pages}
+                for day, total_events, pages in conn.execute(
+                    f"SELECT day, total_events, pages FROM aggregated_days "
+                    f"WHERE property_id = ? AND source = ? AND day IN ({placeholders})",
+                    [property_id, source, *days]
+                )
+            }
+            rows = conn.execute(
+                f"SELECT day, button_id, {', '.join((*PARTIAL_FIELDS, *SKETCH_FIELDS))} FROM daily_aggregates "
+                f"WHERE property_id = ? AND source = ? AND day IN ({placeholders}) ORDER BY day, position",
+                [property_id, source, *days]
+            )
+            for day, button_id, *values in rows:
+                group = dict(zip(PARTIAL_FIELDS, values))
+                group.update((field, json.loads(value)) for field, value in zip(SKETCH_FIELDS, values[len(PARTIAL_FIELDS):]))
+                results[day]["partials"][button_id] = group
+        return results
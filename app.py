@@ -1,90 +1,228 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 import os
-import asyncio
-from workflow_trigger import trigger_button_analysis
+import threading
+from temporalio.service import RPCError, RPCStatusCode
+from workflow_trigger import get_temporal_runner, get_workflow_status, start_button_analysis
+from event_log import EventLog, MAX_BATCH_BYTES, parse_event_batch, property_log_dir
+from response_cache import VersionedBodyCache, send_cached
+from insights_store import InsightsStore, parse_time
+from fetch_cache import get_fetch_cache
+from instrumentation import CONTENT_TYPE, REGISTRY, instrument_flask
+from assets import ASSET_URL_PREFIX, AssetPipeline
+from variants import PrerenderedPages, variant_names
+from live_aggregates import LiveAggregator
+from assignment import COOKIE_MAX_AGE, VARIANT_COOKIE, VISITOR_COOKIE, VariantAssigner
 
 app = Flask(__name__)
+instrument_flask(app)
+REGISTRY.add_collector(lambda: get_fetch_cache().metrics_lines())
+
+# Minified, fingerprinted and precompressed CSS/JS (assets.py), rebuilt when a source changes
+asset_pipeline = AssetPipeline(app.static_folder)
+app.jinja_env.globals.update(asset_url=asset_pipeline.url, stylesheet=asset_pipeline.stylesheet)
 
 # GA4 Configuration
 GA4_MEASUREMENT_ID = os.environ.get('GA4_MEASUREMENT_ID', 'G-JHSVNWL6QH')  
 
+# Insights history, opened on first use; the latest run is cached until a newer one lands
+_insights_store = None
+_insights_store_lock = threading.Lock()
+
+def get_insights_store():
+    global _insights_store
+    if _insights_store is None:
+        with _insights_store_lock:
+            if _insights_store is None:
+                _insights_store = InsightsStore()
+    return _insights_store
+
+# Only this site's runs: batch analyses store other properties in the same history
+insights_cache = VersionedBodyCache(lambda: get_insights_store().latest_run_id(GA4_MEASUREMENT_ID),
+                                    lambda: get_insights_store().latest_run(GA4_MEASUREMENT_ID), name='insights')
+
+# First-party event log, opened on the first collected batch
+_event_log = None
+_event_log_lock = threading.Lock()
+
+def get_event_log():
+    global _event_log
+    if _event_log is None:
+        with _event_log_lock:
+            if _event_log is None:
+                _event_log = EventLog(property_log_dir(GA4_MEASUREMENT_ID))
+    return _event_log
+
+# Live counters fed by the collector; per process, unlike the workflow's insights
+live_aggregates = LiveAggregator()
+
+# Landing pages and the dashboard, rendered once per template/asset change and served from memory
+pages = PrerenderedPages(app, lambda page: {'ga4_measurement_id': GA4_MEASUREMENT_ID, 'page_variant': page.name},
+                         extra_version_fn=asset_pipeline.sources_mtime)
+
+def latest_run_metrics():
+    store = get_insights_store()
+    return store.latest_run_id(GA4_MEASUREMENT_ID), store.latest_metrics(GA4_MEASUREMENT_ID)
+
+# Which variant `/` shows each visitor, reweighted toward the better variants as insights land
+assigner = VariantAssigner(variant_names(), latest_run_metrics)
+
 @app.route('/')
-def home():
-    return render_template('index.html', 
-                          ga4_measurement_id=GA4_MEASUREMENT_ID,
-                          page_variant='original')
-
-@app.route('/colors')
-def colors():
-    return render_template('colors.html', 
-                          ga4_measurement_id=GA4_MEASUREMENT_ID,
-                          page_variant='colors')
-
-@app.route('/sizes')
-def sizes():
-    return render_template('sizes.html', 
-                          ga4_measurement_id=GA4_MEASUREMENT_ID,
-                          page_variant='sizes')
-
-@app.route('/spacing')
-def spacing():
-    return render_template('spacing.html', 
-                          ga4_measurement_id=GA4_MEASUREMENT_ID,
-                          page_variant='spacing')
-
-@app.route('/typography')
-def typography():
-    return render_template('typography.html', 
-                          ga4_measurement_id=GA4_MEASUREMENT_ID,
-                          page_variant='typography')
-
-# Temporal Workflow Endpoints
+def landing():
+    """Experiment entry: the visitor's assigned variant, sticky through cookies"""
+    visitor_id, variant = assigner.assign(request.cookies.get(VISITOR_COOKIE), request.cookies.get(VARIANT_COOKIE))
+    page = next(page for page in pages.pages if page.name == variant)
+    # The body depends on the visitor's cookies, so shared caches must not store it
+    response = send_cached(pages.caches[page.endpoint].get(), 'text/html', cache_control='private, no-cache')
+    response.vary.add('Cookie')
+    for name, value in ((VISITOR_COOKIE, visitor_id), (VARIANT_COOKIE, variant)):
+        if request.cookies.get(name) != value:
+            response.set_cookie(name, value, max_age=COOKIE_MAX_AGE, samesite='Lax', httponly=True)
+    return response
+
+@app.route('/api/allocation', methods=['GET'])
+def variant_allocation():
+    """Current traffic share of each landing variant and the insights run it came from"""
+    allocation = assigner.allocation
+    return jsonify({
+        'status': 'success',
+        'shares': allocation.shares,
+        'run_id': allocation.run_id,
+        'updated_at': allocation.updated_at
+    })
+
 @app.route('/api/analyze-buttons', methods=['POST'])
 def analyze_buttons():
-    """Trigger button analytics workflow"""
+    """Start the button analytics workflow and return its id without waiting for it"""
     try:
-        days_back = request.json.get('days_back', 7) if request.is_json else 7
+        body = request.json if request.is_json else {}
+        days_back = body.get('days_back', 7)
+        # "profile": true (or a list of activity names) profiles this run on the worker
+        profile = body.get('profile')
         
-        # Run the workflow asynchronously
-        result = asyncio.run(trigger_button_analysis(GA4_MEASUREMENT_ID, days_back))
+        # Start through the shared client; the run itself happens on the workers
+        args = (GA4_MEASUREMENT_ID, days_back) + ((profile,) if profile else ())
+        workflow_id = get_temporal_runner().run(start_button_analysis, *args)
         
         return jsonify({
             'status': 'success',
             'message': 'Button analysis workflow started',
-            'workflow_id': result.get('workflow_id', 'unknown'),
-            'results': result
-        })
+            'workflow_id': workflow_id,
+            'status_url': f'/api/workflows/{workflow_id}'
+        }), 202
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Failed to start workflow: {str(e)}'
         }), 500
 
+@app.route('/api/workflows/<workflow_id>', methods=['GET'])
+def workflow_status(workflow_id):
+    """Status, per-step progress and result of a workflow run"""
+    try:
+        return jsonify(get_temporal_runner().run(get_workflow_status, workflow_id))
+    except RPCError as e:
+        if e.status == RPCStatusCode.NOT_FOUND:
+            return jsonify({
+                'status': 'not_found',
+                'message': f'Unknown workflow: {workflow_id}'
+            }), 404
+        return jsonify({
+            'status': 'error',
+            'message': f'Failed to get workflow status: {str(e)}'
+        }), 500
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Failed to get workflow status: {str(e)}'
+        }), 500
+
+@app.route('/api/events', methods=['POST'])
+def collect_events():
+    """First-party collector for batched events sent with navigator.sendBeacon"""
+    if request.content_length and request.content_length > MAX_BATCH_BYTES:
+        return jsonify({'status': 'error', 'message': 'Payload too large'}), 413
+    try:
+        events = parse_event_batch(request.get_data(cache=False))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    get_event_log().append(events)
+    live_aggregates.record(events)
+    return '', 204
+
+@app.route('/api/live', methods=['GET'])
+def live_snapshot():
+    """Sliding-window counts of the events this process collected (5m, 1h, 24h)"""
+    return Response(live_aggregates.snapshot_json(), mimetype='application/json')
+
+@app.route('/api/live/stream', methods=['GET'])
+def live_stream():
+    """Server-Sent Events feed of the live aggregates, pushed as events arrive"""
+    stream = live_aggregates.open_stream()
+    if stream is None:
+        # Every open stream holds a server thread; refuse instead of starving other requests
+        response = jsonify({'status': 'error', 'message': 'Too many live streams, retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    response = Response(stream_with_context(stream), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Proxies such as nginx must pass events through instead of buffering them
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/button-insights', methods=['GET'])
 def get_button_insights():
-    """Get latest button insights from analysis"""
+    """Latest button insights (cached, with ETag/304 support), or run history with ?from=&to=&variant=&property="""
+    if any(key in request.args for key in ('from', 'to', 'variant', 'property')):
+        return query_button_insights()
     try:
-        import json
-        with open('button_insights.json', 'r') as f:
-            insights = json.load(f)
-        return jsonify(insights)
-    except FileNotFoundError:
-        return jsonify({
-            'status': 'no_data',
-            'message': 'No button insights available yet. Run analysis first.'
-        }), 404
+        entry = insights_cache.get()
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Failed to load insights: {str(e)}'
         }), 500
+    if entry is None:
+        return jsonify({
+            'status': 'no_data',
+            'message': 'No button insights available yet. Run analysis first.'
+        }), 404
+    return send_cached(entry, 'application/json')
+
+def query_button_insights():
+    """Insights runs in a time range, served from the store's indexes"""
+    try:
+        start = parse_time(request.args['from']) if 'from' in request.args else None
+        end = parse_time(request.args['to'], end_of_day=True) if 'to' in request.args else None
+        limit = min(int(request.args.get('limit', 500)), 5000)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid query: {str(e)}'}), 400
+
+    runs = get_insights_store().query_runs(
+        start=start,
+        end=end,
+        variant=request.args.get('variant'),
+        property_id=request.args.get('property'),
+        limit=limit
+    )
+    return jsonify({'status': 'success', 'runs': runs})
+
+@app.route('/api/fetch-cache', methods=['GET'])
+def fetch_cache_stats():
+    """Hit/miss counters and size of the GA4 fetch cache shared with the worker"""
+    return jsonify({'status': 'success', 'fetch_cache': get_fetch_cache().stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics of this Flask process (the worker serves its own on WORKER_METRICS_PORT)"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
-@app.route('/analytics')
-def analytics_dashboard():
-    """Analytics dashboard page"""
-    return render_template('analytics.html', 
-                          ga4_measurement_id=GA4_MEASUREMENT_ID,
-                          page_variant='analytics')
+@app.route(f'{ASSET_URL_PREFIX}/<path:filename>')
+def built_asset(filename):
+    """Fingerprinted asset, precompressed and cacheable forever"""
+    return asset_pipeline.send(filename)
 
 if __name__ == '__main__':
+    pages.warm()
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
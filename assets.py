@@ -0,0 +1,324 @@
+"""
+Static asset pipeline for the landing pages
+The variant stylesheets are full copies of style.css with a few changed
+declarations. The build reduces each one to a delta that is applied after the
+shared base, minifies the CSS, and fingerprints every file by content hash. It
+also pregenerates gzip files, and brotli files when the optional `brotli`
+package is installed.
+Fingerprinted files never change, so they are served from /assets/ with an
+immutable Cache-Control; small deltas are inlined into the page instead of
+costing a request
+
+    python assets.py          # build into ASSET_BUILD_DIR (dist/assets by default)
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from markupsafe import Markup, escape
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_STYLESHEET = 'css/style.css'
+SOURCE_DIRS = ('css', 'js')
+ASSET_URL_PREFIX = '/assets'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Deltas up to this size are inlined into the page rather than linked
+INLINE_MAX_BYTES = 1024
+MANIFEST_NAME = 'manifest.json'
+
+# At-rules whose body holds rules rather than declarations
+NESTED_AT_RULES = ('@media', '@supports', '@container')
+
+def default_build_dir() -> str:
+    return os.environ.get('ASSET_BUILD_DIR', os.path.join('dist', 'assets'))
+
+# CSS parsing and minification
+
+@dataclass
+class Rule:
+    """A style rule (declarations), a nested at-rule (rules) or an atomic at-rule such as @keyframes (text)"""
+    prelude: str
+    declarations: Optional[List[Tuple[str, str]]] = None
+    rules: Optional[List["Rule"]] = None
+    text: Optional[str] = None
+
+def _squash(text: str) -> str:
+    return ' '.join(text.split())
+
+def parse_css(css: str) -> List[Rule]:
+    """Parse a stylesheet into rules; enough CSS for hand-written stylesheets, not a validator"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    rules, position = [], 0
+    while True:
+        open_brace = css.find('{', position)
+        if open_brace < 0:
+            break
+        depth, end = 1, open_brace + 1
+        while depth:
+            if end >= len(css):
+                raise ValueError("Unbalanced braces in stylesheet")
+            depth += {'{': 1, '}': -1}.get(css[end], 0)
+            end += 1
+        prelude, body = _squash(css[position:open_brace]), css[open_brace + 1:end - 1]
+        if prelude.startswith(NESTED_AT_RULES):
+            rules.append(Rule(prelude, rules=parse_css(body)))
+        elif prelude.startswith('@'):
+            rules.append(Rule(prelude, text=minify_css(body)))
+        else:
+            rules.append(Rule(prelude, declarations=_parse_declarations(body)))
+        position = end
+    return rules
+
+def _parse_declarations(body: str) -> List[Tuple[str, str]]:
+    declarations = []
+    for declaration in body.split(';'):
+        name, colon, value = declaration.partition(':')
+        if colon and name.strip():
+            declarations.append((name.strip().lower(), _squash(value)))
+    return declarations
+
+def _minify_prelude(prelude: str) -> str:
+    prelude = re.sub(r'\s*([,>+~])\s*', r'\1', prelude)
+    return re.sub(r'\(\s*([\w-]+)\s*:\s*', r'(\1:', prelude)
+
+def _minify_value(value: str) -> str:
+    value = re.sub(r'\s*,\s*', ',', value)
+    return re.sub(r'(?<![\w.])0\.(\d)', r'.\1', value)
+
+def serialize_css(rules: List[Rule]) -> str:
+    """Minified CSS for parsed rules"""
+    parts = []
+    for rule in rules:
+        prelude = _minify_prelude(rule.prelude)
+        if rule.rules is not None:
+            parts.append(f"{prelude}{{{serialize_css(rule.rules)}}}")
+        elif rule.text is not None:
+            parts.append(f"{prelude}{{{rule.text}}}")
+        elif rule.declarations:
+            body = ';'.join(f"{name}:{_minify_value(value)}" for name, value in rule.declarations)
+            parts.append(f"{prelude}{{{body}}}")
+    return ''.join(parts)
+
+def minify_css(css: str) -> str:
+    return serialize_css(parse_css(css))
+
+# Variant deltas
+
+def _property_family(name: str) -> str:
+    """padding-top -> padding, -webkit-background-clip -> background: shorthands and longhands interact"""
+    return re.sub(r'^-\w+-', '', name).split('-')[0]
+
+def _flatten(rules: List[Rule], context: Tuple[str, ...] = ()) -> List[Tuple[Tuple, Rule]]:
+    """(key, rule) for every leaf rule in document order; keys count repeats so they stay unique"""
+    flat, seen = [], {}
+    for rule in rules:
+        if rule.rules is not None:
+            flat.extend(_flatten(rule.rules, context + (rule.prelude,)))
+            continue
+        base_key = (context, rule.prelude)
+        seen[base_key] = seen.get(base_key, 0) + 1
+        flat.append((base_key + (seen[base_key],), rule))
+    return flat
+
+def css_delta(base_css: str, variant_css: str) -> Optional[List[Rule]]:
+    """Rules that, appended after base_css, style the page exactly like variant_css alone
+
+    Every changed declaration is emitted, and so is every later declaration of the
+    same property family, so the cascade order among them is preserved. Returns
+    None when the variant drops a rule or declaration of the base, which no
+    appended rule can undo.
+    """
+    base = dict(_flatten(parse_css(base_css)))
+    variant = _flatten(parse_css(variant_css))
+    variant_keys = {key for key, _ in variant}
+    for key, rule in base.items():
+        if key not in variant_keys:
+            return None
+
+    families, first_change, changed_atomic = set(), None, set()
+    for index, (key, rule) in enumerate(variant):
+        base_rule = base.get(key)
+        if rule.text is not None:
+            if base_rule is None or base_rule.text != rule.text:
+                changed_atomic.add(key)
+                first_change = index if first_change is None else first_change
+            continue
+        base_declarations = dict(base_rule.declarations) if base_rule else {}
+        declarations = dict(rule.declarations)
+        if set(base_declarations) - set(declarations):
+            return None
+        changed = {name for name, value in rule.declarations if base_declarations.get(name) != value}
+        if changed:
+            families.update(_property_family(name) for name in changed)
+            first_change = index if first_change is None else first_change
+
+    delta: List[Rule] = []
+    for key, rule in variant[first_change:] if first_change is not None else []:
+        if rule.text is not None:
+            emitted = rule if key in changed_atomic else None
+        else:
+            declarations = [(name, value) for name, value in rule.declarations if _property_family(name) in families]
+            emitted = Rule(rule.prelude, declarations=declarations) if declarations else None
+        if emitted is None:
+            continue
+        context = key[0]
+        # Regroup rules under their @media (etc.) blocks, merging consecutive ones
+        container = delta
+        for prelude in context:
+            if container and container[-1].rules is not None and container[-1].prelude == prelude:
+                container = container[-1].rules
+            else:
+                container.append(Rule(prelude, rules=[]))
+                container = container[-1].rules
+        container.append(emitted)
+    return delta
+
+# Build
+
+def fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def fingerprinted_name(name: str, data: bytes, suffix: str = '') -> str:
+    stem, extension = os.path.splitext(name)
+    return f"{stem}{suffix}.{fingerprint(data)}{extension}"
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def write_compressed(path: str, data: bytes):
+    """Write a file plus its .gz (and .br) variants; compressed files that do not save bytes are skipped"""
+    _write(path, data)
+    encoded = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded['.br'] = brotli.compress(data, quality=11)
+    for extension, body in encoded.items():
+        if len(body) < len(data):
+            _write(path + extension, body)
+
+def _source_files(static_dir: str) -> List[str]:
+    names = []
+    for directory in SOURCE_DIRS:
+        root = os.path.join(static_dir, directory)
+        if os.path.isdir(root):
+            names.extend(f"{directory}/{name}" for name in sorted(os.listdir(root))
+                         if os.path.isfile(os.path.join(root, name)))
+    return names
+
+def build_assets(static_dir: str = 'static', build_dir: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+    """Build every asset under static/css and static/js; returns (and writes) the manifest
+
+    manifest["files"] maps a source name to its fingerprinted file under build_dir,
+    manifest["inline"] maps small variant deltas to their CSS text
+    """
+    build_dir = build_dir or default_build_dir()
+    manifest: Dict[str, Dict[str, str]] = {"files": {}, "inline": {}}
+    base_path = os.path.join(static_dir, BASE_STYLESHEET)
+    base_css = open(base_path, encoding='utf-8').read() if os.path.exists(base_path) else None
+
+    for name in _source_files(static_dir):
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            source = f.read()
+        suffix = ''
+        if name.endswith('.css'):
+            css = source.decode('utf-8')
+            delta = css_delta(base_css, css) if base_css is not None and name != BASE_STYLESHEET else None
+            if delta is not None:
+                delta_css = serialize_css(delta)
+                if len(delta_css.encode()) <= INLINE_MAX_BYTES:
+                    manifest["inline"][name] = delta_css
+                    continue
+                css, suffix = delta_css, '.delta'
+            else:
+                css = minify_css(css)
+            source = css.encode('utf-8')
+        # JS is fingerprinted and compressed but not minified: that needs a real JS parser
+        built = fingerprinted_name(name, source, suffix)
+        write_compressed(os.path.join(build_dir, built), source)
+        manifest["files"][name] = built
+
+    _write(os.path.join(build_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+# Flask integration
+
+class AssetPipeline:
+    """Builds assets on first use (and again when a source changes) and renders their URLs and tags"""
+
+    def __init__(self, static_dir: str, build_dir: Optional[str] = None):
+        self.static_dir = static_dir
+        self.build_dir = build_dir or default_build_dir()
+        self._lock = threading.Lock()
+        self._manifest: Optional[Dict[str, Dict[str, str]]] = None
+        self._built_mtime = 0.0
+
+    def sources_mtime(self) -> float:
+        """Newest modification time of the asset sources"""
+        return max((os.path.getmtime(os.path.join(self.static_dir, name))
+                    for name in _source_files(self.static_dir)), default=0.0)
+
+    def manifest(self) -> Dict[str, Dict[str, str]]:
+        sources_mtime = self.sources_mtime()
+        if self._manifest is None or sources_mtime > self._built_mtime:
+            with self._lock:
+                if self._manifest is None or sources_mtime > self._built_mtime:
+                    self._manifest = build_assets(self.static_dir, self.build_dir)
+                    self._built_mtime = sources_mtime
+        return self._manifest
+
+    def url(self, name: str) -> str:
+        """Fingerprinted URL of a static asset, or its plain /static/ URL if the build does not know it"""
+        built = self.manifest()["files"].get(name)
+        return f"{ASSET_URL_PREFIX}/{built}" if built else f"/static/{name}"
+
+    def stylesheet(self, name: str) -> Markup:
+        """<style> with an inlined delta, or <link> to the fingerprinted stylesheet"""
+        inline = self.manifest()["inline"].get(name)
+        if inline is not None:
+            return Markup(f"<style>{inline}</style>")
+        return Markup(f'<link rel="stylesheet" href="{escape(self.url(name))}">')
+
+    def send(self, filename: str):
+        """Serve a built file with the best precompressed encoding the client accepts"""
+        from flask import abort, request, send_file
+        from werkzeug.security import safe_join
+
+        path = safe_join(os.path.abspath(self.build_dir), filename)
+        if path is None or filename == MANIFEST_NAME or not os.path.isfile(path):
+            abort(404)
+        # Parsed with q-values: "br;q=0" refuses br, and equal preferences go to br (smaller)
+        extensions = {'br': '.br', 'gzip': '.gz'}
+        encoding = request.accept_encodings.best_match(
+            [name for name, extension in extensions.items() if os.path.isfile(path + extension)]
+        )
+        if encoding:
+            path += extensions[encoding]
+        response = send_file(path, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                             etag=fingerprint(filename.encode()) + (f"-{encoding}" if encoding else ''),
+                             conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+if __name__ == "__main__":
+    manifest = build_assets()
+    for name, built in sorted(manifest["files"].items()):
+        print(f"📦 {name} -> {built}")
+    for name, css in sorted(manifest["inline"].items()):
+        print(f"🧩 {name} -> inline delta ({len(css)} bytes)")
@@ -0,0 +1,149 @@
+"""
+Server-side landing page assignment
+Visitors are bucketed by a hash of their visitor cookie into one of
+ALLOCATION_SLOTS slots, and an immutable slot -> variant table says which page
+each slot gets. Serving a request is one hash and one tuple lookup, with no
+lock: a background thread rebuilds the table from the latest ButtonInsights
+run (Thompson sampling over the CTA click-through posteriors) and swaps it in
+by reference. A visitor keeps the variant they were first shown, so
+reallocation only moves new traffic
+"""
+
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from significance import POSTERIOR_DRAWS, ctr_posteriors
+
+logger = logging.getLogger(__name__)
+
+VISITOR_COOKIE = 'ab_visitor'
+VARIANT_COOKIE = 'ab_variant'
+COOKIE_MAX_AGE = 90 * 24 * 3600
+ALLOCATION_SLOTS = 10000
+# Share every variant keeps however badly it does, so the posteriors keep learning
+MIN_SHARE = 0.05
+# The button whose click-through rate the experiment optimizes
+OBJECTIVE_BUTTON_TYPE = 'cta'
+
+def refresh_interval() -> float:
+    return float(os.environ.get('ALLOCATION_REFRESH_SECONDS', 60))
+
+def assignment_salt() -> bytes:
+    # Changing the salt reshuffles which visitors land in which slot, e.g. for a new experiment
+    return os.environ.get('ASSIGNMENT_SALT', 'landing').encode()
+
+def new_visitor_id() -> str:
+    return secrets.token_hex(16)
+
+def bucket(visitor_id: str, salt: bytes, slots: int = ALLOCATION_SLOTS) -> int:
+    """Deterministic slot of a visitor"""
+    digest = hashlib.blake2b(visitor_id.encode(), digest_size=8, key=salt).digest()
+    return int.from_bytes(digest, 'big') % slots
+
+def thompson_shares(rows: List[Dict[str, Any]], variants: Sequence[str],
+                    button_type: str = OBJECTIVE_BUTTON_TYPE, min_share: float = MIN_SHARE,
+                    draws: int = POSTERIOR_DRAWS, seed: int = 0) -> Dict[str, float]:
+    """Traffic share per variant: P(variant has the best CTR), floored at min_share
+
+    Variants without data keep the uniform Beta(1, 1) prior, so a new variant is
+    explored like any other; clicks out of max(hovers, clicks) are the trials,
+    as in significance.compare_variants
+    """
+    clicks = np.zeros((1, len(variants)))
+    hovers = np.zeros((1, len(variants)))
+    index = {variant: i for i, variant in enumerate(variants)}
+    for row in rows:
+        i = index.get(row['page_variant'])
+        if i is not None and row['button_type'] == button_type:
+            clicks[0, i] += row['total_clicks']
+            hovers[0, i] += row['total_hovers']
+    present = np.ones_like(clicks, dtype=bool)
+    prob_best = ctr_posteriors(clicks, np.maximum(hovers, clicks), present, draws,
+                               np.random.default_rng(seed))["prob_best"][0]
+    floor = min(min_share, 1 / len(variants))
+    shares = floor + (1 - floor * len(variants)) * prob_best
+    return {variant: float(share) for variant, share in zip(variants, shares)}
+
+def allocation_table(shares: Dict[str, float], variants: Sequence[str],
+                     slots: int = ALLOCATION_SLOTS) -> Tuple[str, ...]:
+    """Slot -> variant, laid out in variant order so a share change only moves slots at the edges"""
+    total = sum(shares.get(variant, 0.0) for variant in variants)
+    table: List[str] = []
+    cumulative = 0.0
+    for variant in variants:
+        cumulative += shares.get(variant, 0.0) / total
+        table.extend([variant] * (round(cumulative * slots) - len(table)))
+    return tuple(table)
+
+@dataclass(frozen=True)
+class Allocation:
+    """One published allocation; replaced as a whole, never mutated"""
+    shares: Dict[str, float]
+    table: Tuple[str, ...]
+    run_id: Optional[int] = None
+    updated_at: float = field(default_factory=time.time)
+
+class VariantAssigner:
+    """Sticky, bandit-weighted variant assignment
+
+    metrics_fn() returns (run_id, metric rows) of the newest insights run;
+    assign() never blocks on it, it reads whatever allocation was last published
+    """
+
+    def __init__(self, variants: Sequence[str], metrics_fn: Callable[[], Tuple[Optional[int], List[Dict[str, Any]]]],
+                 salt: Optional[bytes] = None):
+        self.variants = tuple(variants)
+        self.metrics_fn = metrics_fn
+        self.salt = salt if salt is not None else assignment_salt()
+        uniform = {variant: 1 / len(self.variants) for variant in self.variants}
+        self.allocation = Allocation(uniform, allocation_table(uniform, self.variants))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def assign(self, visitor_id: Optional[str], assigned: Optional[str] = None) -> Tuple[str, str]:
+        """(visitor id, variant): a previous assignment sticks, new visitors get their slot's variant"""
+        if self._thread is None:
+            self.start()
+        if not visitor_id:
+            visitor_id = new_visitor_id()
+        if assigned in self.variants:
+            return visitor_id, assigned
+        return visitor_id, self.allocation.table[bucket(visitor_id, self.salt, len(self.allocation.table))]
+
+    def refresh(self) -> Allocation:
+        """Recompute the allocation when a newer insights run exists, and publish it"""
+        run_id, rows = self.metrics_fn()
+        current = self.allocation
+        if run_id is None or run_id == current.run_id:
+            return current
+        shares = thompson_shares(rows, self.variants)
+        allocation = Allocation(shares, allocation_table(shares, self.variants), run_id)
+        # A single reference assignment: readers see the old table or the new one, never a mix
+        self.allocation = allocation
+        logger.info(f"🎯 Reallocated landing traffic from run {run_id}: "
+                    + ", ".join(f"{variant} {share:.0%}" for variant, share in shares.items()))
+        return allocation
+
+    def start(self):
+        """Start the refresh thread (once)"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='variant-allocation', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("⚠️ Allocation refresh failed")
+            time.sleep(refresh_interval())
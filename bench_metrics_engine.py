@@ -0,0 +1,146 @@
+"""
+Benchmark for the columnar metrics engine
+Compares the per-event Python loop (python_metric_rows, also the reference for
+the engine's parity tests) with the NumPy grouped reductions used by
+process_button_metrics
+
+Usage: python bench_metrics_engine.py [n_events ...]   (default: 1000000 10000000)
+"""
+
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+import hyperloglog
+from metrics_engine import (CLICK_EVENTS, ENGAGEMENT_QUANTILE_FIELDS, HOVER_EVENTS, HOVER_QUANTILE_FIELDS,
+                            compute_metric_rows, distinct_fields)
+from quantile_sketch import sketch_from_values, sketch_quantiles
+
+BUTTON_TYPES = ['cta', 'navigation', 'feature']
+PAGE_VARIANTS = ['original', 'colors', 'sizes', 'spacing', 'typography']
+EVENT_NAMES = [
+    'cta_click', 'navigation_click', 'feature_click',
+    'button_hover_start', 'nav_hover_start', 'feature_hover_start',
+    'button_hover_end', 'page_view'
+]
+
+def make_events(n_events: int, seed: int = 42, pool_size: int = 50_000):
+    """Build n_events event dicts; dicts are drawn from a fixed pool so 10M events fit in memory"""
+    rng = random.Random(seed)
+    pool = [
+        {
+            "event_name": rng.choice(EVENT_NAMES),
+            "button_type": rng.choice(BUTTON_TYPES),
+            "page_variant": rng.choice(PAGE_VARIANTS),
+            "hover_duration": rng.randint(50, 5000),
+            "total_engagement": rng.randint(100, 10000),
+            "timestamp": "2024-01-01T10:00:00Z"
+        }
+        for _ in range(pool_size)
+    ]
+    return [pool[rng.randrange(pool_size)] for _ in range(n_events)]
+
+def python_metric_rows(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-event Python loop: the benchmark's baseline and the reference for the engine's parity tests"""
+    button_groups = {}
+    for event in events:
+        key = f"{event.get('button_type', 'unknown')}_{event.get('page_variant', 'unknown')}"
+        if key not in button_groups:
+            button_groups[key] = {
+                'clicks': 0,
+                'hovers': 0,
+                'hover_durations': [],
+                'engagement_times': [],
+                'visitors': set(),
+                'clickers': set(),
+                'sessions': set()
+            }
+
+        if event.get('visitor_id'):
+            button_groups[key]['visitors'].add(event['visitor_id'])
+            if event.get('event_name') in CLICK_EVENTS:
+                button_groups[key]['clickers'].add(event['visitor_id'])
+        if event.get('session_id'):
+            button_groups[key]['sessions'].add(event['session_id'])
+
+        if event.get('event_name') in CLICK_EVENTS:
+            button_groups[key]['clicks'] += 1
+            button_groups[key]['engagement_times'].append(event.get('total_engagement', 0))
+
+        if event.get('event_name') in HOVER_EVENTS:
+            button_groups[key]['hovers'] += 1
+            button_groups[key]['hover_durations'].append(event.get('hover_duration', 0))
+
+    rows = []
+    for key, data in button_groups.items():
+        button_type, page_variant = key.split('_', 1)
+
+        avg_hover_duration = sum(data['hover_durations']) / len(data['hover_durations']) if data['hover_durations'] else 0
+        click_through_rate = data['clicks'] / data['hovers'] if data['hovers'] > 0 else 0
+
+        engagement_score = (click_through_rate * 0.4 +
+                          (avg_hover_duration / 1000) * 0.3 +
+                          (data['clicks'] / 10) * 0.3)
+
+        hover_sketch = sketch_from_values(data['hover_durations'])
+        engagement_sketch = sketch_from_values(data['engagement_times'])
+        rows.append({
+            "button_id": key,
+            "button_type": button_type,
+            "page_variant": page_variant,
+            "total_clicks": data['clicks'],
+            "total_hovers": data['hovers'],
+            "avg_hover_duration": avg_hover_duration,
+            "click_through_rate": click_through_rate,
+            "engagement_score": engagement_score,
+            "conversion_rate": click_through_rate,
+            **dict(zip(HOVER_QUANTILE_FIELDS, sketch_quantiles(hover_sketch))),
+            **dict(zip(ENGAGEMENT_QUANTILE_FIELDS, sketch_quantiles(engagement_sketch))),
+            **distinct_fields(
+                hyperloglog.sketch_from_values(data['visitors']),
+                hyperloglog.sketch_from_values(data['clickers']),
+                hyperloglog.sketch_from_values(data['sessions'])
+            ),
+            "hover_duration_sketch": hover_sketch,
+            "engagement_sketch": engagement_sketch
+        })
+
+    return rows
+
+def to_columns(events):
+    """Columnar batch with the same content, as emitted by columnar fetches:
+    dictionary-encoded string columns and typed numeric arrays"""
+    columns = {}
+    for name in ('event_name', 'button_type', 'page_variant'):
+        index = {}
+        codes = np.fromiter((index.setdefault(e[name], len(index)) for e in events), dtype=np.int32, count=len(events))
+        columns[name] = {"values": list(index), "codes": codes}
+    for name in ('hover_duration', 'total_engagement'):
+        columns[name] = np.fromiter((e[name] for e in events), dtype=np.float64, count=len(events))
+    return columns
+
+def time_call(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def main(sizes):
+    print(f"{'events':>12} {'python (s)':>12} {'engine/rows (s)':>16} {'engine/columns (s)':>19} {'speedup':>9}")
+    for n_events in sizes:
+        events = make_events(n_events)
+        python_time, expected = time_call(python_metric_rows, events)
+        rows_time, from_rows = time_call(compute_metric_rows, {"events": events})
+        columns = to_columns(events)
+        del events
+        columns_time, from_columns = time_call(compute_metric_rows, {"columns": columns})
+        del columns
+        assert from_rows == expected and from_columns == expected, \
+            "columnar engine diverged from the reference implementation"
+        print(f"{n_events:>12,} {python_time:>12.3f} {rows_time:>16.3f} {columns_time:>19.3f} "
+              f"{python_time / columns_time:>8.1f}x")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000_000, 10_000_000])
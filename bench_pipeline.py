@@ -0,0 +1,243 @@
+"""
+Benchmark suite for the button analytics pipeline
+Times process_button_metrics and generate_button_insights on seeded synthetic
+events, measures payload size and encode/decode cost of their results with the
+default and the app's data converter, then runs ButtonAnalyticsWorkflow end to end against the mock GA4
+server in Temporal's local test environment. Results are written as JSON so
+runs from different commits can be compared
+
+Usage: python bench_pipeline.py [--sizes N ...] [--output PATH] [--compare BASELINE.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from synthetic_events import generate_columns
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+# The end-to-end run fetches every event over HTTP as report JSON, so it stops at this size by default
+DEFAULT_E2E_MAX_EVENTS = 1_000_000
+E2E_DAYS = 7
+E2E_END_DATE = "2024-01-08"
+RESULTS_DIR = "bench_results"
+# A timing that grows by more than this ratio against the baseline is reported as a regression
+REGRESSION_THRESHOLD = 1.2
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment_info() -> Dict[str, Any]:
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+async def best_of(repeat: int, coroutine_fn, *args):
+    """Best wall time over `repeat` calls and the last result"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await coroutine_fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+async def bench_activities(n_events: int, seed: int, repeat: int) -> Dict[str, Any]:
+    """process_button_metrics and generate_button_insights, timed one at a time"""
+    from temporal_workflows import process_button_metrics, generate_button_insights
+
+    start = time.perf_counter()
+    columns = generate_columns(n_events, seed)
+    generate_time = time.perf_counter() - start
+
+    process_time, metrics = await best_of(repeat, process_button_metrics,
+                                          {"columns": columns, "total_events": n_events})
+    del columns
+    insights_time, insights = await best_of(repeat, generate_button_insights, metrics)
+    return {
+        "generate_events_s": round(generate_time, 4),
+        "process_button_metrics_s": round(process_time, 4),
+        "generate_button_insights_s": round(insights_time, 4),
+        "events_per_second": round(n_events / process_time),
+        "buttons_analyzed": len(metrics),
+        "best_button": insights.best_performing_button
+    }, metrics, insights
+
+async def bench_payloads(metrics, insights, repeat: int) -> Dict[str, Any]:
+    """Payload bytes and encode/decode cost of the activity results, default vs app data converter"""
+    from typing import List as ListHint
+    from temporalio.converter import DataConverter
+    from data_converter import create_data_converter
+    from temporal_workflows import ButtonInsights, ButtonMetrics
+
+    values, hints = [metrics, insights], [ListHint[ButtonMetrics], ButtonInsights]
+    results = {}
+    # No claim check here: the threshold is out of reach so only conversion and compression are measured
+    for name, converter in (("default", DataConverter.default),
+                            ("compact", create_data_converter(threshold_bytes=2 ** 62))):
+        encode_time, payloads = await best_of(repeat, converter.encode, values)
+        decode_time, _ = await best_of(repeat, converter.decode, payloads, hints)
+        results[f"{name}_bytes"] = sum(payload.ByteSize() for payload in payloads)
+        results[f"{name}_encode_s"] = round(encode_time, 6)
+        results[f"{name}_decode_s"] = round(decode_time, 6)
+    results["compression_ratio"] = round(results["default_bytes"] / results["compact_bytes"], 2)
+    return results
+
+async def bench_workflow(n_events: int, seed: int) -> Dict[str, Any]:
+    """Full ButtonAnalyticsWorkflow run in the time-skipping test environment"""
+    from temporalio.testing import WorkflowEnvironment
+    from data_converter import create_data_converter
+    from mock_ga4_server import MockGA4ReportingServer
+    from temporal_worker import create_worker
+    from temporal_workflows import ButtonAnalysisInput, ButtonAnalyticsWorkflow
+
+    try:
+        env = await WorkflowEnvironment.start_time_skipping(data_converter=create_data_converter())
+    except Exception as e:
+        return {"skipped": f"Temporal test environment unavailable: {e}"}
+
+    events_per_day = max(1, n_events // E2E_DAYS)
+    with tempfile.TemporaryDirectory() as tmp, MockGA4ReportingServer(events_per_day=events_per_day, seed=seed) as server:
+        overrides = {
+            'GA4_REPORTING_URL': server.url,
+            'AGGREGATE_STORE_PATH': os.path.join(tmp, 'aggregates.db'),
+            'INSIGHTS_STORE_PATH': os.path.join(tmp, 'insights.db'),
+            'FETCH_CACHE_PATH': os.path.join(tmp, 'fetch_cache.db')
+        }
+        saved = {name: os.environ.get(name) for name in overrides}
+        os.environ.update(overrides)
+        cwd = os.getcwd()
+        # save_insights_to_database also writes its JSON snapshot to the working directory
+        os.chdir(tmp)
+        try:
+            async with env:
+                task_queue = f"bench-{uuid.uuid4()}"
+                async with create_worker(env.client, task_queue=task_queue):
+                    start = time.perf_counter()
+                    result = await env.client.execute_workflow(
+                        ButtonAnalyticsWorkflow.run,
+                        ButtonAnalysisInput("bench-property", E2E_DAYS - 1, incremental=False, lookback_days=0,
+                                            end_date=E2E_END_DATE),
+                        id=f"bench-{uuid.uuid4()}",
+                        task_queue=task_queue
+                    )
+                    elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    return {
+        "workflow_s": round(elapsed, 4),
+        "events": result["data_points_processed"],
+        "events_per_second": round(result["data_points_processed"] / elapsed),
+        "partitions_fetched": result["partitions_fetched"],
+        "report_requests": server.request_count
+    }
+
+async def run_suite(sizes: List[int], seed: int = 42, repeat: int = 3,
+                    e2e_max_events: int = DEFAULT_E2E_MAX_EVENTS) -> Dict[str, Any]:
+    results = {"environment": environment_info(), "seed": seed, "sizes": {}}
+    for n_events in sizes:
+        print(f"⏱️  {n_events:,} events...")
+        # Large sizes are slow enough that one run is representative
+        activities, metrics, insights = await bench_activities(n_events, seed, repeat if n_events < 10_000_000 else 1)
+        entry = {"activities": activities, "payloads": await bench_payloads(metrics, insights, repeat)}
+        if n_events <= e2e_max_events:
+            entry["workflow"] = await bench_workflow(n_events, seed)
+        else:
+            entry["workflow"] = {"skipped": f"larger than --e2e-max-events ({e2e_max_events:,})"}
+        results["sizes"][str(n_events)] = entry
+    return results
+
+def _timings(results: Dict[str, Any]) -> Dict[str, float]:
+    """Flattened "size/stage/metric" -> seconds"""
+    timings = {}
+    for size, entry in results.get("sizes", {}).items():
+        for stage, values in entry.items():
+            for name, value in values.items():
+                if name.endswith('_s'):
+                    timings[f"{size}/{stage}/{name}"] = value
+    return timings
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float = REGRESSION_THRESHOLD) -> List[Dict[str, Any]]:
+    """Timings present in both runs with their ratio to the baseline"""
+    current, previous = _timings(results), _timings(baseline)
+    rows = []
+    for key in current.keys() & previous.keys():
+        ratio = current[key] / previous[key] if previous[key] else float('inf')
+        rows.append({"timing": key, "baseline_s": previous[key], "current_s": current[key],
+                     "ratio": round(ratio, 3), "regression": ratio > threshold})
+    return sorted(rows, key=lambda row: row["timing"])
+
+def print_summary(results: Dict[str, Any]):
+    print(f"{'events':>12} {'process (s)':>12} {'insights (s)':>13} {'workflow (s)':>13}")
+    for size, entry in results["sizes"].items():
+        activities, workflow = entry["activities"], entry["workflow"]
+        workflow_time = f"{workflow['workflow_s']:.3f}" if "workflow_s" in workflow else "skipped"
+        print(f"{int(size):>12,} {activities['process_button_metrics_s']:>12.3f} "
+              f"{activities['generate_button_insights_s']:>13.3f} {workflow_time:>13}")
+    for size, entry in results["sizes"].items():
+        payloads = entry["payloads"]
+        print(f"📦 {int(size):,} events: results {payloads['default_bytes']:,} -> {payloads['compact_bytes']:,} bytes "
+              f"({payloads['compression_ratio']}x), encode {payloads['compact_encode_s'] * 1000:.2f} ms, "
+              f"decode {payloads['compact_decode_s'] * 1000:.2f} ms")
+    for size, entry in results["sizes"].items():
+        if "skipped" in entry["workflow"]:
+            print(f"⚠️  workflow at {int(size):,} events skipped: {entry['workflow']['skipped']}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the button analytics pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per activity timing; the best is kept")
+    parser.add_argument("--e2e-max-events", type=int, default=DEFAULT_E2E_MAX_EVENTS)
+    parser.add_argument("--output", help=f"results file (default: {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file of an earlier run")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_suite(args.sizes, args.seed, args.repeat, args.e2e_max_events))
+    print_summary(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['environment']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(results, json.load(f))
+        for row in rows:
+            flag = "🔺" if row["regression"] else "  "
+            print(f"{flag} {row['timing']:<55} {row['baseline_s']:>9.3f} -> {row['current_s']:>9.3f} ({row['ratio']:.2f}x)")
+        if any(row["regression"] for row in rows):
+            print(f"❌ Regressions over {REGRESSION_THRESHOLD:.1f}x against {args.compare}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Claim-check payload offloading for Temporal
+Payloads above a size threshold are written to a content-addressed blob store
+and only a small reference payload goes into workflow history; the codec
+reads the whole blob back into memory when a worker or client decodes the
+payload, so history size stays the same whatever the event volume
+
+Workers, clients and the blob store must share BLOB_STORE_DIR (a local or
+network filesystem)
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from typing import List, Optional, Sequence
+
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import DataConverter, PayloadCodec
+
+DEFAULT_BLOB_DIR = "blob_store"
+# Payloads up to this size stay inline in history
+DEFAULT_THRESHOLD_BYTES = 128 * 1024
+
+ENCODING = b"claim-check/v1"
+DIGEST_KEY = "claim-check-digest"
+SIZE_KEY = "claim-check-size"
+
+def threshold_from_env() -> int:
+    return int(os.environ.get('CLAIM_CHECK_THRESHOLD_BYTES', DEFAULT_THRESHOLD_BYTES))
+
+class BlobStore:
+    """Immutable blobs addressed by their SHA-256, stored as <root>/<first 2 hex>/<digest>"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.environ.get('BLOB_STORE_DIR', DEFAULT_BLOB_DIR)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        """Store data and return its digest; identical data is stored once"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            # Refresh the mtime so prune() keeps blobs that are still being referenced
+            os.utime(path)
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Blob contents, read in full (the decoded Payload owns its bytes anyway)"""
+        with open(self.path(digest), 'rb') as f:
+            return f.read()
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete blobs not written or referenced for max_age_seconds (match it to the
+        namespace's history retention); returns the number removed"""
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        if not os.path.isdir(self.root):
+            return 0
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+                    removed += 1
+        return removed
+
+class ClaimCheckCodec(PayloadCodec):
+    """Swaps large payloads for blob references on encode and restores them on decode"""
+
+    def __init__(self, store: Optional[BlobStore] = None, threshold_bytes: Optional[int] = None):
+        self.store = store or BlobStore()
+        self.threshold_bytes = threshold_from_env() if threshold_bytes is None else threshold_bytes
+
+    async def encode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        if all(payload.ByteSize() <= self.threshold_bytes for payload in payloads):
+            return list(payloads)
+        # Blob writes are file I/O, kept off the event loop
+        return await asyncio.to_thread(lambda: [self._encode(payload) for payload in payloads])
+
+    async def decode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        if not any(payload.metadata.get("encoding") == ENCODING for payload in payloads):
+            return list(payloads)
+        return await asyncio.to_thread(lambda: [self._decode(payload) for payload in payloads])
+
+    def _encode(self, payload: Payload) -> Payload:
+        if payload.ByteSize() <= self.threshold_bytes:
+            return payload
+        # The whole payload (metadata and data) is the blob, so decoding restores it exactly
+        data = payload.SerializeToString()
+        digest = self.store.put(data)
+        return Payload(metadata={
+            "encoding": ENCODING,
+            DIGEST_KEY: digest.encode(),
+            SIZE_KEY: str(len(data)).encode()
+        })
+
+    def _decode(self, payload: Payload) -> Payload:
+        if payload.metadata.get("encoding") != ENCODING:
+            return payload
+        digest = payload.metadata[DIGEST_KEY].decode()
+        return Payload.FromString(self.store.get(digest))
+
+def claim_check_data_converter(store: Optional[BlobStore] = None,
+                               threshold_bytes: Optional[int] = None) -> DataConverter:
+    """Default data converter with claim-check offloading; use it for every client and worker"""
+    return DataConverter(payload_codec=ClaimCheckCodec(store, threshold_bytes))
@@ -0,0 +1,83 @@
+"""
+Compact payload converter for lists of dataclasses
+Lists such as List[ButtonMetrics] are serialized column by column under a
+single field-name header instead of repeating every field name per item, and
+sparse count maps (the duration sketches) become delta-encoded key and count
+arrays; everything else falls through to Temporal's default converters
+"""
+
+import dataclasses
+import json
+import typing
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Type
+
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import CompositePayloadConverter, DefaultPayloadConverter, EncodingPayloadConverter
+
+def _is_count_map(value: Any) -> bool:
+    return isinstance(value, dict) and all(
+        isinstance(key, str) and key.isdigit() and type(count) is int for key, count in value.items()
+    )
+
+def _pack_count_map(counts: Dict[str, int]) -> List[List[int]]:
+    """{"12": 3, "13": 1, "20": 4} -> [[12, 1, 7], [3, 1, 4]]: key deltas compress far better than keys"""
+    keys = sorted(int(key) for key in counts)
+    return [[b - a for a, b in zip([0] + keys, keys)], [counts[str(key)] for key in keys]]
+
+def _unpack_count_map(packed: List[List[int]]) -> Dict[str, int]:
+    deltas, counts = packed
+    return dict(zip(map(str, accumulate(deltas)), counts))
+
+class DataclassColumnsPayloadConverter(EncodingPayloadConverter):
+    """Non-empty lists of one dataclass type as {"fields": [...], "columns": [[...], ...], "count_maps": [...]}"""
+
+    @property
+    def encoding(self) -> str:
+        return "json/dataclass-columns"
+
+    def to_payload(self, value: Any) -> Optional[Payload]:
+        if not isinstance(value, list) or not value or not dataclasses.is_dataclass(value[0]):
+            return None
+        cls = type(value[0])
+        if any(type(item) is not cls for item in value):
+            return None
+        names = [f.name for f in dataclasses.fields(cls)]
+        columns = [[getattr(item, name) for item in value] for name in names]
+        count_maps = [name for name, column in zip(names, columns) if all(map(_is_count_map, column))]
+        for index, name in enumerate(names):
+            if name in count_maps:
+                columns[index] = [_pack_count_map(counts) for counts in columns[index]]
+        try:
+            data = json.dumps({"fields": names, "columns": columns, "count_maps": count_maps}, separators=(',', ':'))
+        except TypeError:
+            # Nested dataclasses or other non-JSON values: leave it to the JSON converter
+            return None
+        return Payload(metadata={"encoding": self.encoding.encode()}, data=data.encode())
+
+    def from_payload(self, payload: Payload, type_hint: Optional[Type] = None) -> Any:
+        body = json.loads(payload.data)
+        columns = [
+            [_unpack_count_map(packed) for packed in column] if name in body["count_maps"] else column
+            for name, column in zip(body["fields"], body["columns"])
+        ]
+        items = [dict(zip(body["fields"], values)) for values in zip(*columns)]
+        item_type = _list_item_type(type_hint)
+        if item_type is None:
+            return items
+        # Fields unknown to this version of the dataclass are dropped, missing ones take defaults
+        known = {f.name for f in dataclasses.fields(item_type) if f.init}
+        return [item_type(**{k: v for k, v in item.items() if k in known}) for item in items]
+
+def _list_item_type(type_hint: Optional[Type]) -> Optional[Type]:
+    if typing.get_origin(type_hint) not in (list, typing.List):
+        return None
+    args = typing.get_args(type_hint)
+    return args[0] if args and dataclasses.is_dataclass(args[0]) else None
+
+class CompactPayloadConverter(CompositePayloadConverter):
+    """Default converters, with dataclass lists encoded as columns ahead of plain JSON"""
+
+    def __init__(self) -> None:
+        converters = list(DefaultPayloadConverter.default_encoding_payload_converters)
+        super().__init__(*converters[:-1], DataclassColumnsPayloadConverter(), converters[-1])
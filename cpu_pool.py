@@ -0,0 +1,68 @@
+"""
+Process pool for CPU-bound activity work
+Activities stay async so heartbeats and I/O keep running on the worker's event
+loop; their CPU-heavy parts (metric aggregation, significance tests) are sent
+to a pool of processes, one per core by default. Without a configured pool the
+same work runs on a thread, which is what tests and direct callers get
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from profiling import current_profile, profiled_call
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+
+def cpu_pool_size_from_env() -> int:
+    """CPU_POOL_WORKERS, or one process per core; 0 disables the pool"""
+    return int(os.environ.get('CPU_POOL_WORKERS', os.cpu_count() or 1))
+
+def configure_cpu_pool(workers: Optional[int] = None, wait: bool = True) -> Optional[ProcessPoolExecutor]:
+    """(Re)start the shared pool with `workers` processes; wait=False does not wait for the old one"""
+    global _pool, _pool_size
+    shutdown_cpu_pool(wait)
+    _pool_size = cpu_pool_size_from_env() if workers is None else workers
+    if _pool_size > 0:
+        # spawn, not fork: the worker process runs Temporal's core threads
+        _pool = ProcessPoolExecutor(_pool_size, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+def cpu_pool_size() -> int:
+    """Processes in the running pool; 0 when CPU work runs on threads"""
+    return _pool_size if _pool is not None else 0
+
+def shutdown_cpu_pool(wait: bool = True):
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+
+async def run_cpu(fn: Callable[..., Any], *args: Any) -> Any:
+    """fn(*args) in the process pool (arguments and result are pickled), or on a thread without one
+
+    Inside a profiled activity (see profiling.py) the call is profiled where it runs
+    """
+    session = current_profile()
+    if session is not None:
+        result, profile = await _submit(profiled_call, fn, *args)
+        session.add(profile)
+        return result
+    return await _submit(fn, *args)
+
+async def _submit(fn: Callable[..., Any], *args: Any) -> Any:
+    pool = _pool
+    if pool is None:
+        return await asyncio.to_thread(fn, *args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        # A pool process died (e.g. out of memory); replace the pool so the activity retry can run.
+        # Only once per broken pool, and without joining its processes on the event loop
+        if _pool is pool:
+            configure_cpu_pool(_pool_size, wait=False)
+        raise
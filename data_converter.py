@@ -0,0 +1,27 @@
+"""
+Data converter shared by every Temporal client and worker of the app
+Dataclass lists are encoded as compact rows, every payload is compressed, and
+payloads still above the claim-check threshold are offloaded to the blob store
+"""
+
+from typing import Optional
+
+from temporalio.converter import DataConverter
+
+from claim_check import BlobStore, ClaimCheckCodec
+from instrumentation import PayloadMetricsCodec
+from compact_converter import CompactPayloadConverter
+from payload_compression import CodecChain, CompressionCodec
+
+def create_data_converter(store: Optional[BlobStore] = None, threshold_bytes: Optional[int] = None) -> DataConverter:
+    # Compression runs first so the claim-check threshold applies to compressed sizes;
+    # payload sizes are recorded before compression and as stored in history
+    return DataConverter(
+        payload_converter_class=CompactPayloadConverter,
+        payload_codec=CodecChain(
+            PayloadMetricsCodec("converted"),
+            CompressionCodec(),
+            ClaimCheckCodec(store, threshold_bytes),
+            PayloadMetricsCodec("stored")
+        )
+    )
@@ -0,0 +1,189 @@
+"""
+First-party event log for button analytics
+Batched interaction events posted to /api/events are validated and appended to
+segmented NDJSON files on local disk; fsync is batched on a background thread
+so collector requests never wait on the disk
+"""
+
+import json
+import os
+import re
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Iterator, Optional
+
+DEFAULT_LOG_DIR = 'event_log'
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+FSYNC_INTERVAL = 1.0
+
+# Cheap limits applied to every collector batch
+MAX_BATCH_BYTES = 256 * 1024
+MAX_DECOMPRESSED_BYTES = 2 * 1024 * 1024
+MAX_BATCH_EVENTS = 1000
+MAX_EVENT_FIELDS = 32
+MAX_STRING_LENGTH = 256
+
+SEGMENT_NAME = re.compile(r'^events-(?P<day>\d{4}-\d{2}-\d{2})-(?P<pid>\d+)-(?P<seq>\d+)\.ndjson$')
+SAFE_PROPERTY_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def _decompress(body: bytes) -> bytes:
+    """Gunzip a payload if it carries the gzip magic bytes, refusing oversized output"""
+    if body[:2] != b'\x1f\x8b':
+        return body
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, MAX_DECOMPRESSED_BYTES + 1)
+    except zlib.error as e:
+        raise ValueError(f"invalid gzip payload: {e}")
+    if len(data) > MAX_DECOMPRESSED_BYTES or decompressor.unconsumed_tail:
+        raise ValueError("decompressed payload too large")
+    return data
+
+def _clean_event(event: Any) -> Dict[str, Any]:
+    if not isinstance(event, dict):
+        raise ValueError("events must be objects")
+    event_name = event.get('event_name')
+    if not isinstance(event_name, str) or not event_name or len(event_name) > MAX_STRING_LENGTH:
+        raise ValueError("every event needs an event_name")
+    if len(event) > MAX_EVENT_FIELDS:
+        raise ValueError("too many fields in event")
+
+    cleaned = {}
+    for key, value in event.items():
+        if isinstance(value, str):
+            cleaned[key] = value[:MAX_STRING_LENGTH]
+        elif value is None or isinstance(value, (bool, int, float)):
+            cleaned[key] = value
+    return cleaned
+
+def parse_event_batch(body: bytes) -> List[Dict[str, Any]]:
+    """Validate a collector payload ({"events": [...]} or a bare list, optionally gzipped)
+
+    Raises ValueError for anything that should be rejected with a 400
+    """
+    if len(body) > MAX_BATCH_BYTES:
+        raise ValueError("payload too large")
+    try:
+        payload = json.loads(_decompress(body))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"invalid JSON payload: {e}")
+
+    events = payload.get('events') if isinstance(payload, dict) else payload
+    if not isinstance(events, list):
+        raise ValueError("payload must contain an events list")
+    if len(events) > MAX_BATCH_EVENTS:
+        raise ValueError("too many events in batch")
+    return [_clean_event(event) for event in events]
+
+class EventLog:
+    """Append-only, segmented event log for one property
+
+    Segments roll over on size or UTC day change and are named
+    events-<day>-<pid>-<seq>.ndjson, so each web process writes its own files
+    and readers can select segments by day without opening them.
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 fsync_interval: float = FSYNC_INTERVAL):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment_day: Optional[str] = None
+        self._segment_bytes = 0
+        self._dirty = False
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="event-log-fsync", daemon=True)
+        self._flusher.start()
+
+    def append(self, events: List[Dict[str, Any]]) -> int:
+        """Append a batch of events; durable within fsync_interval seconds"""
+        now = datetime.now(timezone.utc)
+        received_at = now.isoformat()
+        data = ''.join(
+            json.dumps({**event, "received_at": received_at}, separators=(',', ':')) + '\n'
+            for event in events
+        ).encode()
+
+        with self._lock:
+            day = now.strftime("%Y-%m-%d")
+            if self._file is None or day != self._segment_day or self._segment_bytes >= self.segment_max_bytes:
+                self._open_segment(day)
+            self._file.write(data)
+            self._segment_bytes += len(data)
+            self._dirty = True
+        return len(events)
+
+    def flush(self):
+        """Push buffered writes to the OS and fsync them; fsync runs outside the lock"""
+        with self._lock:
+            if self._file is None or not self._dirty:
+                return
+            self._file.flush()
+            fd = os.dup(self._file.fileno())
+            self._dirty = False
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            self._close_segment()
+
+    def _open_segment(self, day: str):
+        self._close_segment()
+        pid = os.getpid()
+        existing = [
+            int(match.group('seq')) for match in map(SEGMENT_NAME.match, os.listdir(self.directory))
+            if match and match.group('day') == day and int(match.group('pid')) == pid
+        ]
+        seq = max(existing, default=-1) + 1
+        self._file = open(os.path.join(self.directory, f"events-{day}-{pid}-{seq:06d}.ndjson"), 'ab')
+        self._segment_day = day
+        self._segment_bytes = 0
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._dirty = False
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            self.flush()
+
+def segment_paths(directory: str, start_date: str, end_date: str) -> List[str]:
+    """Segments holding events received between start_date and end_date (inclusive), oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    segments = []
+    for name in os.listdir(directory):
+        match = SEGMENT_NAME.match(name)
+        if match and start_date <= match.group('day') <= end_date:
+            segments.append((match.group('day'), int(match.group('seq')), int(match.group('pid')), name))
+    return [os.path.join(directory, segment[-1]) for segment in sorted(segments)]
+
+def read_segment(path: str) -> Iterator[Dict[str, Any]]:
+    """Events of one segment; a torn final line from a crash is skipped"""
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def property_log_dir(property_id: str, root: Optional[str] = None) -> str:
+    """Per-property log directory under EVENT_LOG_DIR"""
+    root = root or os.environ.get('EVENT_LOG_DIR', DEFAULT_LOG_DIR)
+    if not SAFE_PROPERTY_ID.match(property_id):
+        raise ValueError(f"invalid property id: {property_id!r}")
+    return os.path.join(root, property_id)
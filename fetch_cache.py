@@ -0,0 +1,200 @@
+"""
+Fetch cache for GA4 report aggregates
+Caches fetch results on disk (SQLite) by property, date range and report
+shape. Ranges ending on a final day never change and are kept until evicted;
+ranges that include still-open days expire after a TTL. The file is bounded
+in size with least-recently-used eviction, and concurrent identical fetches
+in one worker share a single upstream call (single flight)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aggregate_store import DEFAULT_LOOKBACK_DAYS, is_final_day
+
+DEFAULT_CACHE_PATH = 'ga4_fetch_cache.db'
+# Results that include open days are reused for this long
+DEFAULT_TTL_SECONDS = 15 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# While waiting on another caller's fetch, the waiter's callback (e.g. an activity heartbeat) runs this often
+WAIT_CALLBACK_SECONDS = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetch_cache (
+    key TEXT PRIMARY KEY,
+    property_id TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fetch_cache_last_access ON fetch_cache (last_access);
+CREATE TABLE IF NOT EXISTS fetch_cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+STAT_NAMES = ('hits', 'misses', 'shared', 'expired', 'evictions')
+
+def cache_key(property_id: str, start_date: str, end_date: str, query_shape: Dict[str, Any]) -> str:
+    key = json.dumps([property_id, start_date, end_date, query_shape], sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+class FetchCache:
+    """Disk-backed TTL/LRU cache of fetch results with in-process single flight"""
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None, lookback_days: int = DEFAULT_LOOKBACK_DAYS):
+        self.path = path or os.environ.get('FETCH_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.ttl_seconds = float(os.environ.get('FETCH_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)) \
+            if ttl_seconds is None else ttl_seconds
+        self.max_bytes = int(os.environ.get('FETCH_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)) \
+            if max_bytes is None else max_bytes
+        self.lookback_days = lookback_days
+        self._inflight: Dict[str, asyncio.Future] = {}
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+            conn.executemany("INSERT OR IGNORE INTO fetch_cache_stats (name, value) VALUES (?, 0)",
+                             [(name,) for name in STAT_NAMES])
+            conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _count(self, conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute("UPDATE fetch_cache_stats SET value = value + ? WHERE name = ?", (amount, name))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached value, or None (counted as a miss) when absent or expired"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value, expires_at FROM fetch_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] is not None and row[1] <= now:
+                conn.execute("DELETE FROM fetch_cache WHERE key = ?", (key,))
+                self._count(conn, 'expired')
+                row = None
+            if row is None:
+                self._count(conn, 'misses')
+                return None
+            conn.execute("UPDATE fetch_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._count(conn, 'hits')
+            return json.loads(row[0])
+
+    def put(self, key: str, property_id: str, start_date: str, end_date: str, value: Dict[str, Any]):
+        """Store a result; permanent when end_date is final, TTL-bound otherwise"""
+        now = time.time()
+        data = json.dumps(value)
+        if len(data) > self.max_bytes:
+            return
+        expires_at = None if is_final_day(end_date, self.lookback_days) else now + self.ttl_seconds
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fetch_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, property_id, start_date, end_date, data, len(data), expires_at, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones until the cache fits max_bytes"""
+        conn.execute("DELETE FROM fetch_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM fetch_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM fetch_cache ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM fetch_cache WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._count(conn, 'evictions', evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters (shared across processes using the same file) plus current size"""
+        with closing(self._connect()) as conn:
+            stats = dict(conn.execute("SELECT name, value FROM fetch_cache_stats").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM fetch_cache").fetchone()
+        stats.update({"entries": entries, "bytes": size, "max_bytes": self.max_bytes})
+        return stats
+
+    def metrics_lines(self) -> List[str]:
+        """Prometheus exposition of stats()"""
+        stats = self.stats()
+        lines = ["# HELP ga4_fetch_cache_requests_total GA4 fetch cache lookups by outcome",
+                 "# TYPE ga4_fetch_cache_requests_total counter"]
+        lines += [f'ga4_fetch_cache_requests_total{{result="{name}"}} {stats[name]}'
+                  for name in ('hits', 'misses', 'shared')]
+        for name in ('expired', 'evictions'):
+            lines += [f"# TYPE ga4_fetch_cache_{name}_total counter", f"ga4_fetch_cache_{name}_total {stats[name]}"]
+        for name in ('entries', 'bytes'):
+            lines += [f"# TYPE ga4_fetch_cache_{name} gauge", f"ga4_fetch_cache_{name} {stats[name]}"]
+        return lines
+
+    async def get_or_fetch(self, property_id: str, start_date: str, end_date: str, query_shape: Dict[str, Any],
+                           fetch: Callable[[], Awaitable[Dict[str, Any]]],
+                           while_waiting: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """Cached result, a concurrent identical fetch's result, or the result of fetch()"""
+        key = cache_key(property_id, start_date, end_date, query_shape)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            result = await self._join(inflight, while_waiting)
+            if result is not None:
+                return result
+
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            result = await self._join(inflight, while_waiting)
+            if result is not None:
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fetch()
+            await asyncio.to_thread(self.put, key, property_id, start_date, end_date, result)
+        except BaseException:
+            # Waiters fetch for themselves instead of failing with this caller
+            future.set_result(None)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        return result
+
+    async def _join(self, inflight: asyncio.Future,
+                    while_waiting: Optional[Callable[[], None]]) -> Optional[Dict[str, Any]]:
+        """Wait for another caller's fetch; None if it failed"""
+        await asyncio.to_thread(self._count_shared)
+        while not inflight.done():
+            await asyncio.wait({inflight}, timeout=WAIT_CALLBACK_SECONDS)
+            if not inflight.done() and while_waiting is not None:
+                while_waiting()
+        return inflight.result()
+
+    def _count_shared(self):
+        with closing(self._connect()) as conn, conn:
+            self._count(conn, 'shared')
+
+_caches: Dict[str, FetchCache] = {}
+
+def get_fetch_cache() -> FetchCache:
+    """Process-wide cache for the configured FETCH_CACHE_PATH (single flight needs one instance)"""
+    path = os.environ.get('FETCH_CACHE_PATH', DEFAULT_CACHE_PATH)
+    if path not in _caches:
+        _caches[path] = FetchCache(path)
+    return _caches[path]
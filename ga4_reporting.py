@@ -0,0 +1,108 @@
+"""
+GA4 reporting client for button analytics
+Pulls report pages by offset and limit, the way runReport paginates, so long
+date ranges can be streamed page by page instead of loaded in one response
+"""
+
+import os
+from typing import Dict, List, Any, Optional
+
+import requests
+
+# Report shape used by the button analytics pipeline
+REPORT_DIMENSIONS = [
+    'eventName', 'customEvent:button_type', 'customEvent:page_variant',
+    'customEvent:visitor_id', 'customEvent:session_id'
+]
+# eventCount first: a row stands for that many events, and the custom metrics are their sums
+REPORT_METRICS = ['eventCount', 'customEvent:hover_duration', 'customEvent:total_engagement']
+DEFAULT_PAGE_SIZE = 10000
+# runReport returns at most this many rows per request, whatever the limit
+MAX_PAGE_SIZE = 250000
+
+# GA4 reports this for custom dimensions an event did not carry
+NOT_SET = '(not set)'
+
+# Wait before retrying a 429 that carries no Retry-After
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+class QuotaExceeded(Exception):
+    """The reporting API rejected a request for quota (HTTP 429); retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: float = DEFAULT_RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def reporting_url_from_env() -> Optional[str]:
+    """Base URL of the GA4 reporting endpoint, e.g. http://localhost:8765 for the mock server"""
+    return os.environ.get('GA4_REPORTING_URL')
+
+def page_size_from_env() -> int:
+    """Rows per report page; larger pages mean fewer round trips but more memory per page"""
+    return int(os.environ.get('GA4_REPORT_PAGE_SIZE', DEFAULT_PAGE_SIZE))
+
+class GA4ReportingClient:
+    """Minimal client for the paginated runReport endpoint"""
+
+    def __init__(self, base_url: str, page_size: int = DEFAULT_PAGE_SIZE, timeout: float = 30.0,
+                 session: Optional[requests.Session] = None):
+        self.base_url = base_url.rstrip('/')
+        self.page_size = page_size
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def run_report_page(self, property_id: str, start_date: str, end_date: str,
+                        offset: int = 0) -> Dict[str, Any]:
+        """Fetch the report rows starting at `offset`; rowCount in the response is the report's total
+
+        Raises QuotaExceeded when the API answers 429
+        """
+        body = {
+            "dateRanges": [{"startDate": start_date, "endDate": end_date}],
+            "dimensions": [{"name": name} for name in REPORT_DIMENSIONS],
+            "metrics": [{"name": name} for name in REPORT_METRICS],
+            "offset": offset,
+            "limit": min(self.page_size, MAX_PAGE_SIZE)
+        }
+
+        response = self.session.post(
+            f"{self.base_url}/v1beta/properties/{property_id}:runReport",
+            json=body,
+            timeout=self.timeout
+        )
+        if response.status_code == 429:
+            retry_after = response.headers.get('Retry-After')
+            raise QuotaExceeded(f"GA4 quota exceeded for {property_id}",
+                                float(retry_after) if retry_after else DEFAULT_RETRY_AFTER_SECONDS)
+        response.raise_for_status()
+        return response.json()
+
+def next_offset(page: Dict[str, Any], offset: int) -> Optional[int]:
+    """Offset of the page after `page` (fetched at `offset`), or None when the report is exhausted"""
+    end = offset + len(page.get("rows", []))
+    return end if offset < end < int(page.get("rowCount", 0)) else None
+
+def page_to_columns(page: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """Convert runReport rows into the columnar batch understood by metrics_engine
+
+    A row aggregates eventCount events with the same dimension values. It stays
+    one entry carrying that count in "event_count" and the row's mean durations,
+    so memory follows the row count however many events a row stands for
+    """
+    rows = [row for row in page.get("rows", []) if int(row["metricValues"][0]["value"] or 0) > 0]
+    dimensions = [row["dimensionValues"] for row in rows]
+    metric_values = [row["metricValues"] for row in rows]
+    counts = [int(m[0]["value"]) for m in metric_values]
+    return {
+        "event_name": [d[0]["value"] for d in dimensions],
+        "button_type": [d[1]["value"] for d in dimensions],
+        "page_variant": [d[2]["value"] for d in dimensions],
+        "visitor_id": [_optional_id(d[3]["value"]) for d in dimensions],
+        "session_id": [_optional_id(d[4]["value"]) for d in dimensions],
+        "hover_duration": [float(m[1]["value"] or 0) / count for m, count in zip(metric_values, counts)],
+        "total_engagement": [float(m[2]["value"] or 0) / count for m, count in zip(metric_values, counts)],
+        "event_count": counts
+    }
+
+def _optional_id(value: str) -> Optional[str]:
+    return None if value in ('', NOT_SET) else value
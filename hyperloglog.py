@@ -0,0 +1,78 @@
+"""
+Mergeable HyperLogLog sketches for distinct visitor and session counts
+Each sketch is a fixed array of 2^PRECISION one-byte registers (2 KB), built
+for many groups at once with vectorized register updates; sketches from
+different batches, partitions or days merge with an element-wise max
+"""
+
+import base64
+import hashlib
+import math
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+# 2^11 registers: 2 KB per sketch, ~2.3% standard error
+PRECISION = 11
+N_REGISTERS = 1 << PRECISION
+_RANK_BITS = 64 - PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / N_REGISTERS)
+
+# Serialized sketches are base64 register bytes; "" is the empty sketch
+EMPTY = ""
+
+def hash_values(values: Sequence[str]) -> np.ndarray:
+    """Stable 64-bit hashes (not Python's per-process salted hash())"""
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'little') for value in values],
+        dtype=np.uint64
+    )
+
+def _registers_and_ranks(hashes: np.ndarray):
+    """Register index from the top bits, rank = 1 + leading zeros of the remaining bits"""
+    registers = (hashes >> np.uint64(_RANK_BITS)).astype(np.intp)
+    remainder = hashes & np.uint64((1 << _RANK_BITS) - 1)
+    # remainder < 2^53 converts to float64 exactly, so frexp's exponent is its bit length
+    bit_length = np.frexp(remainder.astype(np.float64))[1]
+    ranks = (_RANK_BITS - bit_length + 1).astype(np.uint8)
+    return registers, ranks
+
+def grouped_sketches(group_codes: np.ndarray, hashes: np.ndarray, n_groups: int) -> List[str]:
+    """One serialized sketch per group from per-item group codes and hashes"""
+    registers, ranks = _registers_and_ranks(hashes)
+    table = np.zeros(n_groups * N_REGISTERS, dtype=np.uint8)
+    np.maximum.at(table, np.asarray(group_codes, dtype=np.intp) * N_REGISTERS + registers, ranks)
+    return [_encode(row) for row in table.reshape(n_groups, N_REGISTERS)]
+
+def sketch_from_values(values: Iterable[str]) -> str:
+    """Sketch of a single collection of ids"""
+    hashes = hash_values(list(values))
+    return grouped_sketches(np.zeros(len(hashes), dtype=np.intp), hashes, 1)[0]
+
+def _encode(registers: np.ndarray) -> str:
+    return base64.b64encode(registers.tobytes()).decode() if registers.any() else EMPTY
+
+def _decode(sketch: str) -> np.ndarray:
+    if not sketch:
+        return np.zeros(N_REGISTERS, dtype=np.uint8)
+    return np.frombuffer(base64.b64decode(sketch), dtype=np.uint8)
+
+def merge(first: str, second: str) -> str:
+    """Union of two sketches"""
+    if not first:
+        return second
+    if not second:
+        return first
+    return _encode(np.maximum(_decode(first), _decode(second)))
+
+def estimate(sketch: str) -> int:
+    """Estimated number of distinct ids"""
+    if not sketch:
+        return 0
+    registers = _decode(sketch)
+    raw = _ALPHA * N_REGISTERS ** 2 / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    # Linear counting is more accurate while many registers are still empty
+    if raw <= 2.5 * N_REGISTERS and zeros:
+        raw = N_REGISTERS * math.log(N_REGISTERS / zeros)
+    return int(round(raw))
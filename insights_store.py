@@ -0,0 +1,209 @@
+"""
+Historical insights store for button analytics
+Every workflow run's insights and ButtonMetrics are kept in SQLite (WAL mode),
+indexed by time, property and page variant, so trend queries over months of
+runs are answered from indexes instead of rescanning files
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Tuple
+
+DEFAULT_STORE_PATH = 'button_insights.db'
+
+METRIC_FIELDS = (
+    'button_id', 'button_type', 'page_variant', 'total_clicks', 'total_hovers',
+    'avg_hover_duration', 'click_through_rate', 'engagement_score', 'conversion_rate',
+    'hover_duration_p50', 'hover_duration_p90', 'hover_duration_p99',
+    'engagement_p50', 'engagement_p90', 'engagement_p99',
+    'unique_visitors', 'unique_clickers', 'unique_sessions', 'visitor_click_through_rate'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS insight_runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    property_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    insights TEXT NOT NULL,
+    -- Backfilled runs: part of the history, never the latest run
+    historical INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_runs_created ON insight_runs (created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_property_created ON insight_runs (property_id, created_at);
+
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_id INTEGER NOT NULL REFERENCES insight_runs (run_id),
+    property_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    button_id TEXT NOT NULL,
+    button_type TEXT NOT NULL,
+    page_variant TEXT NOT NULL,
+    total_clicks INTEGER NOT NULL,
+    total_hovers INTEGER NOT NULL,
+    avg_hover_duration REAL NOT NULL,
+    click_through_rate REAL NOT NULL,
+    engagement_score REAL NOT NULL,
+    conversion_rate REAL NOT NULL,
+    hover_duration_p50 REAL NOT NULL DEFAULT 0,
+    hover_duration_p90 REAL NOT NULL DEFAULT 0,
+    hover_duration_p99 REAL NOT NULL DEFAULT 0,
+    engagement_p50 REAL NOT NULL DEFAULT 0,
+    engagement_p90 REAL NOT NULL DEFAULT 0,
+    engagement_p99 REAL NOT NULL DEFAULT 0,
+    unique_visitors INTEGER NOT NULL DEFAULT 0,
+    unique_clickers INTEGER NOT NULL DEFAULT 0,
+    unique_sessions INTEGER NOT NULL DEFAULT 0,
+    visitor_click_through_rate REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_run ON run_metrics (run_id);
+CREATE INDEX IF NOT EXISTS idx_metrics_variant_created ON run_metrics (page_variant, created_at);
+CREATE INDEX IF NOT EXISTS idx_metrics_property_variant_created ON run_metrics (property_id, page_variant, created_at);
+"""
+
+def parse_time(value: str, end_of_day: bool = False) -> float:
+    """ISO date or datetime to epoch seconds; a bare date used as an upper bound covers the whole day"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1, microseconds=-1)
+    return parsed.timestamp()
+
+class InsightsStore:
+    """SQLite-backed history of insights runs; connections are kept per thread"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get('INSIGHTS_STORE_PATH', DEFAULT_STORE_PATH)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        if 'historical' not in {row[1] for row in conn.execute("PRAGMA table_info(insight_runs)")}:
+            conn.execute("ALTER TABLE insight_runs ADD COLUMN historical INTEGER NOT NULL DEFAULT 0")
+        # Metric fields added after a store was created become new columns
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(run_metrics)")}
+        for field in METRIC_FIELDS:
+            if field not in columns:
+                conn.execute(f"ALTER TABLE run_metrics ADD COLUMN {field} REAL NOT NULL DEFAULT 0")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def save_run(self, property_id: str, insights: Dict[str, Any], metrics: List[Dict[str, Any]],
+                 created_at: Optional[float] = None, historical: bool = False) -> int:
+        """Store one run's insights and metrics in a single transaction; returns the run id
+
+        Historical runs (backfills) show up in query_runs but never as the latest run.
+        """
+        created_at = created_at if created_at is not None else datetime.now(timezone.utc).timestamp()
+        conn = self._connection()
+        with conn:
+            run_id = conn.execute(
+                "INSERT INTO insight_runs (property_id, created_at, insights, historical) VALUES (?, ?, ?, ?)",
+                (property_id, created_at, json.dumps(insights), int(historical))
+            ).lastrowid
+            conn.executemany(
+                f"INSERT INTO run_metrics (run_id, property_id, created_at, {', '.join(METRIC_FIELDS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(METRIC_FIELDS))})",
+                [(run_id, property_id, created_at, *(metric.get(field, 0.0) for field in METRIC_FIELDS)) for metric in metrics]
+            )
+        return run_id
+
+    def latest_run_id(self, property_id: Optional[str] = None) -> Optional[int]:
+        """Cheap version check for caches: id of the newest non-historical run"""
+        if property_id is None:
+            row = self._connection().execute("SELECT MAX(run_id) FROM insight_runs WHERE historical = 0").fetchone()
+        else:
+            row = self._connection().execute(
+                "SELECT MAX(run_id) FROM insight_runs WHERE property_id = ? AND historical = 0", (property_id,)
+            ).fetchone()
+        return row[0]
+
+    def latest_metrics(self, property_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Metric rows of the newest run"""
+        run_id = self.latest_run_id(property_id)
+        if run_id is None:
+            return []
+        rows = self._connection().execute(
+            f"SELECT {', '.join(METRIC_FIELDS)} FROM run_metrics WHERE run_id = ?", (run_id,)
+        ).fetchall()
+        return [dict(zip(METRIC_FIELDS, values)) for values in rows]
+
+    def latest(self, property_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Insights of the newest run, in the same shape save_insights_to_database writes"""
+        run = self.latest_run(property_id)
+        return None if run is None else run[0]
+
+    def latest_run(self, property_id: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Insights of the newest run and the time it was saved"""
+        run_id = self.latest_run_id(property_id)
+        if run_id is None:
+            return None
+        row = self._connection().execute(
+            "SELECT insights, created_at FROM insight_runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        return json.loads(row[0]), row[1]
+
+    def query_runs(self, start: Optional[float] = None, end: Optional[float] = None,
+                   variant: Optional[str] = None, property_id: Optional[str] = None,
+                   limit: int = 500) -> List[Dict[str, Any]]:
+        """Runs in [start, end], oldest first, each with its metrics (only `variant`'s when given)"""
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("created_at >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("created_at <= ?")
+            params.append(end)
+        if property_id is not None:
+            conditions.append("property_id = ?")
+            params.append(property_id)
+        if variant is not None:
+            # run_metrics carries created_at/property_id too, so the variant index covers the whole filter
+            conditions.append("run_id IN (SELECT run_id FROM run_metrics WHERE page_variant = ? "
+                              "AND created_at >= ? AND created_at <= ?)")
+            params.extend([variant, start if start is not None else float('-inf'),
+                           end if end is not None else float('inf')])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = self._connection()
+        run_rows = conn.execute(
+            f"SELECT run_id, property_id, created_at, insights FROM insight_runs {where} "
+            f"ORDER BY created_at LIMIT ?",
+            [*params, limit]
+        ).fetchall()
+        run_ids = [row[0] for row in run_rows]
+        metric_rows = conn.execute(
+            f"SELECT run_id, {', '.join(METRIC_FIELDS)} FROM run_metrics "
+            f"WHERE run_id IN ({','.join('?' * len(run_ids))})"
+            f"{' AND page_variant = ?' if variant is not None else ''}",
+            [*run_ids, *([variant] if variant is not None else [])]
+        ).fetchall() if run_ids else []
+
+        runs = {
+            run_id: {
+                "run_id": run_id,
+                "property_id": run_property_id,
+                "created_at": datetime.fromtimestamp(created_at, timezone.utc).isoformat(),
+                "insights": json.loads(insights),
+                "metrics": []
+            }
+            for run_id, run_property_id, created_at, insights in run_rows
+        }
+        for run_id, *values in metric_rows:
+            runs[run_id]["metrics"].append(dict(zip(METRIC_FIELDS, values)))
+        return list(runs.values())
@@ -0,0 +1,283 @@
+"""
+Metrics and tracing for the analytics pipeline
+A small in-process metrics registry rendered in the Prometheus text format
+(served at /metrics by the Flask app and by the worker's metrics server),
+a worker interceptor that times every activity, Flask request timing, and
+optional OpenTelemetry tracing when the opentelemetry packages are installed
+
+Recording a sample is a dict lookup and a few additions under a lock, cheap
+enough to leave on in production
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from temporalio import activity
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import PayloadCodec
+from temporalio.worker import ActivityInboundInterceptor, ExecuteActivityInput, Interceptor
+
+try:
+    from opentelemetry import context as otel_context, trace
+    from opentelemetry.propagate import extract
+    from temporalio.contrib.opentelemetry import TracingInterceptor
+except ImportError:
+    trace = None
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_WORKER_METRICS_PORT = 9464
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))  # 256 B .. 64 MiB
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class _Metric(ABC):
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines of every labelled series"""
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, **labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{float(bound)!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Registry:
+    """Metrics plus collectors: callables producing extra exposition lines at scrape time"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception:
+                logging.getLogger(__name__).exception("Metrics collector failed")
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+ACTIVITY_DURATION = REGISTRY.register(Histogram(
+    'button_analytics_activity_duration_seconds', 'Activity execution time', ('activity', 'status')))
+EVENTS_PROCESSED = REGISTRY.register(Counter(
+    'button_analytics_events_processed_total', 'Events aggregated into button metrics'))
+EVENTS_PER_SECOND = REGISTRY.register(Gauge(
+    'button_analytics_events_per_second', 'Aggregation throughput of the last process_button_metrics run'))
+PAYLOAD_BYTES = REGISTRY.register(Histogram(
+    'temporal_payload_bytes', 'Encoded Temporal payload sizes, after conversion and as stored',
+    ('stage',), SIZE_BUCKETS))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'cache_requests_total', 'In-process cache lookups', ('cache', 'result')))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Flask request latency', ('route', 'method', 'status')))
+RATE_LIMIT_WAIT = REGISTRY.register(Histogram(
+    'ga4_rate_limit_wait_seconds', 'Time GA4 requests waited for a quota token', ('quota_class',)))
+QUOTA_EXCEEDED = REGISTRY.register(Counter(
+    'ga4_quota_exceeded_total', 'GA4 requests rejected for quota (HTTP 429) and retried', ('quota_class',)))
+
+class PayloadMetricsCodec(PayloadCodec):
+    """Pass-through codec that records payload sizes at its position in a codec chain"""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    async def encode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        for payload in payloads:
+            PAYLOAD_BYTES.observe(payload.ByteSize(), stage=self.stage)
+        return list(payloads)
+
+    async def decode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        return list(payloads)
+
+# Tracing
+
+def tracing_enabled() -> bool:
+    """OpenTelemetry is installed and not switched off with the standard OTEL_SDK_DISABLED"""
+    return trace is not None and os.environ.get('OTEL_SDK_DISABLED', '').lower() != 'true'
+
+def client_interceptors() -> list:
+    """Temporal client interceptors; the tracing one also traces the worker built on the client"""
+    return [TracingInterceptor()] if tracing_enabled() else []
+
+# Temporal worker
+
+class ActivityMetricsInterceptor(Interceptor):
+    """Records every activity's latency and outcome"""
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return _ActivityMetricsInbound(next)
+
+class _ActivityMetricsInbound(ActivityInboundInterceptor):
+    async def execute_activity(self, input: ExecuteActivityInput):
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            result = await super().execute_activity(input)
+            status = 'ok'
+            return result
+        finally:
+            ACTIVITY_DURATION.observe(time.perf_counter() - start,
+                                      activity=activity.info().activity_type, status=status)
+
+def start_metrics_server(port: Optional[int] = None, host: str = '0.0.0.0') -> Optional[ThreadingHTTPServer]:
+    """Serve REGISTRY at http://host:port/metrics on a daemon thread (WORKER_METRICS_PORT; 0 disables)"""
+    port = int(os.environ.get('WORKER_METRICS_PORT', DEFAULT_WORKER_METRICS_PORT)) if port is None else port
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+# Flask
+
+def instrument_flask(app):
+    """Time every request per route template, and trace it when OpenTelemetry is enabled"""
+    from flask import g, request
+
+    tracer = trace.get_tracer(__name__) if tracing_enabled() else None
+
+    @app.before_request
+    def _start_request():
+        g.request_start = time.perf_counter()
+        if tracer is not None:
+            route = request.url_rule.rule if request.url_rule else request.path
+            # A traceparent header from the browser makes the click the root of the trace
+            g.request_span = tracer.start_span(f"{request.method} {route}", context=extract(request.headers),
+                                               kind=trace.SpanKind.SERVER)
+            g.request_context_token = otel_context.attach(trace.set_span_in_context(g.request_span))
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, route=route,
+                                          method=request.method, status=str(response.status_code))
+        span = g.get('request_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+        return response
+
+    @app.teardown_request
+    def _end_span(exc):
+        span = g.pop('request_span', None)
+        if span is not None:
+            otel_context.detach(g.pop('request_context_token'))
+            span.end()
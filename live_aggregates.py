@@ -0,0 +1,197 @@
+"""
+Live sliding-window aggregates of collected events
+Every batch accepted by /api/events also feeds in-process counters per
+(button_type, page_variant) over the last 5 minutes, hour and day, so the
+dashboard can show near-real-time numbers without a workflow run. Each window
+is a ring of WINDOW_BUCKETS time buckets plus running totals: recording an
+event and expiring old ones are O(1), and a window is exact to 1/WINDOW_BUCKETS
+of its length. Subscribers are woken on change and read one shared snapshot,
+so bursts of events coalesce into one push per PUSH_INTERVAL_SECONDS.
+A stream holds a server thread for as long as the client stays connected, so
+the app needs a threaded (or async) server, and at most LIVE_MAX_STREAMS run
+at once
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from metrics_engine import CLICK_EVENTS, DEFAULT_BUTTON_TYPE, DEFAULT_PAGE_VARIANT, HOVER_EVENTS
+
+WINDOWS = (('5m', 300), ('1h', 3600), ('24h', 86400))
+WINDOW_BUCKETS = 60
+# Minimum time between two pushes to one subscriber; changes in between are merged
+PUSH_INTERVAL_SECONDS = 1.0
+# Idle streams send a comment this often so proxies keep the connection open
+KEEPALIVE_SECONDS = 15.0
+
+# Concurrent SSE streams allowed per process (each one occupies a server thread)
+DEFAULT_MAX_STREAMS = 16
+
+def max_streams_from_env() -> int:
+    return int(os.environ.get('LIVE_MAX_STREAMS', DEFAULT_MAX_STREAMS))
+
+# Per-cell counters: clicks, hovers, summed hover duration, summed engagement (ms)
+CLICKS, HOVERS, HOVER_MS, ENGAGEMENT_MS = range(4)
+
+Key = Tuple[str, str]
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+class SlidingWindow:
+    """Counters per key over the last `seconds`, in WINDOW_BUCKETS buckets"""
+
+    def __init__(self, seconds: float, buckets: int = WINDOW_BUCKETS):
+        self.seconds = seconds
+        self.bucket_seconds = seconds / buckets
+        self.buckets = buckets
+        self._ring: Deque[Tuple[int, Dict[Key, List[float]]]] = deque()
+        self.totals: Dict[Key, List[float]] = {}
+
+    def advance(self, now: float) -> int:
+        """Drop buckets that slid out of the window; returns the current bucket index"""
+        index = int(now // self.bucket_seconds)
+        while self._ring and self._ring[0][0] <= index - self.buckets:
+            _, expired = self._ring.popleft()
+            for key, counts in expired.items():
+                totals = self.totals[key]
+                for i, value in enumerate(counts):
+                    totals[i] -= value
+                if not totals[CLICKS] and not totals[HOVERS]:
+                    del self.totals[key]
+        return index
+
+    def add(self, now: float, key: Key, counts: List[float]):
+        index = self.advance(now)
+        if not self._ring or self._ring[-1][0] != index:
+            self._ring.append((index, {}))
+        bucket = self._ring[-1][1].setdefault(key, [0.0] * len(counts))
+        totals = self.totals.setdefault(key, [0.0] * len(counts))
+        for i, value in enumerate(counts):
+            bucket[i] += value
+            totals[i] += value
+
+    def rows(self) -> List[Dict[str, Any]]:
+        rows = []
+        for (button_type, page_variant), (clicks, hovers, hover_ms, engagement_ms) in sorted(self.totals.items()):
+            rows.append({
+                'button_type': button_type,
+                'page_variant': page_variant,
+                'clicks': int(clicks),
+                'hovers': int(hovers),
+                # Same CTR definition as the workflow metrics: clicks out of max(hovers, clicks)
+                'click_through_rate': clicks / max(hovers, clicks) if clicks else 0.0,
+                'avg_hover_duration': hover_ms / hovers if hovers else 0.0,
+                'avg_engagement': engagement_ms / clicks if clicks else 0.0
+            })
+        return rows
+
+class LiveAggregator:
+    """Sliding-window counters for every WINDOWS entry, and change notification for streams"""
+
+    def __init__(self, windows=WINDOWS, clock: Callable[[], float] = time.time,
+                 max_streams: Optional[int] = None):
+        self.clock = clock
+        self._stream_slots = threading.BoundedSemaphore(max_streams if max_streams is not None
+                                                        else max_streams_from_env())
+        self.windows = {name: SlidingWindow(seconds) for name, seconds in windows}
+        self.version = 0
+        self._changed = threading.Condition()
+        self._snapshot: Optional[Tuple[Tuple[int, int], str]] = None
+
+    def record(self, events: List[Dict[str, Any]]) -> int:
+        """Count a collector batch at its arrival time; returns how many events counted"""
+        cells: Dict[Key, List[float]] = {}
+        for event in events:
+            name = event.get('event_name')
+            is_click, is_hover = name in CLICK_EVENTS, name in HOVER_EVENTS
+            if not is_click and not is_hover:
+                continue
+            key = (str(event.get('button_type') or DEFAULT_BUTTON_TYPE),
+                   str(event.get('page_variant') or DEFAULT_PAGE_VARIANT))
+            counts = cells.setdefault(key, [0.0, 0.0, 0.0, 0.0])
+            if is_click:
+                counts[CLICKS] += 1
+                counts[ENGAGEMENT_MS] += _number(event.get('total_engagement'))
+            else:
+                counts[HOVERS] += 1
+                counts[HOVER_MS] += _number(event.get('hover_duration'))
+        if not cells:
+            return 0
+
+        with self._changed:
+            now = self.clock()
+            for window in self.windows.values():
+                for key, counts in cells.items():
+                    window.add(now, key, counts)
+            self.version += 1
+            self._changed.notify_all()
+        return int(sum(counts[CLICKS] + counts[HOVERS] for counts in cells.values()))
+
+    def snapshot_json(self) -> str:
+        """Current aggregates as JSON, built once per change (or per expiry of the finest bucket)"""
+        with self._changed:
+            now = self.clock()
+            finest = min(self.windows.values(), key=lambda window: window.bucket_seconds)
+            stamp = (self.version, int(now // finest.bucket_seconds))
+            if self._snapshot is None or self._snapshot[0] != stamp:
+                for window in self.windows.values():
+                    window.advance(now)
+                body = json.dumps({
+                    'version': self.version,
+                    'windows': {name: window.rows() for name, window in self.windows.items()}
+                }, separators=(',', ':'))
+                self._snapshot = (stamp, body)
+            return self._snapshot[1]
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """Block until the version moves past `version` or timeout; returns the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def open_stream(self, push_interval: float = PUSH_INTERVAL_SECONDS,
+                    keepalive: float = KEEPALIVE_SECONDS) -> Optional["LiveStream"]:
+        """A stream holding one of the stream slots, or None when all are taken"""
+        if not self._stream_slots.acquire(blocking=False):
+            return None
+        return LiveStream(self.stream(push_interval, keepalive), self._stream_slots.release)
+
+    def stream(self, push_interval: float = PUSH_INTERVAL_SECONDS,
+               keepalive: float = KEEPALIVE_SECONDS) -> Iterator[str]:
+        """Server-Sent Events: the snapshot now, then at most one per push_interval while things change"""
+        version = self.version
+        last_sent = self.snapshot_json()
+        yield f"event: aggregates\ndata: {last_sent}\n\n"
+        while True:
+            time.sleep(push_interval)
+            version = self.wait_for_change(version, keepalive)
+            body = self.snapshot_json()
+            if body == last_sent:
+                yield ": keepalive\n\n"
+                continue
+            last_sent = body
+            yield f"event: aggregates\ndata: {body}\n\n"
+
+class LiveStream:
+    """An SSE iterator that gives its slot back when the server closes it (client gone)"""
+
+    def __init__(self, events: Iterator[str], release: Callable[[], None]):
+        self._events = events
+        self._release: Optional[Callable[[], None]] = release
+
+    def __iter__(self) -> "LiveStream":
+        return self
+
+    def __next__(self) -> str:
+        return next(self._events)
+
+    def close(self):
+        self._events.close()
+        if self._release is not None:
+            self._release, release = None, self._release
+            release()
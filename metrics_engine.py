@@ -0,0 +1,383 @@
+"""
+Columnar aggregation engine for button analytics
+Loads GA4 events into typed NumPy arrays and computes per-button metrics
+with grouped reductions instead of per-event Python bookkeeping
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+import hyperloglog
+from quantile_sketch import QUANTILES, Sketch, grouped_sketches, merge_sketch, sketch_quantiles
+
+# Event names that count towards clicks and hovers
+CLICK_EVENTS = ('cta_click', 'navigation_click', 'feature_click')
+HOVER_EVENTS = ('button_hover_start', 'nav_hover_start', 'feature_hover_start')
+
+# Columns understood by the engine; missing columns take these defaults
+EVENT_COLUMNS = ('event_name', 'button_type', 'page_variant', 'hover_duration', 'total_engagement',
+                 'visitor_id', 'session_id', 'event_count')
+DEFAULT_BUTTON_TYPE = 'unknown'
+DEFAULT_PAGE_VARIANT = 'unknown'
+
+# Duration percentile fields added to every metric row, in QUANTILES order
+HOVER_QUANTILE_FIELDS = ('hover_duration_p50', 'hover_duration_p90', 'hover_duration_p99')
+ENGAGEMENT_QUANTILE_FIELDS = ('engagement_p50', 'engagement_p90', 'engagement_p99')
+
+# Partial fields holding HyperLogLog sketches, merged by register-wise max
+DISTINCT_FIELDS = ('visitor_hll', 'clicker_hll', 'session_hll')
+
+@dataclass
+class EventColumns:
+    """Column-oriented view of a batch of events, one array entry per event or aggregated row"""
+    group_keys: List[str]
+    group_codes: np.ndarray
+    is_click: np.ndarray
+    is_hover: np.ndarray
+    hover_duration: np.ndarray
+    total_engagement: np.ndarray
+    # 64-bit id hashes; has_* marks events that carry the id at all
+    visitor_hash: np.ndarray
+    has_visitor: np.ndarray
+    session_hash: np.ndarray
+    has_session: np.ndarray
+    # Events each entry stands for, whose mean durations it carries; None means one event per entry
+    event_count: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.group_codes)
+
+@dataclass
+class GroupTotals:
+    """Per-group sums and counts produced by the grouped reductions"""
+    group_keys: List[str]
+    clicks: np.ndarray
+    hovers: np.ndarray
+    hover_duration_sum: np.ndarray
+    engagement_sum: np.ndarray
+    hover_duration_sketches: List[Sketch]
+    engagement_sketches: List[Sketch]
+    visitor_sketches: List[str]
+    clicker_sketches: List[str]
+    session_sketches: List[str]
+
+def _factorize(values: Any) -> Tuple[np.ndarray, List[Any]]:
+    """Map each value to a dense integer code, numbering values in first-seen order
+
+    Dictionary-encoded columns ({"values": [...], "codes": [...]}) are used as-is
+    """
+    if isinstance(values, dict):
+        return np.asarray(values["codes"], dtype=np.intp), list(values["values"])
+    index = {value: code for code, value in enumerate(dict.fromkeys(values))}
+    codes = np.fromiter(map(index.__getitem__, values), dtype=np.intp, count=len(values))
+    return codes, list(index)
+
+def _first_seen_order(codes: np.ndarray, n_codes: int) -> List[int]:
+    """Codes present in `codes`, ordered by first occurrence
+
+    New groups almost always show up early, so growing prefixes are scanned
+    instead of sorting the whole column
+    """
+    unseen = np.bincount(codes, minlength=n_codes) > 0
+    order: List[int] = []
+    start, chunk = 0, 1 << 16
+    while unseen.any():
+        block_codes, block_first = np.unique(codes[start:start + chunk], return_index=True)
+        new = unseen[block_codes]
+        block_codes, block_first = block_codes[new], block_first[new]
+        order.extend(block_codes[np.argsort(block_first, kind='stable')].tolist())
+        unseen[block_codes] = False
+        start += chunk
+        chunk *= 2
+    return order
+
+def _group_codes(button_types: Any, page_variants: Any) -> Tuple[np.ndarray, List[str]]:
+    """Assign every event to its "<button_type>_<page_variant>" group, groups in first-seen order"""
+    type_codes, types = _factorize(button_types)
+    variant_codes, variants = _factorize(page_variants)
+    n_variants = max(len(variants), 1)
+    pair_codes = type_codes * n_variants + variant_codes
+
+    # Distinct pairs that render to the same key are folded together, as the key is the identity
+    keys: Dict[str, int] = {}
+    pair_to_group = np.zeros(len(types) * n_variants, dtype=np.intp)
+    for pair in _first_seen_order(pair_codes, len(pair_to_group)):
+        key = f"{types[pair // n_variants]}_{variants[pair % n_variants]}"
+        pair_to_group[pair] = keys.setdefault(key, len(keys))
+
+    return pair_to_group[pair_codes], list(keys)
+
+def _event_flags(event_names: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """Boolean click/hover masks, classifying each distinct event name once"""
+    name_codes, names = _factorize(event_names)
+    is_click = np.array([name in CLICK_EVENTS for name in names], dtype=bool)
+    is_hover = np.array([name in HOVER_EVENTS for name in names], dtype=bool)
+    return is_click[name_codes], is_hover[name_codes]
+
+def _id_hashes(ids: Any, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-event id hashes and presence mask, hashing each distinct id once"""
+    if ids is None or (isinstance(ids, list) and not any(ids)):
+        return np.zeros(n, dtype=np.uint64), np.zeros(n, dtype=bool)
+    codes, values = _factorize(ids)
+    present = np.array([value not in (None, '') for value in values], dtype=bool)
+    return hyperloglog.hash_values(values)[codes], present[codes]
+
+def _column_length(column: Any) -> int:
+    return len(column["codes"]) if isinstance(column, dict) else len(column)
+
+def columns_from_columnar(columns: Dict[str, Any]) -> EventColumns:
+    """Load a columnar batch ({"event_name": [...], "button_type": [...], ...}) into typed arrays
+
+    String columns may be plain sequences or dictionary-encoded as
+    {"values": [...], "codes": [...]}; numeric columns may be sequences or arrays.
+    An optional "event_count" column weights entries that stand for several events
+    """
+    n = next((_column_length(columns[name]) for name in EVENT_COLUMNS if name in columns), 0)
+
+    def column(name, default):
+        values = columns.get(name)
+        return [default] * n if values is None else values
+
+    group_codes, group_keys = _group_codes(
+        column('button_type', DEFAULT_BUTTON_TYPE),
+        column('page_variant', DEFAULT_PAGE_VARIANT)
+    )
+    is_click, is_hover = _event_flags(column('event_name', None))
+    visitor_hash, has_visitor = _id_hashes(columns.get('visitor_id'), n)
+    session_hash, has_session = _id_hashes(columns.get('session_id'), n)
+
+    return EventColumns(
+        group_keys=group_keys,
+        group_codes=group_codes,
+        is_click=is_click,
+        is_hover=is_hover,
+        hover_duration=np.asarray(column('hover_duration', 0), dtype=np.float64),
+        total_engagement=np.asarray(column('total_engagement', 0), dtype=np.float64),
+        visitor_hash=visitor_hash,
+        has_visitor=has_visitor,
+        session_hash=session_hash,
+        has_session=has_session,
+        event_count=None if columns.get('event_count') is None
+        else np.asarray(columns['event_count'], dtype=np.int64)
+    )
+
+def columns_from_events(events: List[Dict[str, Any]]) -> EventColumns:
+    """Load a list of event dicts into typed arrays"""
+    group_codes, group_keys = _group_codes(
+        [e.get('button_type', DEFAULT_BUTTON_TYPE) for e in events],
+        [e.get('page_variant', DEFAULT_PAGE_VARIANT) for e in events]
+    )
+    is_click, is_hover = _event_flags([e.get('event_name') for e in events])
+
+    # Durations only matter for the events they are averaged over, so only those are read
+    hover_duration = np.zeros(len(events), dtype=np.float64)
+    hover_index = np.flatnonzero(is_hover)
+    hover_duration[hover_index] = [events[i].get('hover_duration') or 0 for i in hover_index.tolist()]
+
+    total_engagement = np.zeros(len(events), dtype=np.float64)
+    click_index = np.flatnonzero(is_click)
+    total_engagement[click_index] = [events[i].get('total_engagement') or 0 for i in click_index.tolist()]
+
+    visitor_hash, has_visitor = _id_hashes([e.get('visitor_id') for e in events], len(events))
+    session_hash, has_session = _id_hashes([e.get('session_id') for e in events], len(events))
+
+    return EventColumns(
+        group_keys=group_keys,
+        group_codes=group_codes,
+        is_click=is_click,
+        is_hover=is_hover,
+        hover_duration=hover_duration,
+        total_engagement=total_engagement,
+        visitor_hash=visitor_hash,
+        has_visitor=has_visitor,
+        session_hash=session_hash,
+        has_session=has_session
+    )
+
+def events_to_columns(events: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Columnar batch of event dicts, for sources that deliver rows (the event log, mock data)"""
+    return {
+        'event_name': [e.get('event_name') for e in events],
+        'button_type': [e.get('button_type') or DEFAULT_BUTTON_TYPE for e in events],
+        'page_variant': [e.get('page_variant') or DEFAULT_PAGE_VARIANT for e in events],
+        'hover_duration': [e.get('hover_duration') or 0 for e in events],
+        'total_engagement': [e.get('total_engagement') or 0 for e in events],
+        'visitor_id': [e.get('visitor_id') for e in events],
+        'session_id': [e.get('session_id') for e in events]
+    }
+
+def columns_from_raw_data(raw_data: Dict[str, Any]) -> EventColumns:
+    """Load fetch_ga4_data output, which carries either "columns" or row-wise "events" """
+    if raw_data.get("columns") is not None:
+        return columns_from_columnar(raw_data["columns"])
+    return columns_from_events(raw_data.get("events", []))
+
+def aggregate_columns(columns: EventColumns) -> GroupTotals:
+    """Compute per-group click/hover counts and duration sums, weighted by event_count"""
+    n_groups = len(columns.group_keys)
+    click_codes = columns.group_codes[columns.is_click]
+    hover_codes = columns.group_codes[columns.is_hover]
+    hover_durations = columns.hover_duration[columns.is_hover]
+    engagement_times = columns.total_engagement[columns.is_click]
+    clicker = columns.has_visitor & columns.is_click
+
+    click_counts = hover_counts = None
+    hover_duration_sums, engagement_sums = hover_durations, engagement_times
+    if columns.event_count is not None:
+        click_counts = columns.event_count[columns.is_click]
+        hover_counts = columns.event_count[columns.is_hover]
+        hover_duration_sums = hover_durations * hover_counts
+        engagement_sums = engagement_times * click_counts
+
+    return GroupTotals(
+        group_keys=columns.group_keys,
+        clicks=np.bincount(click_codes, weights=click_counts, minlength=n_groups).astype(np.int64),
+        hovers=np.bincount(hover_codes, weights=hover_counts, minlength=n_groups).astype(np.int64),
+        hover_duration_sum=np.bincount(hover_codes, weights=hover_duration_sums, minlength=n_groups),
+        engagement_sum=np.bincount(click_codes, weights=engagement_sums, minlength=n_groups),
+        hover_duration_sketches=grouped_sketches(hover_codes, hover_durations, n_groups, hover_counts),
+        engagement_sketches=grouped_sketches(click_codes, engagement_times, n_groups, click_counts),
+        visitor_sketches=hyperloglog.grouped_sketches(
+            columns.group_codes[columns.has_visitor], columns.visitor_hash[columns.has_visitor], n_groups
+        ),
+        clicker_sketches=hyperloglog.grouped_sketches(
+            columns.group_codes[clicker], columns.visitor_hash[clicker], n_groups
+        ),
+        session_sketches=hyperloglog.grouped_sketches(
+            columns.group_codes[columns.has_session], columns.session_hash[columns.has_session], n_groups
+        )
+    )
+
+def metric_rows_from_totals(totals: GroupTotals) -> List[Dict[str, Any]]:
+    """Derive ButtonMetrics fields (averages, CTR, engagement score) per group"""
+    clicks = totals.clicks
+    hovers = totals.hovers
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_hover_duration = np.where(hovers > 0, totals.hover_duration_sum / hovers, 0.0)
+        click_through_rate = np.where(hovers > 0, clicks / hovers, 0.0)
+
+    # Calculate engagement score (combination of CTR, hover time, and clicks)
+    engagement_score = (click_through_rate * 0.4 +
+                        (avg_hover_duration / 1000) * 0.3 +
+                        (clicks / 10) * 0.3)
+
+    rows = []
+    for key, n_clicks, n_hovers, avg_hover, ctr, score, hover_sketch, engagement_sketch, \
+            visitor_sketch, clicker_sketch, session_sketch in zip(
+        totals.group_keys,
+        clicks.tolist(),
+        hovers.tolist(),
+        avg_hover_duration.tolist(),
+        click_through_rate.tolist(),
+        engagement_score.tolist(),
+        totals.hover_duration_sketches,
+        totals.engagement_sketches,
+        totals.visitor_sketches,
+        totals.clicker_sketches,
+        totals.session_sketches
+    ):
+        button_type, page_variant = key.split('_', 1)
+        rows.append({
+            "button_id": key,
+            "button_type": button_type,
+            "page_variant": page_variant,
+            "total_clicks": n_clicks,
+            "total_hovers": n_hovers,
+            "avg_hover_duration": avg_hover,
+            "click_through_rate": ctr,
+            "engagement_score": score,
+            "conversion_rate": ctr,
+            **dict(zip(HOVER_QUANTILE_FIELDS, sketch_quantiles(hover_sketch, QUANTILES))),
+            **dict(zip(ENGAGEMENT_QUANTILE_FIELDS, sketch_quantiles(engagement_sketch, QUANTILES))),
+            **distinct_fields(visitor_sketch, clicker_sketch, session_sketch),
+            # Duration histograms travel with the row so insights can bootstrap them
+            "hover_duration_sketch": hover_sketch,
+            "engagement_sketch": engagement_sketch
+        })
+    return rows
+
+def distinct_fields(visitor_sketch: str, clicker_sketch: str, session_sketch: str) -> Dict[str, Any]:
+    """Distinct visitor/clicker/session estimates and the per-visitor click-through rate"""
+    unique_visitors = hyperloglog.estimate(visitor_sketch)
+    # Clickers are a subset of visitors; cap estimation noise so the rate stays within [0, 1]
+    unique_clickers = min(hyperloglog.estimate(clicker_sketch), unique_visitors)
+    return {
+        "unique_visitors": unique_visitors,
+        "unique_clickers": unique_clickers,
+        "unique_sessions": hyperloglog.estimate(session_sketch),
+        "visitor_click_through_rate": unique_clickers / unique_visitors if unique_visitors else 0.0
+    }
+
+def partials_from_totals(totals: GroupTotals) -> Dict[str, Dict[str, Any]]:
+    """JSON-serializable per-group sums, counts and duration sketches, keyed by button_id"""
+    return {
+        key: {
+            "clicks": clicks,
+            "hovers": hovers,
+            "hover_duration_sum": hover_duration_sum,
+            "engagement_sum": engagement_sum,
+            "hover_duration_sketch": hover_sketch,
+            "engagement_sketch": engagement_sketch,
+            "visitor_hll": visitor_sketch,
+            "clicker_hll": clicker_sketch,
+            "session_hll": session_sketch
+        }
+        for key, clicks, hovers, hover_duration_sum, engagement_sum, hover_sketch, engagement_sketch,
+            visitor_sketch, clicker_sketch, session_sketch in zip(
+            totals.group_keys,
+            totals.clicks.tolist(),
+            totals.hovers.tolist(),
+            totals.hover_duration_sum.tolist(),
+            totals.engagement_sum.tolist(),
+            totals.hover_duration_sketches,
+            totals.engagement_sketches,
+            totals.visitor_sketches,
+            totals.clicker_sketches,
+            totals.session_sketches
+        )
+    }
+
+def totals_from_partials(partials: Dict[str, Dict[str, Any]]) -> GroupTotals:
+    """Inverse of partials_from_totals"""
+    groups = list(partials.values())
+    return GroupTotals(
+        group_keys=list(partials),
+        clicks=np.array([g["clicks"] for g in groups], dtype=np.int64),
+        hovers=np.array([g["hovers"] for g in groups], dtype=np.int64),
+        hover_duration_sum=np.array([g["hover_duration_sum"] for g in groups], dtype=np.float64),
+        engagement_sum=np.array([g["engagement_sum"] for g in groups], dtype=np.float64),
+        hover_duration_sketches=[g.get("hover_duration_sketch", {}) for g in groups],
+        engagement_sketches=[g.get("engagement_sketch", {}) for g in groups],
+        visitor_sketches=[g.get("visitor_hll", hyperloglog.EMPTY) for g in groups],
+        clicker_sketches=[g.get("clicker_hll", hyperloglog.EMPTY) for g in groups],
+        session_sketches=[g.get("session_hll", hyperloglog.EMPTY) for g in groups]
+    )
+
+def merge_partials(target: Dict[str, Dict[str, Any]], other: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Fold `other` into `target` in place; groups keep their first-seen order"""
+    for key, group in other.items():
+        merged = target.setdefault(key, {})
+        for field, value in group.items():
+            if field in DISTINCT_FIELDS:
+                merged[field] = hyperloglog.merge(merged.get(field, hyperloglog.EMPTY), value)
+            elif isinstance(value, dict):
+                merge_sketch(merged.setdefault(field, {}), value)
+            else:
+                merged[field] = merged.get(field, 0) + value
+    return target
+
+def compute_partials(raw_data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Mergeable per-group sums, counts and sketches for one batch of raw data"""
+    return partials_from_totals(aggregate_columns(columns_from_raw_data(raw_data)))
+
+def compute_metric_rows(raw_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Columnar pipeline: raw data -> typed arrays -> grouped reductions -> metric rows
+
+    raw_data may also carry pre-aggregated "partials" from a streaming fetch
+    """
+    if raw_data.get("partials") is not None:
+        return metric_rows_from_totals(totals_from_partials(raw_data["partials"]))
+    return metric_rows_from_totals(aggregate_columns(columns_from_raw_data(raw_data)))
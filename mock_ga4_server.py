@@ -0,0 +1,207 @@
+"""
+Local mock of the GA4 reporting API
+Serves deterministic runReport responses, paginated by offset and limit, so
+streaming fetches can be tested and demoed without Google credentials. Every
+event is its own row (eventCount 1). With a quota it answers like GA4
+once the (project-wide) token bucket is empty: 429 RESOURCE_EXHAUSTED
+
+Usage: python mock_ga4_server.py [port] [events_per_day] [quota requests/s]
+"""
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional
+
+BUTTON_TYPES = ['cta', 'navigation', 'feature']
+PAGE_VARIANTS = ['original', 'colors', 'sizes', 'spacing', 'typography']
+EVENT_NAMES = [
+    'cta_click', 'navigation_click', 'feature_click',
+    'button_hover_start', 'nav_hover_start', 'feature_hover_start',
+    'button_hover_end', 'page_view'
+]
+
+# Synthetic visitors per day, as a fraction of events, and sessions per visitor
+VISITORS_PER_EVENT = 0.2
+SESSIONS_PER_VISITOR = 3
+
+REPORT_PATH = re.compile(r'^/v1beta/properties/(?P<property_id>[^/:]+):runReport$')
+
+class MockGA4ReportingServer:
+    """Threaded HTTP server that serves a fixed number of synthetic events per day"""
+
+    def __init__(self, events_per_day: int = 1000, host: str = '127.0.0.1', port: int = 0, seed: int = 0,
+                 quota_rate: Optional[float] = None, quota_burst: Optional[float] = None):
+        self.events_per_day = events_per_day
+        self.seed = seed
+        self.request_count = 0
+        # Requests per second shared by all properties, and the bucket size (defaults to one second's worth)
+        self.quota_rate = quota_rate
+        self.quota_burst = quota_burst if quota_burst is not None else (quota_rate or 0)
+        self.throttled_count = 0
+        self._tokens = self.quota_burst
+        self._tokens_updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockGA4ReportingServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def day_events(self, property_id: str, day: str) -> List[Dict[str, Any]]:
+        """Synthetic events for one property and day; identical on every call"""
+        return _day_events(property_id, day, self.events_per_day, self.seed)
+
+    def events(self, property_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+        """Every event in the inclusive date range, in report order"""
+        events = []
+        for day in _days(start_date, end_date):
+            events.extend(self.day_events(property_id, day))
+        return events
+
+    def take_quota_token(self) -> bool:
+        """Spend one quota token; False (a 429) when the bucket is empty"""
+        if not self.quota_rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.quota_burst, self._tokens + (now - self._tokens_updated) * self.quota_rate)
+            self._tokens_updated = now
+            if self._tokens < 1:
+                self.throttled_count += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def run_report(self, property_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Build one runReport page; rows are generated lazily per day, never for the whole range"""
+        date_range = body["dateRanges"][0]
+        days = _days(date_range["startDate"], date_range["endDate"])
+        # GA4 sends int64 fields as strings in JSON and accepts either
+        page_size = int(body.get("limit", 10000))
+        offset = int(body.get("offset", 0))
+        row_count = len(days) * self.events_per_day
+
+        rows = []
+        position = offset
+        end = min(offset + page_size, row_count)
+        while position < end:
+            day_index, index = divmod(position, self.events_per_day)
+            chunk = self.day_events(property_id, days[day_index])[index:index + end - position]
+            rows.extend(_report_row(event) for event in chunk)
+            position += len(chunk)
+
+        return {
+            "dimensionHeaders": [{"name": name} for name in ('eventName', 'customEvent:button_type', 'customEvent:page_variant')],
+            "metricHeaders": [{"name": name, "type": "TYPE_INTEGER"} for name in ('eventCount', 'customEvent:hover_duration', 'customEvent:total_engagement')],
+            "rows": rows,
+            "rowCount": row_count
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                match = REPORT_PATH.match(self.path)
+                if not match:
+                    self._send(404, {"error": {"code": 404, "message": "Not found"}})
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not server.take_quota_token():
+                    self._send(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                               "message": "Exhausted quota tokens per second"}},
+                               {'Retry-After': f"{1 / server.quota_rate:.3f}"})
+                    return
+                with server._lock:
+                    server.request_count += 1
+                self._send(200, server.run_report(match.group('property_id'), body))
+
+            def _send(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def _days(start_date: str, end_date: str) -> List[str]:
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
+
+@lru_cache(maxsize=64)
+def _day_events(property_id: str, day: str, events_per_day: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(f"{seed}:{property_id}:{day}")
+    n_visitors = max(1, int(events_per_day * VISITORS_PER_EVENT))
+    events = []
+    for _ in range(events_per_day):
+        visitor = rng.randrange(n_visitors)
+        events.append({
+            "event_name": rng.choice(EVENT_NAMES),
+            "button_type": rng.choice(BUTTON_TYPES),
+            "page_variant": rng.choice(PAGE_VARIANTS),
+            "hover_duration": rng.randint(50, 5000),
+            "total_engagement": rng.randint(100, 10000),
+            "visitor_id": f"v{visitor}",
+            "session_id": f"v{visitor}-{day}-{rng.randrange(SESSIONS_PER_VISITOR)}"
+        })
+    return events
+
+def _report_row(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "dimensionValues": [
+            {"value": event[name]}
+            for name in ("event_name", "button_type", "page_variant", "visitor_id", "session_id")
+        ],
+        "metricValues": [{"value": "1"}, {"value": str(event["hover_duration"])},
+                         {"value": str(event["total_engagement"])}]
+    }
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    events_per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    quota_rate = float(sys.argv[3]) if len(sys.argv) > 3 else None
+    server = MockGA4ReportingServer(events_per_day=events_per_day, port=port, quota_rate=quota_rate)
+    quota = f", quota {quota_rate:g} requests/s" if quota_rate else ""
+    print(f"🧪 Mock GA4 reporting server on {server.url} ({events_per_day} events/day{quota})")
+    print(f"   export GA4_REPORTING_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,77 @@
+"""
+Compression codec for Temporal payloads
+Payloads are compressed with zstd when the optional `zstandard` package is
+installed and with zlib otherwise; both are always accepted when decoding
+(zstd needs the package), so workers and clients can be upgraded one at a time
+"""
+
+import zlib
+from typing import List, Sequence
+
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import PayloadCodec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_ENCODING = b"binary/zstd"
+ZLIB_ENCODING = b"binary/zlib"
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+# Smaller payloads are left alone: headers would eat most of the saving
+MIN_COMPRESS_BYTES = 256
+
+class CompressionCodec(PayloadCodec):
+    """Compresses each payload (metadata and data) into a binary/zstd or binary/zlib payload"""
+
+    def __init__(self, use_zstd: bool = True, min_bytes: int = MIN_COMPRESS_BYTES):
+        self.use_zstd = use_zstd and zstandard is not None
+        self.min_bytes = min_bytes
+
+    def compress(self, data: bytes) -> Payload:
+        if self.use_zstd:
+            return Payload(metadata={"encoding": ZSTD_ENCODING},
+                           data=zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data))
+        return Payload(metadata={"encoding": ZLIB_ENCODING}, data=zlib.compress(data, ZLIB_LEVEL))
+
+    async def encode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        encoded = []
+        for payload in payloads:
+            if payload.ByteSize() < self.min_bytes:
+                encoded.append(payload)
+                continue
+            compressed = self.compress(payload.SerializeToString())
+            # Already-compressed data can grow; keep whichever is smaller
+            encoded.append(compressed if compressed.ByteSize() < payload.ByteSize() else payload)
+        return encoded
+
+    async def decode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        return [_decompress(payload) for payload in payloads]
+
+def _decompress(payload: Payload) -> Payload:
+    encoding = payload.metadata.get("encoding")
+    if encoding == ZLIB_ENCODING:
+        return Payload.FromString(zlib.decompress(payload.data))
+    if encoding == ZSTD_ENCODING:
+        if zstandard is None:
+            raise RuntimeError("Payload is zstd-compressed but the zstandard package is not installed")
+        return Payload.FromString(zstandard.ZstdDecompressor().decompress(payload.data))
+    return payload
+
+class CodecChain(PayloadCodec):
+    """Applies codecs in order when encoding and in reverse order when decoding"""
+
+    def __init__(self, *codecs: PayloadCodec):
+        self.codecs = codecs
+
+    async def encode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        for codec in self.codecs:
+            payloads = await codec.encode(payloads)
+        return list(payloads)
+
+    async def decode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        for codec in reversed(self.codecs):
+            payloads = await codec.decode(payloads)
+        return list(payloads)
@@ -0,0 +1,281 @@
+"""
+On-demand profiling of workflow activities
+A run opts in with the "profile_activities" memo (see workflow_trigger's
+`profile` argument) or the worker opts in every run with PROFILE_ACTIVITIES.
+Selected activities have their CPU work (everything sent through
+cpu_pool.run_cpu) profiled with cProfile and a stack sampler, and peak memory
+traced with tracemalloc; results go to PROFILE_DIR/<workflow id>/<activity>.*:
+
+  .pstats     cProfile stats (python -m pstats, snakeviz)
+  .collapsed  sampled stacks in collapsed format (flamegraph.pl, speedscope)
+  .json       wall time, CPU calls, peak memory and the hottest functions
+"""
+
+import contextvars
+import cProfile
+import json
+import logging
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from temporalio import activity, workflow
+from temporalio.api.common.v1 import Payload
+from temporalio.worker import (
+    ActivityInboundInterceptor,
+    ExecuteActivityInput,
+    Interceptor,
+    StartActivityInput,
+    WorkflowInboundInterceptor,
+    WorkflowInterceptorClassInput,
+    WorkflowOutboundInterceptor
+)
+
+PROFILE_MEMO_KEY = 'profile_activities'
+PROFILE_HEADER = 'profile-activities'
+# What `profile=True` selects: the two activities doing the heavy lifting
+DEFAULT_PROFILED_ACTIVITIES = ('process_button_metrics', 'generate_button_insights')
+SAMPLE_INTERVAL_SECONDS = 0.005
+TOP_FUNCTIONS = 20
+
+logger = logging.getLogger(__name__)
+
+def requested_activities(value: Any) -> List[str]:
+    """Normalize a profile request: True, "all", a comma-separated string or a list of activity names"""
+    if value is True:
+        return list(DEFAULT_PROFILED_ACTIVITIES)
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [name.strip() for name in value if name and name.strip()]
+
+def _selected(activity_type: str, requested: Iterable[str]) -> bool:
+    requested = set(requested)
+    return activity_type in requested or 'all' in requested
+
+# Profiling CPU work
+
+class StackSampler:
+    """Samples one thread's Python stack every `interval` seconds into collapsed-stack counts"""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+@dataclass
+class CpuProfile:
+    """What one profiled run_cpu call sends back alongside its result"""
+    stats: Dict[Tuple, Tuple]
+    stacks: Dict[str, int]
+    peak_bytes: Optional[int]
+    seconds: float
+
+def profiled_call(fn: Callable[..., Any], *args: Any) -> Tuple[Any, CpuProfile]:
+    """fn(*args) under cProfile, a stack sampler and tracemalloc; runs in the pool process (or a thread)"""
+    # In a pool process we own tracemalloc; on a thread the activity's own trace is already running
+    own_trace = not tracemalloc.is_tracing()
+    if own_trace:
+        tracemalloc.start()
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        result = fn(*args)
+    finally:
+        profiler.disable()
+        sampler.stop()
+        peak = None
+        if own_trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    profiler.create_stats()
+    return result, CpuProfile(profiler.stats, dict(sampler.stacks), peak, time.perf_counter() - start)
+
+class _RawStats:
+    """Lets pstats.Stats load a stats dict shipped back from another process"""
+
+    def __init__(self, stats: Dict[Tuple, Tuple]):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+@dataclass
+class ProfileSession:
+    """Collects the profiles of one activity attempt"""
+    workflow_id: str
+    activity_type: str
+    attempt: int = 1
+    cpu_calls: int = 0
+    cpu_seconds: float = 0.0
+    cpu_peak_bytes: int = 0
+    stacks: Counter = field(default_factory=Counter)
+    stats: Optional[pstats.Stats] = None
+
+    def add(self, profile: CpuProfile):
+        self.cpu_calls += 1
+        self.cpu_seconds += profile.seconds
+        self.cpu_peak_bytes = max(self.cpu_peak_bytes, profile.peak_bytes or 0)
+        self.stacks.update(profile.stacks)
+        if self.stats is None:
+            self.stats = pstats.Stats(_RawStats(profile.stats))
+        else:
+            self.stats.add(_RawStats(profile.stats))
+
+    def base_path(self, directory: str) -> str:
+        name = self.activity_type if self.attempt <= 1 else f"{self.activity_type}-attempt{self.attempt}"
+        return os.path.join(directory, re.sub(r'[^\w.-]', '_', self.workflow_id), name)
+
+    def write(self, directory: str, wall_seconds: float, worker_peak_bytes: Optional[int]) -> str:
+        """Write .pstats, .collapsed and .json files; returns their common path prefix"""
+        base = self.base_path(directory)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        summary = {
+            "workflow_id": self.workflow_id,
+            "activity": self.activity_type,
+            "attempt": self.attempt,
+            "wall_seconds": round(wall_seconds, 6),
+            "cpu_calls": self.cpu_calls,
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "cpu_peak_memory_bytes": self.cpu_peak_bytes,
+            # tracemalloc is process-wide: this includes anything else the worker ran meanwhile
+            "worker_peak_memory_bytes": worker_peak_bytes,
+            "samples": sum(self.stacks.values()),
+            "top_functions": self._top_functions()
+        }
+        if self.stats is not None:
+            with open(base + '.pstats', 'wb') as f:
+                marshal.dump(self.stats.stats, f)
+        with open(base + '.collapsed', 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + '.json', 'w') as f:
+            json.dump(summary, f, indent=2)
+        return base
+
+    def _top_functions(self) -> List[Dict[str, Any]]:
+        if self.stats is None:
+            return []
+        rows = sorted(self.stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        return [
+            {"function": f"{os.path.basename(filename)}:{line}:{name}", "calls": calls,
+             "own_seconds": round(own, 6), "cumulative_seconds": round(cumulative, 6)}
+            for (filename, line, name), (_, calls, own, cumulative, _) in rows
+        ]
+
+_session: contextvars.ContextVar[Optional[ProfileSession]] = contextvars.ContextVar('profile_session', default=None)
+
+def current_profile() -> Optional[ProfileSession]:
+    """Profile session of the running activity, if it is being profiled"""
+    return _session.get()
+
+# tracemalloc is process-wide; overlapping profiled activities share one trace
+_trace_lock = threading.Lock()
+_trace_users = 0
+
+def _start_trace():
+    global _trace_users
+    with _trace_lock:
+        if _trace_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _trace_users += 1
+
+def _stop_trace() -> Optional[int]:
+    global _trace_users
+    with _trace_lock:
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        _trace_users -= 1
+        if _trace_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return peak
+
+# Temporal interceptors
+
+class ProfilingInterceptor(Interceptor):
+    """Profiles activities selected by the workflow's memo or by PROFILE_ACTIVITIES on the worker"""
+
+    def __init__(self, activities: Optional[Iterable[str]] = None, directory: Optional[str] = None):
+        self.activities = requested_activities(
+            os.environ.get('PROFILE_ACTIVITIES', '') if activities is None else list(activities))
+        self.directory = directory or os.environ.get('PROFILE_DIR', 'profiles')
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return _ProfilingActivityInbound(next, self)
+
+    def workflow_interceptor_class(self, input: WorkflowInterceptorClassInput):
+        return _ProfilingWorkflowInbound
+
+class _ProfilingWorkflowInbound(WorkflowInboundInterceptor):
+    def init(self, outbound: WorkflowOutboundInterceptor) -> None:
+        super().init(_ProfilingWorkflowOutbound(outbound))
+
+class _ProfilingWorkflowOutbound(WorkflowOutboundInterceptor):
+    def start_activity(self, input: StartActivityInput):
+        # Memo is fixed at workflow start, so reading it here is deterministic
+        requested = requested_activities(workflow.memo_value(PROFILE_MEMO_KEY, None))
+        if _selected(input.activity, requested):
+            input.headers = {**input.headers, PROFILE_HEADER: Payload(
+                metadata={"encoding": b"json/plain"}, data=json.dumps(requested).encode())}
+        return super().start_activity(input)
+
+class _ProfilingActivityInbound(ActivityInboundInterceptor):
+    def __init__(self, next: ActivityInboundInterceptor, root: ProfilingInterceptor):
+        super().__init__(next)
+        self.root = root
+
+    async def execute_activity(self, input: ExecuteActivityInput) -> Any:
+        info = activity.info()
+        requested = list(self.root.activities)
+        header = input.headers.get(PROFILE_HEADER)
+        if header is not None:
+            requested += json.loads(header.data)
+        if not _selected(info.activity_type, requested):
+            return await super().execute_activity(input)
+
+        session = ProfileSession(info.workflow_id or "no-workflow", info.activity_type, info.attempt)
+        token = _session.set(session)
+        _start_trace()
+        start = time.perf_counter()
+        try:
+            return await super().execute_activity(input)
+        finally:
+            wall_seconds = time.perf_counter() - start
+            worker_peak = _stop_trace()
+            _session.reset(token)
+            try:
+                path = session.write(self.root.directory, wall_seconds, worker_peak)
+                logger.info(f"🔬 Profiled {info.activity_type} in {wall_seconds:.2f}s: {path}.*")
+            except OSError:
+                logger.exception("Could not write activity profile")
@@ -0,0 +1,94 @@
+"""
+Mergeable quantile sketches for event durations
+Durations are counted in logarithmic buckets (DDSketch-style), so every sketch
+has a fixed maximum size, quantiles carry a bounded relative error, and sketches
+from different batches, pages or days merge by adding bucket counts
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Quantile estimates are within this relative error of a true sample value
+RELATIVE_ACCURACY = 0.01
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Durations are milliseconds; anything under MIN_VALUE counts as zero, anything above MAX_VALUE is clamped
+MIN_VALUE = 1.0
+MAX_VALUE = 1e9
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# Bucket 0 holds values below MIN_VALUE; bucket k >= 1 holds (gamma^(k-2), gamma^(k-1)]
+N_BUCKETS = math.ceil(math.log(MAX_VALUE) / _LOG_GAMMA) + 2
+
+# Serialized sketches map str(bucket) -> count so they survive JSON round trips
+Sketch = Dict[str, int]
+
+def bucket_indices(values: np.ndarray) -> np.ndarray:
+    """Bucket of every value"""
+    values = np.asarray(values, dtype=np.float64)
+    buckets = np.zeros(len(values), dtype=np.intp)
+    positive = values >= MIN_VALUE
+    clamped = np.minimum(values[positive], MAX_VALUE)
+    buckets[positive] = np.ceil(np.log(clamped) / _LOG_GAMMA).astype(np.intp) + 1
+    return buckets
+
+def grouped_sketches(group_codes: np.ndarray, values: np.ndarray, n_groups: int,
+                     weights: Optional[np.ndarray] = None) -> List[Sketch]:
+    """One sketch per group, built with a single bincount over (group, bucket) pairs
+
+    `weights` gives the number of occurrences of each value (one each by default)
+    """
+    counts = np.bincount(
+        np.asarray(group_codes, dtype=np.intp) * N_BUCKETS + bucket_indices(values),
+        weights=weights,
+        minlength=n_groups * N_BUCKETS
+    ).astype(np.int64).reshape(n_groups, N_BUCKETS)
+    sketches = []
+    for row in counts:
+        buckets = np.flatnonzero(row)
+        sketches.append(dict(zip(map(str, buckets.tolist()), row[buckets].tolist())))
+    return sketches
+
+def sketch_from_values(values: Sequence[float]) -> Sketch:
+    """Sketch of a single sequence of durations"""
+    return grouped_sketches(np.zeros(len(values), dtype=np.intp), np.asarray(values, dtype=np.float64), 1)[0]
+
+def merge_sketch(target: Sketch, other: Sketch) -> Sketch:
+    """Fold `other` into `target` in place"""
+    for bucket, count in other.items():
+        target[bucket] = target.get(bucket, 0) + count
+    return target
+
+def _bucket_value(bucket: int) -> float:
+    """Representative value of a bucket, within RELATIVE_ACCURACY of anything it holds"""
+    if bucket == 0:
+        return 0.0
+    return 2 * _GAMMA ** (bucket - 1) / (_GAMMA + 1)
+
+def sketch_histogram(sketch: Sketch) -> Tuple[np.ndarray, np.ndarray]:
+    """(representative values, counts) arrays of the non-empty buckets, in bucket order"""
+    buckets = sorted((int(bucket), count) for bucket, count in sketch.items())
+    values = np.array([_bucket_value(bucket) for bucket, _ in buckets], dtype=np.float64)
+    counts = np.array([count for _, count in buckets], dtype=np.float64)
+    return values, counts
+
+def sketch_quantiles(sketch: Sketch, quantiles: Sequence[float] = QUANTILES) -> List[float]:
+    """Estimated quantiles of the sketched values; 0.0 for an empty sketch"""
+    buckets = sorted((int(bucket), count) for bucket, count in sketch.items())
+    total = sum(count for _, count in buckets)
+    if total == 0:
+        return [0.0] * len(quantiles)
+
+    results = []
+    for q in quantiles:
+        rank = q * (total - 1)
+        seen = 0
+        for bucket, count in buckets:
+            seen += count
+            if seen > rank:
+                results.append(_bucket_value(bucket))
+                break
+    return results
@@ -0,0 +1,170 @@
+"""
+Quota-aware rate limiting for GA4 reporting requests
+GA4 meters the Data API per quota class (runReport calls draw on "core"). Every
+request takes a token from its class's bucket first, so workers stay under the
+quota instead of discovering it through 429s. The token count lives in SQLite
+(GA4_QUOTA_STORE_PATH), so all worker processes on a host draw from the same
+bucket; workers on other hosts need their own share of the quota. Within a
+worker, tokens are handed out round-robin between properties that are waiting:
+a property with hundreds of pages queued gets one turn per round like any
+other, so it cannot starve small properties analyzed in the same batch
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from instrumentation import RATE_LIMIT_WAIT
+
+DEFAULT_QUOTA_STORE_PATH = 'ga4_quota.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+@dataclass(frozen=True)
+class QuotaClass:
+    """Sustained `rate` in tokens per second, with bursts of up to `burst` tokens"""
+    name: str
+    rate: float
+    burst: float
+
+def quota_class_from_env(name: str) -> Optional[QuotaClass]:
+    """GA4_QUOTA_<NAME>_RATE (tokens/s) and optional _BURST; None when the class is not limited"""
+    rate = float(os.environ.get(f'GA4_QUOTA_{name.upper()}_RATE', 0))
+    if rate <= 0:
+        return None
+    burst = float(os.environ.get(f'GA4_QUOTA_{name.upper()}_BURST', rate))
+    return QuotaClass(name, rate, max(1.0, burst))
+
+class SharedTokenStore:
+    """Token counts per quota class in a SQLite file, shared by every process that opens it"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get('GA4_QUOTA_STORE_PATH', DEFAULT_QUOTA_STORE_PATH)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def take(self, quota: QuotaClass, tokens: float = 1.0) -> float:
+        """Take `tokens` if the bucket has them and return 0, else the seconds until it will"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front, so two processes cannot spend the same tokens
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM token_buckets WHERE name = ?",
+                                   (quota.name,)).fetchone()
+                available = quota.burst if row is None else \
+                    min(quota.burst, row[0] + max(0.0, now - row[1]) * quota.rate)
+                wait = 0.0 if available >= tokens else (tokens - available) / quota.rate
+                if not wait:
+                    available -= tokens
+                conn.execute("INSERT OR REPLACE INTO token_buckets VALUES (?, ?, ?)",
+                             (quota.name, available, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return wait
+
+class FairTokenBucket:
+    """Token bucket whose tokens go round-robin to the keys waiting for them
+
+    Meant for one event loop (the worker's): waiters are futures of that loop,
+    and a single dispatcher task grants tokens as they refill. Without a
+    `store` the tokens are this instance's own; with one they come from the
+    store's shared bucket
+    """
+
+    def __init__(self, quota: QuotaClass, clock: Callable[[], float] = time.monotonic,
+                 store: Optional[SharedTokenStore] = None):
+        self.quota = quota
+        self.clock = clock
+        self.store = store
+        self.tokens = quota.burst
+        self._updated = clock()
+        self._waiters: "OrderedDict[Hashable, Deque[Tuple[asyncio.Future, float]]]" = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.quota.burst, self.tokens + (now - self._updated) * self.quota.rate)
+        self._updated = now
+
+    async def acquire(self, key: Hashable, tokens: float = 1.0):
+        """Wait for `tokens` on behalf of `key` (e.g. the property id)"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Waiters of another (finished) loop can never be woken; start over
+            self._loop, self._waiters, self._dispatcher = loop, OrderedDict(), None
+
+        if self.store is None and not self._waiters and not self._take_local(tokens):
+            return
+
+        started = self.clock()
+        future = loop.create_future()
+        self._waiters.setdefault(key, deque()).append((future, tokens))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+        await future
+        RATE_LIMIT_WAIT.observe(self.clock() - started, quota_class=self.quota.name)
+
+    async def _dispatch(self):
+        while self._waiters:
+            # Next key in the rotation; it goes to the back if it still has waiters
+            key, queue = next(iter(self._waiters.items()))
+            future, tokens = queue[0]
+            if future.done():
+                self._pop(key, queue)
+                continue
+            wait = self._take_local(tokens) if self.store is None else \
+                await asyncio.to_thread(self.store.take, self.quota, tokens)
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            self._pop(key, queue)
+            if not future.done():
+                future.set_result(None)
+
+    def _take_local(self, tokens: float) -> float:
+        self._refill()
+        if self.tokens < tokens:
+            return (tokens - self.tokens) / self.quota.rate
+        self.tokens -= tokens
+        return 0.0
+
+    def _pop(self, key: Hashable, queue: Deque[Tuple[asyncio.Future, float]]):
+        queue.popleft()
+        del self._waiters[key]
+        if queue:
+            self._waiters[key] = queue
+
+_buckets: Dict[Tuple[QuotaClass, str], FairTokenBucket] = {}
+
+def get_rate_limiter(name: str = 'core') -> Optional[FairTokenBucket]:
+    """Process-wide bucket for a quota class as configured in the environment, or None if unlimited"""
+    quota = quota_class_from_env(name)
+    if quota is None:
+        return None
+    path = os.environ.get('GA4_QUOTA_STORE_PATH', DEFAULT_QUOTA_STORE_PATH)
+    if (quota, path) not in _buckets:
+        _buckets[(quota, path)] = FairTokenBucket(quota, store=SharedTokenStore(path))
+    return _buckets[(quota, path)]
+
+async def acquire_quota(key: Hashable, name: str = 'core', tokens: float = 1.0):
+    limiter = get_rate_limiter(name)
+    if limiter is not None:
+        await limiter.acquire(key, tokens)
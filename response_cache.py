@@ -0,0 +1,110 @@
+"""
+In-memory response cache helpers for the Flask app
+Bodies are serialized and gzip-compressed once, tagged with a strong ETag and
+served with conditional-GET support, so repeated polling costs almost nothing
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from flask import Response, request
+
+from instrumentation import CACHE_REQUESTS
+
+@dataclass(frozen=True)
+class CachedBody:
+    """A pre-serialized response body and its pre-compressed variant"""
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    last_modified: float
+
+    @classmethod
+    def from_bytes(cls, body: bytes, last_modified: float) -> "CachedBody":
+        return cls(
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=9, mtime=0),
+            etag=hashlib.sha256(body).hexdigest()[:32],
+            last_modified=last_modified
+        )
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == '*':
+        return True
+    candidates = {tag.strip().removeprefix('W/').strip('"') for tag in header.split(',')}
+    return etag in candidates or f"{etag}-gzip" in candidates
+
+def send_cached(entry: CachedBody, mimetype: str, cache_control: str = 'no-cache') -> Response:
+    """Serve a cached body: 304 on a matching If-None-Match, gzip when the client accepts it"""
+    # Parsed with q-values, so "gzip;q=0" gets the plain body
+    use_gzip = request.accept_encodings.quality('gzip') > 0
+    # Each encoding is its own representation, so it gets its own strong ETag
+    etag = f"{entry.etag}-gzip" if use_gzip else entry.etag
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and _etag_matches(if_none_match, entry.etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry.gzip_body if use_gzip else entry.body, mimetype=mimetype)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Last-Modified'] = formatdate(entry.last_modified, usegmt=True)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def encode_json(data: Any) -> bytes:
+    return json.dumps(data, separators=(',', ':')).encode()
+
+class VersionedBodyCache:
+    """Caches a document as a ready-to-send body, rebuilding it when its version changes
+
+    version_fn() must be cheap (e.g. the newest row id) and is checked on every
+    get, which catches writes from other processes such as the Temporal worker;
+    load_fn() returns (document, last_modified), or None when there is nothing to
+    serve, where last_modified is the Unix time the underlying data last changed
+    (so it is the same in every process), and encode() turns the document into
+    the body (compact JSON by default).
+    """
+
+    def __init__(self, version_fn: Callable[[], Hashable], load_fn: Callable[[], Optional[Tuple[Any, float]]],
+                 name: str = 'response',
+                 encode: Callable[[Any], bytes] = encode_json):
+        self.version_fn = version_fn
+        self.load_fn = load_fn
+        self.name = name
+        self.encode = encode
+        self._lock = threading.Lock()
+        self._version: Optional[Hashable] = None
+        self._entry: Optional[CachedBody] = None
+
+    def get(self) -> Optional[CachedBody]:
+        """Current body, or None when load_fn has no document"""
+        version = self.version_fn()
+        entry = self._entry
+        if entry is not None and version == self._version:
+            CACHE_REQUESTS.inc(cache=self.name, result='hit')
+            return entry
+        CACHE_REQUESTS.inc(cache=self.name, result='miss')
+
+        with self._lock:
+            if self._entry is None or version != self._version:
+                loaded = self.load_fn()
+                if loaded is None:
+                    return None
+                data, last_modified = loaded
+                self._entry = CachedBody.from_bytes(self.encode(data), last_modified)
+                self._version = version
+            return self._entry
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+            self._version = None
@@ -0,0 +1,211 @@
+"""
+A/B significance engine for button analytics
+Compares every page variant against the control and against each other, for
+all button types at once: Beta posteriors for click-through rates and Poisson
+bootstrap confidence intervals for mean hover and engagement durations,
+resampled from the duration sketches carried by the metric rows
+"""
+
+import warnings
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from quantile_sketch import sketch_histogram
+
+VARIANTS = ('original', 'colors', 'sizes', 'spacing', 'typography')
+CONTROL_VARIANT = 'original'
+
+POSTERIOR_DRAWS = 20000
+BOOTSTRAP_RESAMPLES = 4000
+CREDIBLE_MASS = 0.95
+# Bootstrap replicates drawn per pass; bounds the weight matrix to this many rows
+BOOTSTRAP_CHUNK = 500
+# Sketch buckets are merged into at most this many equal-count bins per cell before resampling
+BOOTSTRAP_BINS = 32
+
+# Duration metrics compared between variants: output name -> metric row sketch field
+DURATION_METRICS = {
+    'hover_duration': 'hover_duration_sketch',
+    'engagement': 'engagement_sketch'
+}
+
+def _number(value: float) -> Optional[float]:
+    """JSON-friendly float; NaN (no data) becomes None"""
+    return None if np.isnan(value) else float(value)
+
+def _variant_order(rows: List[Dict[str, Any]]) -> List[str]:
+    """Known variants in canonical order, then any others in first-seen order"""
+    seen = dict.fromkeys(row['page_variant'] for row in rows)
+    return [v for v in VARIANTS if v in seen] + [v for v in seen if v not in VARIANTS]
+
+def ctr_posteriors(clicks: np.ndarray, trials: np.ndarray, present: np.ndarray,
+                   draws: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """Beta(1 + clicks, 1 + misses) posteriors for a (types, variants) grid, compared draw by draw"""
+    samples = rng.beta(1 + clicks, 1 + trials - clicks, size=(draws, *clicks.shape))
+    tail = (1 - CREDIBLE_MASS) / 2
+    low, high = np.quantile(samples, [tail, 1 - tail], axis=0)
+    # Absent (type, variant) cells never win or beat anything
+    samples = np.where(present, samples, -np.inf)
+    winners = samples.argmax(axis=2)
+    return {
+        "mean": (1 + clicks) / (2 + trials),
+        "low": low,
+        "high": high,
+        "prob_best": (winners[..., None] == np.arange(clicks.shape[1])).mean(axis=0),
+        # prob_beats[t, i, j] = P(CTR of variant i > CTR of variant j)
+        "prob_beats": (samples[..., :, None] > samples[..., None, :]).mean(axis=0)
+    }
+
+def bootstrap_means(sketches: List[List[Dict[str, int]]], resamples: int,
+                    rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """Mean of every sketched distribution and its Poisson bootstrap replicates
+
+    Each replicate reweights the sketch buckets with Poisson(count) draws, which
+    resamples the underlying events without materializing them. Adjacent
+    buckets are first merged into BOOTSTRAP_BINS equal-count bins (at their
+    mean value, so the mean is unchanged and only the small within-bin spread
+    is lost). The bins of all cells are drawn together, BOOTSTRAP_CHUNK
+    replicates at a time, and summed back per cell; a cell whose events share
+    one bucket gets identical replicates, i.e. a zero-width interval
+    """
+    n_types, n_variants = len(sketches), len(sketches[0])
+    means = np.full((n_types, n_variants), np.nan)
+    replicates = np.full((n_types, n_variants, resamples), np.nan)
+
+    cells, values, counts = [], [], []
+    for t, row in enumerate(sketches):
+        for v, sketch in enumerate(row):
+            cell_values, cell_counts = sketch_histogram(sketch)
+            if not cell_counts.sum():
+                continue
+            n_events = cell_counts.sum()
+            means[t, v] = cell_counts @ cell_values / n_events
+            bins = np.minimum(((np.cumsum(cell_counts) - cell_counts) * BOOTSTRAP_BINS // n_events).astype(int),
+                              BOOTSTRAP_BINS - 1)
+            bin_counts = np.bincount(bins, weights=cell_counts)
+            kept = bin_counts > 0
+            bin_values = np.bincount(bins, weights=cell_counts * cell_values)[kept] / bin_counts[kept]
+            cells.append((t, v, int(kept.sum())))
+            values.append(bin_values)
+            counts.append(bin_counts[kept])
+    if not cells:
+        return {"mean": means, "replicates": replicates}
+
+    values, counts = np.concatenate(values), np.concatenate(counts)
+    # Start of each cell's buckets in the flat arrays, for per-cell sums with reduceat
+    starts = np.cumsum([0] + [size for _, _, size in cells[:-1]])
+    flat = np.empty((len(cells), resamples))
+    for first in range(0, resamples, BOOTSTRAP_CHUNK):
+        weights = rng.poisson(counts, size=(min(BOOTSTRAP_CHUNK, resamples - first), len(counts)))
+        total = np.add.reduceat(weights, starts, axis=1)
+        weighted = np.add.reduceat(weights * values, starts, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            flat[:, first:first + len(weights)] = np.where(total > 0, weighted / total, np.nan).T
+    rows, columns, _ = zip(*cells)
+    replicates[list(rows), list(columns)] = flat
+    return {"mean": means, "replicates": replicates}
+
+def _interval(replicates: np.ndarray) -> np.ndarray:
+    """Percentile interval over the last axis; NaN where there was nothing to resample"""
+    tail = (1 - CREDIBLE_MASS) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanquantile(replicates, [tail, 1 - tail], axis=-1)
+
+def compare_variants(rows: List[Dict[str, Any]], control: str = CONTROL_VARIANT,
+                     draws: int = POSTERIOR_DRAWS, resamples: int = BOOTSTRAP_RESAMPLES,
+                     seed: int = 0) -> Dict[str, Any]:
+    """Pairwise and all-vs-control comparisons of page variants, per button type
+
+    rows are metric rows (ButtonMetrics fields); clicks out of max(hovers, clicks)
+    are the CTR trials, and the duration sketches feed the bootstrap
+    """
+    if not rows:
+        return {}
+    types = list(dict.fromkeys(row['button_type'] for row in rows))
+    variants = _variant_order(rows)
+    cells = {(row['button_type'], row['page_variant']): row for row in rows}
+    rng = np.random.default_rng(seed)
+
+    present = np.array([[(t, v) in cells for v in variants] for t in types])
+    clicks = np.array([[cells[t, v]['total_clicks'] if (t, v) in cells else 0 for v in variants] for t in types],
+                      dtype=np.float64)
+    hovers = np.array([[cells[t, v]['total_hovers'] if (t, v) in cells else 0 for v in variants] for t in types],
+                      dtype=np.float64)
+    ctr = ctr_posteriors(clicks, np.maximum(hovers, clicks), present, draws, rng)
+
+    durations = {}
+    for name, field in DURATION_METRICS.items():
+        sketches = [[cells[t, v].get(field, {}) if (t, v) in cells else {} for v in variants] for t in types]
+        boot = bootstrap_means(sketches, resamples, rng)
+        replicates = boot["replicates"]
+        # diffs[t, i, j] are bootstrap replicates of mean(i) - mean(j)
+        diffs = replicates[:, :, None, :] - replicates[:, None, :, :]
+        with np.errstate(invalid='ignore'):
+            prob_greater = np.where(np.isnan(diffs).all(axis=-1), np.nan, (diffs > 0).mean(axis=-1))
+        durations[name] = {
+            "mean": boot["mean"],
+            "interval": _interval(replicates),
+            "diff_interval": _interval(diffs),
+            "diff_mean": boot["mean"][:, :, None] - boot["mean"][:, None, :],
+            "prob_greater": prob_greater
+        }
+
+    control_index = variants.index(control) if control in variants else None
+    results = {}
+    for t, button_type in enumerate(types):
+        present_variants = [v for v in range(len(variants)) if present[t, v]]
+        has_control = control_index is not None and present[t, control_index]
+        entry: Dict[str, Any] = {
+            "control": control if has_control else None,
+            "variants": [variants[v] for v in present_variants],
+            "ctr": {},
+            "ctr_prob_beats": {
+                variants[i]: {variants[j]: _number(ctr["prob_beats"][t, i, j]) for j in present_variants if j != i}
+                for i in present_variants
+            }
+        }
+        for v in present_variants:
+            entry["ctr"][variants[v]] = {
+                "mean": _number(ctr["mean"][t, v]),
+                "ci_low": _number(ctr["low"][t, v]),
+                "ci_high": _number(ctr["high"][t, v]),
+                "prob_best": _number(ctr["prob_best"][t, v]),
+                "prob_beats_control": _number(ctr["prob_beats"][t, v, control_index])
+                if has_control and v != control_index else None
+            }
+        best = max(present_variants, key=lambda v: ctr["prob_best"][t, v])
+        entry["best_ctr_variant"] = variants[best]
+        entry["best_ctr_probability"] = _number(ctr["prob_best"][t, best])
+
+        for name, stats in durations.items():
+            entry[name] = {}
+            for v in present_variants:
+                summary = {
+                    "mean": _number(stats["mean"][t, v]),
+                    "ci_low": _number(stats["interval"][0, t, v]),
+                    "ci_high": _number(stats["interval"][1, t, v]),
+                    "diff_vs_control": None
+                }
+                if has_control and v != control_index:
+                    summary["diff_vs_control"] = {
+                        "mean": _number(stats["diff_mean"][t, v, control_index]),
+                        "ci_low": _number(stats["diff_interval"][0, t, v, control_index]),
+                        "ci_high": _number(stats["diff_interval"][1, t, v, control_index]),
+                        "prob_greater": _number(stats["prob_greater"][t, v, control_index])
+                    }
+                entry[name][variants[v]] = summary
+            entry[f"{name}_prob_greater"] = {
+                variants[i]: {variants[j]: _number(stats["prob_greater"][t, i, j]) for j in present_variants if j != i}
+                for i in present_variants
+            }
+        results[button_type] = entry
+
+    return {
+        "control": control,
+        "credible_mass": CREDIBLE_MASS,
+        "posterior_draws": draws,
+        "bootstrap_resamples": resamples,
+        "button_types": results
+    }
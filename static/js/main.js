@@ -1,256 +1,341 @@
 // Enhanced JavaScript with GA4 Analytics Integration
-document.addEventListener('DOMContentLoaded', function() {
-    // GA4 Helper Functions
-    function trackGA4Event(eventName, parameters = {}) {
-        if (typeof gtag !== 'undefined') {
-            gtag('event', eventName, {
-                ...parameters,
-                page_variant: window.pageVariant || 'unknown'
-            });
-        }
+// One tracking layer for the page: delegated, passive and throttled listeners feed an
+// in-memory buffer that is flushed in batches (gtag + first-party collector) when the
+// browser is idle, and synchronously when the page is hidden
+(function() {
+    // A second copy of this script must not double every event
+    if (window.__buttonAnalyticsTracker) {
+        return;
     }
+    window.__buttonAnalyticsTracker = true;
 
-    // Track page view with additional parameters
-    trackGA4Event('page_view', {
-        page_title: document.title,
-        page_location: window.location.href,
-        page_variant: window.pageVariant || 'unknown'
-    });
+    const FLUSH_DELAY_MS = 5000;
+    const IDLE_TIMEOUT_MS = 2000;
+    const MAX_BATCH = 50;
+    const ACTIVITY_THROTTLE_MS = 1000;
+    const INACTIVE_AFTER_MS = 30000;
+    const SCROLL_THRESHOLDS = [25, 50, 75, 100];
 
-    // Track time on page
-    const startTime = Date.now();
-    window.addEventListener('beforeunload', function() {
-        const timeOnPage = Math.round((Date.now() - startTime) / 1000);
-        trackGA4Event('time_on_page', {
-            value: timeOnPage,
-            event_category: 'engagement'
-        });
-    });
+    const idle = window.requestIdleCallback
+        ? callback => window.requestIdleCallback(callback, { timeout: IDLE_TIMEOUT_MS })
+        : callback => setTimeout(callback, 0);
 
-    // Enhanced button click tracking with detailed engagement metrics
-    const button = document.querySelector('.button');
-    if (button) {
-        let buttonHoverStart = null;
-        let buttonHoverDuration = 0;
-        
-        // Track button hover start
-        button.addEventListener('mouseenter', function() {
-            buttonHoverStart = Date.now();
-            trackGA4Event('button_hover_start', {
-                event_category: 'engagement',
-                event_label: 'get_started_button',
-                button_type: 'cta',
-                page_variant: window.pageVariant || 'unknown'
+    // Pseudonymous ids for distinct visitor/session counts: one per browser, one per tab session
+    function storedId(storageName, key) {
+        try {
+            const storage = window[storageName];
+            let id = storage.getItem(key);
+            if (!id) {
+                id = (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`);
+                storage.setItem(key, id);
+            }
+            return id;
+        } catch (e) {
+            return undefined;
+        }
+    }
+
+    // Buffered events go to gtag and, batched, to /api/events with sendBeacon
+    const tracker = {
+        endpoint: '/api/events',
+        queue: [],
+        // Batches handed to CompressionStream whose beacon has not been sent yet
+        inFlight: new Set(),
+        flushTimer: null,
+        visitorId: storedId('localStorage', 'analytics_visitor_id'),
+        sessionId: storedId('sessionStorage', 'analytics_session_id'),
+
+        track(eventName, parameters = {}) {
+            this.queue.push({
+                event_name: eventName,
+                ...parameters,
+                page_variant: window.pageVariant || 'unknown',
+                visitor_id: this.visitorId,
+                session_id: this.sessionId,
+                timestamp: new Date().toISOString()
             });
-        });
-        
-        // Track button hover end and duration
-        button.addEventListener('mouseleave', function() {
-            if (buttonHoverStart) {
-                buttonHoverDuration = Date.now() - buttonHoverStart;
-                trackGA4Event('button_hover_end', {
+            if (this.queue.length >= MAX_BATCH) {
+                this.scheduleFlush(0);
+            } else {
+                this.scheduleFlush(FLUSH_DELAY_MS);
+            }
+        },
+
+        scheduleFlush(delay) {
+            if (this.flushTimer !== null && delay > 0) {
+                return;
+            }
+            clearTimeout(this.flushTimer);
+            this.flushTimer = setTimeout(() => idle(() => this.flush(true)), delay);
+        },
+
+        // Gzip when the page stays alive; when it is being hidden send right away, uncompressed
+        flush(compress) {
+            clearTimeout(this.flushTimer);
+            this.flushTimer = null;
+            const events = this.queue.splice(0);
+            if (events.length && typeof gtag !== 'undefined') {
+                events.forEach(({ event_name, timestamp, ...parameters }) => gtag('event', event_name, parameters));
+            }
+            if (!navigator.sendBeacon) {
+                return;
+            }
+            if (compress && 'CompressionStream' in window) {
+                if (events.length) {
+                    this.sendCompressed(events);
+                }
+                return;
+            }
+            // Batches still being compressed go out now too: the page may unload before they finish
+            const batch = [...this.inFlight].flat().concat(events);
+            this.inFlight.clear();
+            if (batch.length) {
+                this.send(batch);
+            }
+        },
+
+        // The batch stays in flight until its beacon is queued, so a page hide meanwhile still sends it
+        sendCompressed(events) {
+            this.inFlight.add(events);
+            const body = new Blob([JSON.stringify({ events })]).stream().pipeThrough(new CompressionStream('gzip'));
+            new Response(body).blob().then(
+                blob => this.inFlight.delete(events) && navigator.sendBeacon(this.endpoint, blob),
+                () => this.inFlight.delete(events) && this.send(events)
+            );
+        },
+
+        send(events) {
+            navigator.sendBeacon(this.endpoint, new Blob([JSON.stringify({ events })], { type: 'application/json' }));
+        }
+    };
+
+    // Tracked elements: the CTA, feature cards and theme navigation; the first match wins
+    const TARGETS = [
+        {
+            selector: '.button',
+            hover: 'button_hover_start',
+            click: 'cta_click',
+            describe: () => ({ event_category: 'engagement', event_label: 'get_started_button', button_type: 'cta' })
+        },
+        {
+            selector: '.feature',
+            hover: 'feature_hover_start',
+            click: 'feature_click',
+            describe: element => {
+                const index = Array.prototype.indexOf.call(document.querySelectorAll('.feature'), element);
+                return {
                     event_category: 'engagement',
-                    event_label: 'get_started_button',
-                    button_type: 'cta',
-                    hover_duration: Math.round(buttonHoverDuration),
-                    page_variant: window.pageVariant || 'unknown'
-                });
+                    event_label: `feature_${index + 1}`,
+                    feature_title: element.querySelector('h3')?.textContent || `Feature ${index + 1}`,
+                    feature_type: 'card',
+                    button_type: 'feature'
+                };
+            }
+        },
+        {
+            selector: '.theme-nav a',
+            hover: 'nav_hover_start',
+            click: 'navigation_click',
+            describe: element => {
+                const index = Array.prototype.indexOf.call(document.querySelectorAll('.theme-nav a'), element);
+                const text = element.textContent.trim();
+                return { event_category: 'navigation', event_label: text, nav_item: `nav_${index + 1}`,
+                         nav_text: text, button_type: 'navigation' };
             }
+        }
+    ];
+    const ALL_TARGETS = TARGETS.map(target => target.selector).join(', ');
+
+    function findTarget(node) {
+        const element = node instanceof Element ? node.closest(ALL_TARGETS) : null;
+        if (!element) {
+            return null;
+        }
+        const target = TARGETS.find(candidate => element.matches(candidate.selector));
+        return { element, target };
+    }
+
+    // Per element: when the current hover started, and the duration of the last finished one
+    const hovers = new WeakMap();
+
+    // A hover is reported once it ends (or the element is clicked), as one *_hover_start
+    // event carrying its duration, instead of separate start and end events
+    function endHover(element, target) {
+        const state = hovers.get(element);
+        if (!state || state.start === null) {
+            return;
+        }
+        state.duration = Date.now() - state.start;
+        state.start = null;
+        tracker.track(target.hover, { ...target.describe(element), hover_duration: Math.round(state.duration) });
+    }
+
+    function onPointerOver(event) {
+        const found = findTarget(event.target);
+        if (!found || found.element.contains(event.relatedTarget)) {
+            return;
+        }
+        const state = hovers.get(found.element) || { start: null, duration: 0 };
+        state.start = Date.now();
+        hovers.set(found.element, state);
+        if (found.target.selector === '.feature') {
+            found.element.style.transform = 'translateY(-5px)';
+            found.element.style.transition = 'transform 0.3s ease';
+        }
+    }
+
+    function onPointerOut(event) {
+        const found = findTarget(event.target);
+        if (!found || found.element.contains(event.relatedTarget)) {
+            return;
+        }
+        endHover(found.element, found.target);
+        if (found.target.selector === '.feature') {
+            found.element.style.transform = 'translateY(0)';
+        }
+    }
+
+    function onClick(event) {
+        const outbound = event.target instanceof Element ? event.target.closest('a[href^="http"]') : null;
+        if (outbound) {
+            tracker.track('external_link_click', { event_category: 'outbound', event_label: outbound.href, value: 1 });
+        }
+        const found = findTarget(event.target);
+        if (!found) {
+            return;
+        }
+        const { element, target } = found;
+        const state = hovers.get(element);
+        const hoverStart = state && state.start !== null ? state.start : null;
+        endHover(element, target);
+        const hoverDuration = state ? state.duration : 0;
+        // Total engagement: the hover that led to the click, through the click itself
+        tracker.track(target.click, {
+            ...target.describe(element),
+            hover_duration: Math.round(hoverDuration),
+            total_engagement: Math.round(hoverStart !== null ? Date.now() - hoverStart : hoverDuration),
+            value: 1
         });
-        
-        // Track button click with detailed metrics
-        button.addEventListener('click', function(e) {
-            e.preventDefault();
-            
-            // Calculate total engagement time (hover + click)
-            const totalEngagement = buttonHoverDuration + (Date.now() - (buttonHoverStart || Date.now()));
-            
-            // Track comprehensive button click
-            trackGA4Event('cta_click', {
-                event_category: 'engagement',
-                event_label: 'get_started_button',
-                button_type: 'cta',
-                hover_duration: Math.round(buttonHoverDuration),
-                total_engagement: Math.round(totalEngagement),
-                page_variant: window.pageVariant || 'unknown',
-                value: 1
-            });
-            
-            // Track button interaction success
-            trackGA4Event('button_interaction_success', {
-                event_category: 'conversion',
-                event_label: 'get_started_button',
-                button_type: 'cta',
-                page_variant: window.pageVariant || 'unknown'
-            });
-            
+
+        if (target.selector === '.button') {
+            event.preventDefault();
             // Add a simple animation effect
-            button.style.transform = 'scale(0.95)';
+            element.style.transform = 'scale(0.95)';
             setTimeout(() => {
-                button.style.transform = 'translateY(-2px)';
+                element.style.transform = 'translateY(-2px)';
             }, 150);
-            
+            // Let the click events reach the collector before the blocking alert
+            tracker.flush(false);
             // Show an alert (you can replace this with actual functionality)
             alert('Welcome to CalHacks12! This is where your journey begins.');
-        });
+        } else if (target.selector === '.theme-nav a') {
+            // The page is about to unload
+            tracker.flush(false);
+        }
     }
-    
-    // Enhanced feature button tracking with detailed engagement metrics
-    const features = document.querySelectorAll('.feature');
-    features.forEach((feature, index) => {
-        let featureHoverStart = null;
-        let featureHoverDuration = 0;
-        const featureTitle = feature.querySelector('h3')?.textContent || `Feature ${index + 1}`;
-        
-        feature.addEventListener('mouseenter', function() {
-            featureHoverStart = Date.now();
-            this.style.transform = 'translateY(-5px)';
-            this.style.transition = 'transform 0.3s ease';
-            
-            // Track feature hover start
-            trackGA4Event('feature_hover_start', {
-                event_category: 'engagement',
-                event_label: `feature_${index + 1}`,
-                feature_title: featureTitle,
-                feature_type: 'card',
-                page_variant: window.pageVariant || 'unknown'
-            });
-        });
-        
-        feature.addEventListener('mouseleave', function() {
-            if (featureHoverStart) {
-                featureHoverDuration = Date.now() - featureHoverStart;
-                this.style.transform = 'translateY(0)';
-                
-                // Track feature hover end with duration
-                trackGA4Event('feature_hover_end', {
-                    event_category: 'engagement',
-                    event_label: `feature_${index + 1}`,
-                    feature_title: featureTitle,
-                    feature_type: 'card',
-                    hover_duration: Math.round(featureHoverDuration),
-                    page_variant: window.pageVariant || 'unknown'
-                });
+
+    function onSubmit() {
+        tracker.track('form_submit', { event_category: 'conversion', event_label: 'contact_form', value: 1 });
+    }
+
+    // Scroll depth (25%, 50%, 75%, 100%), measured at most once per frame
+    let maxScrollDepth = 0;
+    let scrollFramePending = false;
+
+    function measureScroll() {
+        scrollFramePending = false;
+        const scrollable = document.body.scrollHeight - window.innerHeight;
+        const scrollPercent = scrollable > 0 ? Math.round((window.scrollY / scrollable) * 100) : 100;
+        SCROLL_THRESHOLDS.forEach(threshold => {
+            if (scrollPercent >= threshold && maxScrollDepth < threshold) {
+                maxScrollDepth = threshold;
+                tracker.track('scroll_depth', { event_category: 'engagement', value: threshold });
             }
         });
+    }
 
-        // Track feature clicks with comprehensive metrics
-        feature.addEventListener('click', function() {
-            const totalEngagement = featureHoverDuration + (Date.now() - (featureHoverStart || Date.now()));
-            
-            trackGA4Event('feature_click', {
-                event_category: 'engagement',
-                event_label: `feature_${index + 1}`,
-                feature_title: featureTitle,
-                feature_type: 'card',
-                hover_duration: Math.round(featureHoverDuration),
-                total_engagement: Math.round(totalEngagement),
-                page_variant: window.pageVariant || 'unknown',
-                value: 1
-            });
-            
-            // Track feature interaction success
-            trackGA4Event('feature_interaction_success', {
-                event_category: 'engagement',
-                event_label: `feature_${index + 1}`,
-                feature_title: featureTitle,
-                feature_type: 'card',
-                page_variant: window.pageVariant || 'unknown'
-            });
-        });
-    });
+    // Engagement: activity only refreshes a timestamp, at most once per second
+    const startTime = Date.now();
+    let engagementStart = Date.now();
+    let lastActivity = Date.now();
 
-    // Enhanced navigation button tracking with engagement metrics
-    const navLinks = document.querySelectorAll('.theme-nav a');
-    navLinks.forEach((link, index) => {
-        let navHoverStart = null;
-        let navHoverDuration = 0;
-        
-        // Track navigation hover start
-        link.addEventListener('mouseenter', function() {
-            navHoverStart = Date.now();
-            trackGA4Event('nav_hover_start', {
-                event_category: 'navigation',
-                event_label: this.textContent.trim(),
-                nav_item: `nav_${index + 1}`,
-                nav_text: this.textContent.trim(),
-                page_variant: window.pageVariant || 'unknown'
-            });
-        });
-        
-        // Track navigation hover end and duration
-        link.addEventListener('mouseleave', function() {
-            if (navHoverStart) {
-                navHoverDuration = Date.now() - navHoverStart;
-                trackGA4Event('nav_hover_end', {
-                    event_category: 'navigation',
-                    event_label: this.textContent.trim(),
-                    nav_item: `nav_${index + 1}`,
-                    nav_text: this.textContent.trim(),
-                    hover_duration: Math.round(navHoverDuration),
-                    page_variant: window.pageVariant || 'unknown'
-                });
+    function onActivity() {
+        const now = Date.now();
+        if (now - lastActivity < ACTIVITY_THROTTLE_MS) {
+            return;
+        }
+        if (now - lastActivity >= INACTIVE_AFTER_MS) {
+            // Back from being inactive: a new engagement period starts
+            engagementStart = now;
+        }
+        lastActivity = now;
+    }
+
+    function onScroll() {
+        onActivity();
+        if (!scrollFramePending) {
+            scrollFramePending = true;
+            requestAnimationFrame(measureScroll);
+        }
+    }
+
+    // Track user engagement time every 30 seconds while the user is active
+    setInterval(function() {
+        const now = Date.now();
+        if (now - lastActivity < INACTIVE_AFTER_MS) {
+            const engagementTime = Math.round((now - engagementStart) / 1000);
+            if (engagementTime >= 30) {
+                tracker.track('user_engagement', { event_category: 'engagement', value: engagementTime });
+                engagementStart = now;
             }
-        });
-        
-        // Track navigation click with detailed metrics
-        link.addEventListener('click', function() {
-            const totalEngagement = navHoverDuration + (Date.now() - (navHoverStart || Date.now()));
-            
-            trackGA4Event('navigation_click', {
-                event_category: 'navigation',
-                event_label: this.textContent.trim(),
-                nav_item: `nav_${index + 1}`,
-                nav_text: this.textContent.trim(),
-                hover_duration: Math.round(navHoverDuration),
-                total_engagement: Math.round(totalEngagement),
-                page_variant: window.pageVariant || 'unknown',
-                value: 1
-            });
-            
-            // Track navigation success
-            trackGA4Event('navigation_success', {
-                event_category: 'navigation',
-                event_label: this.textContent.trim(),
-                nav_item: `nav_${index + 1}`,
-                nav_text: this.textContent.trim(),
-                page_variant: window.pageVariant || 'unknown'
-            });
-        });
-    });
+        }
+    }, 30000);
 
-    // Track form interactions (if any forms are added later)
-    const forms = document.querySelectorAll('form');
-    forms.forEach(form => {
-        form.addEventListener('submit', function() {
-            trackGA4Event('form_submit', {
-                event_category: 'conversion',
-                event_label: 'contact_form',
-                value: 1
+    // Leaving or hiding the page: close open hovers, record time on page (once), send everything
+    let timeOnPageSent = false;
+
+    function onPageHidden() {
+        TARGETS.forEach(target => document.querySelectorAll(target.selector)
+            .forEach(element => endHover(element, target)));
+        if (!timeOnPageSent) {
+            timeOnPageSent = true;
+            tracker.track('time_on_page', {
+                value: Math.round((Date.now() - startTime) / 1000),
+                event_category: 'engagement'
             });
-        });
+        }
+        tracker.flush(false);
+    }
+
+    const passive = { passive: true };
+    document.addEventListener('pointerover', onPointerOver, passive);
+    document.addEventListener('pointerout', onPointerOut, passive);
+    document.addEventListener('click', onClick);
+    document.addEventListener('submit', onSubmit, passive);
+    window.addEventListener('scroll', onScroll, passive);
+    ['pointerdown', 'pointermove', 'keydown', 'touchstart'].forEach(type => {
+        document.addEventListener(type, onActivity, passive);
+    });
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'hidden') {
+            onPageHidden();
+        }
     });
+    window.addEventListener('pagehide', onPageHidden);
 
-    // Track external link clicks
-    const externalLinks = document.querySelectorAll('a[href^="http"]');
-    externalLinks.forEach(link => {
-        link.addEventListener('click', function() {
-            trackGA4Event('external_link_click', {
-                event_category: 'outbound',
-                event_label: this.href,
-                value: 1
-            });
-        });
+    // Track page view with additional parameters
+    tracker.track('page_view', {
+        page_title: document.title,
+        page_location: window.location.href
     });
 
-    // Performance tracking
+    // Track page load performance once the load event has finished
     if ('performance' in window) {
-        // Track page load performance
         window.addEventListener('load', function() {
             setTimeout(() => {
                 const perfData = performance.getEntriesByType('navigation')[0];
                 if (perfData) {
-                    trackGA4Event('page_performance', {
+                    tracker.track('page_performance', {
                         event_category: 'performance',
                         load_time: Math.round(perfData.loadEventEnd - perfData.loadEventStart),
                         dom_content_loaded: Math.round(perfData.domContentLoadedEventEnd - perfData.domContentLoadedEventStart),
@@ -260,62 +345,4 @@ document.addEventListener('DOMContentLoaded', function() {
             }, 0);
         });
     }
-
-    // Track scroll depth (25%, 50%, 75%, 100%)
-    let maxScrollDepth = 0;
-    const scrollThresholds = [25, 50, 75, 100];
-    
-    window.addEventListener('scroll', function() {
-        const scrollPercent = Math.round((window.scrollY / (document.body.scrollHeight - window.innerHeight)) * 100);
-        
-        scrollThresholds.forEach(threshold => {
-            if (scrollPercent >= threshold && maxScrollDepth < threshold) {
-                maxScrollDepth = threshold;
-                trackGA4Event('scroll_depth', {
-                    event_category: 'engagement',
-                    value: threshold
-                });
-            }
-        });
-    });
-
-    // Track user engagement time
-    let engagementStart = Date.now();
-    let isEngaged = true;
-    
-    // Reset engagement on user activity
-    ['mousedown', 'mousemove', 'keypress', 'scroll', 'touchstart'].forEach(event => {
-        document.addEventListener(event, function() {
-            if (!isEngaged) {
-                isEngaged = true;
-                engagementStart = Date.now();
-            }
-        });
-    });
-    
-    // Track engagement time every 30 seconds
-    setInterval(function() {
-        if (isEngaged) {
-            const engagementTime = Math.round((Date.now() - engagementStart) / 1000);
-            if (engagementTime >= 30) {
-                trackGA4Event('user_engagement', {
-                    event_category: 'engagement',
-                    value: engagementTime
-                });
-                engagementStart = Date.now();
-            }
-        }
-    }, 30000);
-    
-    // Track when user becomes inactive
-    let inactivityTimer;
-    ['mousedown', 'mousemove', 'keypress', 'scroll', 'touchstart'].forEach(event => {
-        document.addEventListener(event, function() {
-            clearTimeout(inactivityTimer);
-            isEngaged = true;
-            inactivityTimer = setTimeout(function() {
-                isEngaged = false;
-            }, 30000); // 30 seconds of inactivity
-        });
-    });
-});
+})();
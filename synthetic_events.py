@@ -0,0 +1,90 @@
+"""
+Seeded synthetic GA4 event generator for benchmarks
+Produces columnar batches (the shape process_button_metrics reads fastest)
+with realistic mixes: uneven traffic across variants and button types, a
+hover -> click funnel whose click rate depends on the variant, log-normal
+durations, and a heavy-tailed visitor population with several sessions each
+"""
+
+from typing import Dict, List, Any
+
+import numpy as np
+
+VARIANT_WEIGHTS = {'original': 0.28, 'colors': 0.18, 'sizes': 0.18, 'spacing': 0.18, 'typography': 0.18}
+BUTTON_TYPE_WEIGHTS = {'cta': 0.5, 'navigation': 0.3, 'feature': 0.2}
+
+# Event names per button type: (hover event, click event)
+BUTTON_EVENTS = {
+    'cta': ('button_hover_start', 'cta_click'),
+    'navigation': ('nav_hover_start', 'navigation_click'),
+    'feature': ('feature_hover_start', 'feature_click')
+}
+# Share of events that are not hovers or clicks
+NOISE_EVENTS = {'page_view': 0.15, 'button_hover_end': 0.15}
+
+# Clicks per hover by variant; the variants move CTR a little around the control
+VARIANT_CLICK_RATES = {'original': 0.30, 'colors': 0.34, 'sizes': 0.31, 'spacing': 0.29, 'typography': 0.30}
+
+HOVER_MEDIAN_MS = 900
+CLICK_DELAY_MEDIAN_MS = 600
+EVENTS_PER_VISITOR = 20
+SESSIONS_PER_VISITOR = 4
+
+def _choice(rng: np.random.Generator, weights: Dict[str, float], n: int) -> np.ndarray:
+    p = np.array(list(weights.values()))
+    return rng.choice(len(p), size=n, p=p / p.sum())
+
+def generate_columns(n_events: int, seed: int = 42) -> Dict[str, Any]:
+    """A columnar batch of n_events events; string columns are dictionary-encoded"""
+    rng = np.random.default_rng(seed)
+    variants, button_types = list(VARIANT_WEIGHTS), list(BUTTON_TYPE_WEIGHTS)
+    variant = _choice(rng, VARIANT_WEIGHTS, n_events)
+    button_type = _choice(rng, BUTTON_TYPE_WEIGHTS, n_events)
+
+    # Event kind: noise, hover, or click with the variant's click rate among funnel events
+    noise_share = sum(NOISE_EVENTS.values())
+    click_rates = np.array([VARIANT_CLICK_RATES[v] for v in variants])
+    click_share = click_rates / (1 + click_rates)
+    roll = rng.random(n_events)
+    is_noise = roll < noise_share
+    is_click = ~is_noise & (rng.random(n_events) < click_share[variant])
+    is_hover = ~is_noise & ~is_click
+
+    names = list(NOISE_EVENTS) + [name for pair in BUTTON_EVENTS.values() for name in pair]
+    noise_code = np.where(roll < NOISE_EVENTS['page_view'], 0, 1)
+    hover_codes = np.array([names.index(BUTTON_EVENTS[t][0]) for t in button_types])
+    click_codes = np.array([names.index(BUTTON_EVENTS[t][1]) for t in button_types])
+    event_code = np.where(is_noise, noise_code, np.where(is_click, click_codes[button_type], hover_codes[button_type]))
+
+    hover_duration = np.where(
+        is_hover | is_click,
+        np.clip(rng.lognormal(np.log(HOVER_MEDIAN_MS), 0.8, n_events), 50, 60_000).round(),
+        0.0
+    )
+    total_engagement = np.where(
+        is_click, hover_duration + rng.lognormal(np.log(CLICK_DELAY_MEDIAN_MS), 0.7, n_events).round(), 0.0
+    )
+
+    # Heavy-tailed activity: a few visitors produce a large share of events
+    n_visitors = max(1, n_events // EVENTS_PER_VISITOR)
+    visitor = np.minimum((rng.pareto(1.2, n_events) * n_visitors / 50).astype(np.int64), n_visitors - 1)
+    session = visitor * SESSIONS_PER_VISITOR + rng.integers(0, SESSIONS_PER_VISITOR, n_events)
+
+    return {
+        "event_name": {"values": names, "codes": event_code},
+        "button_type": {"values": button_types, "codes": button_type},
+        "page_variant": {"values": variants, "codes": variant},
+        "hover_duration": hover_duration,
+        "total_engagement": total_engagement,
+        "visitor_id": {"values": [f"v{i}" for i in range(n_visitors)], "codes": visitor},
+        "session_id": {"values": [f"s{i}" for i in range(n_visitors * SESSIONS_PER_VISITOR)], "codes": session}
+    }
+
+def columns_to_events(columns: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Row-wise event dicts with the same content, for code paths that take "events" """
+    decoded = {
+        name: [column["values"][code] for code in column["codes"].tolist()] if isinstance(column, dict)
+        else column.tolist()
+        for name, column in columns.items()
+    }
+    return [dict(zip(decoded, values)) for values in zip(*decoded.values())]
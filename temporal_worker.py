@@ -5,17 +5,68 @@ This runs the Temporal worker that executes the workflows
 
 import asyncio
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from temporalio.client import Client
 from temporalio.worker import Worker
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner, SandboxRestrictions
+from cpu_pool import configure_cpu_pool, cpu_pool_size, shutdown_cpu_pool
+from data_converter import create_data_converter
+from fetch_cache import get_fetch_cache
+from instrumentation import REGISTRY, ActivityMetricsInterceptor, client_interceptors, start_metrics_server
+from profiling import ProfilingInterceptor
+from rate_limiter import quota_class_from_env
 from temporal_workflows import (
     ButtonAnalyticsWorkflow,
+    MultiPropertyAnalyticsWorkflow,
     fetch_ga4_data,
+    fetch_ga4_aggregates,
+    fetch_collected_events,
+    plan_incremental_fetch,
+    combine_daily_aggregates,
     process_button_metrics,
     generate_button_insights,
     save_insights_to_database,
     send_insights_notification
 )
 
+ACTIVITIES = [
+    fetch_ga4_data,
+    fetch_ga4_aggregates,
+    fetch_collected_events,
+    plan_incremental_fetch,
+    combine_daily_aggregates,
+    process_button_metrics,
+    generate_button_insights,
+    save_insights_to_database,
+    send_insights_notification
+]
+
+# Activities in flight per worker; CPU work beyond the pool size queues for a free process
+DEFAULT_MAX_CONCURRENT_ACTIVITIES = 100
+# Threads for blocking I/O inside activities (asyncio.to_thread): HTTP pages, SQLite, files
+DEFAULT_IO_THREADS = 32
+
+def create_worker(client: Client, task_queue: str = "button-analytics",
+                  max_concurrent_activities: Optional[int] = None) -> Worker:
+    """Worker that runs the button analytics workflow and all of its activities"""
+    if max_concurrent_activities is None:
+        max_concurrent_activities = int(os.environ.get('WORKER_MAX_CONCURRENT_ACTIVITIES',
+                                                       DEFAULT_MAX_CONCURRENT_ACTIVITIES))
+    return Worker(
+        client,
+        task_queue=task_queue,
+        workflows=[ButtonAnalyticsWorkflow, MultiPropertyAnalyticsWorkflow],
+        activities=ACTIVITIES,
+        max_concurrent_activities=max_concurrent_activities,
+        interceptors=[ActivityMetricsInterceptor(), ProfilingInterceptor()],
+        # Tracing interceptors (see instrumentation.client_interceptors) use opentelemetry inside workflows
+        workflow_runner=SandboxedWorkflowRunner(
+            restrictions=SandboxRestrictions.default.with_passthrough_modules("opentelemetry")
+        )
+    )
+
 async def main():
     """Start the Temporal worker"""
     
@@ -23,29 +74,38 @@ async def main():
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
     
-    # Connect to Temporal server
-    client = await Client.connect("localhost:7233")
+    # Blocking I/O goes to a sized thread pool, CPU-bound work to one process per core
+    io_threads = int(os.environ.get('IO_THREAD_POOL_SIZE', DEFAULT_IO_THREADS))
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(io_threads, thread_name_prefix="activity-io"))
+    configure_cpu_pool()
+    
+    # Connect to Temporal server; payloads are compacted, compressed and claim-checked (data_converter.py)
+    temporal_address = os.environ.get('TEMPORAL_ADDRESS', 'localhost:7233')
+    client = await Client.connect(temporal_address, data_converter=create_data_converter(),
+                                  interceptors=client_interceptors())
+    
+    # Prometheus metrics: activity latency, throughput, payload sizes, fetch cache
+    REGISTRY.add_collector(lambda: get_fetch_cache().metrics_lines())
+    metrics_server = start_metrics_server()
     
     # Create worker
-    worker = Worker(
-        client,
-        task_queue="button-analytics",
-        workflows=[ButtonAnalyticsWorkflow],
-        activities=[
-            fetch_ga4_data,
-            process_button_metrics,
-            generate_button_insights,
-            save_insights_to_database,
-            send_insights_notification
-        ]
-    )
+    worker = create_worker(client)
     
-    logger.info("🚀 Starting Temporal worker for button analytics...")
+    logger.info(f"🚀 Starting Temporal worker for button analytics on {temporal_address}...")
     logger.info("📊 Worker will process GA4 button analytics workflows")
+    logger.info(f"⚙️ CPU pool: {cpu_pool_size()} processes, I/O threads: {io_threads}")
+    core_quota = quota_class_from_env('core')
+    if core_quota:
+        logger.info(f"🚦 GA4 core quota: {core_quota.rate:g} requests/s, bursts of {core_quota.burst:g}")
+    if metrics_server:
+        logger.info(f"📈 Metrics at http://localhost:{metrics_server.server_address[1]}/metrics")
     logger.info("⏰ Worker is ready to execute workflows")
     
     # Run the worker
-    await worker.run()
+    try:
+        await worker.run()
+    finally:
+        shutdown_cpu_pool()
 
 if __name__ == "__main__":
     asyncio.run(main())
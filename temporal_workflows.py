@@ -4,14 +4,46 @@ This creates a DAG-like workflow to analyze button performance data
 """
 
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+import os
+import time
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import asdict, dataclass, field
 from temporalio import workflow, activity
 from temporalio.client import Client
-import requests
+from temporalio.exceptions import ChildWorkflowError
 import json
 
+with workflow.unsafe.imports_passed_through():
+    from metrics_engine import compute_metric_rows, compute_partials, events_to_columns, merge_partials
+    from aggregate_store import AggregateStore, DEFAULT_LOOKBACK_DAYS, is_final_day
+    from event_log import SAFE_PROPERTY_ID, property_log_dir, read_segment, segment_paths
+    from ga4_reporting import (
+        REPORT_DIMENSIONS, REPORT_METRICS, GA4ReportingClient, QuotaExceeded, page_size_from_env,
+        next_offset, page_to_columns, reporting_url_from_env
+    )
+    from rate_limiter import acquire_quota
+    from fetch_cache import get_fetch_cache
+    from insights_store import InsightsStore
+    from data_converter import create_data_converter
+    from cpu_pool import run_cpu
+    from instrumentation import EVENTS_PER_SECOND, EVENTS_PROCESSED, QUOTA_EXCEEDED, client_interceptors
+    from significance import CONTROL_VARIANT, compare_variants
+
+LATEST_INSIGHTS_PATH = "button_insights.json"
+
+def insights_snapshot_path(property_id: str) -> str:
+    """button_insights.json for the site's own property (GA4_MEASUREMENT_ID), button_insights-<id>.json for others"""
+    if not property_id or property_id == os.environ.get('GA4_MEASUREMENT_ID', 'G-JHSVNWL6QH'):
+        return LATEST_INSIGHTS_PATH
+    if not SAFE_PROPERTY_ID.match(property_id):
+        raise ValueError(f"invalid property id: {property_id!r}")
+    return f"button_insights-{property_id}.json"
+
+# Posterior probability of beating the control needed before a variant is recommended
+SIGNIFICANT_PROBABILITY = 0.95
+
 # Data structures for button analytics
 @dataclass
 class ButtonMetrics:
@@ -24,6 +56,21 @@ class ButtonMetrics:
     click_through_rate: float
     engagement_score: float
     conversion_rate: float
+    # Duration percentiles in ms, estimated from mergeable quantile sketches
+    hover_duration_p50: float = 0.0
+    hover_duration_p90: float = 0.0
+    hover_duration_p99: float = 0.0
+    engagement_p50: float = 0.0
+    engagement_p90: float = 0.0
+    engagement_p99: float = 0.0
+    # Approximate distinct counts from HyperLogLog sketches
+    unique_visitors: int = 0
+    unique_clickers: int = 0
+    unique_sessions: int = 0
+    visitor_click_through_rate: float = 0.0
+    # Serialized duration sketches, resampled by the significance engine
+    hover_duration_sketch: Dict[str, int] = field(default_factory=dict)
+    engagement_sketch: Dict[str, int] = field(default_factory=dict)
 
 @dataclass
 class ButtonInsights:
@@ -32,6 +79,24 @@ class ButtonInsights:
     most_engaging_variant: str
     button_recommendations: List[str]
     performance_summary: Dict[str, Any]
+    # Variant-vs-control and pairwise comparisons per button type (see significance.py)
+    significance: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class ButtonAnalysisInput:
+    """ButtonAnalyticsWorkflow parameters"""
+    property_id: str
+    days_back: int = 7
+    partition_days: int = 1
+    max_concurrent_partitions: int = 8
+    # Fetch only days not stored as final, and merge the stored ones back in
+    incremental: bool = True
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+    # Last day (YYYY-MM-DD) of a past window; defaults to now
+    end_date: Optional[str] = None
+    # A backfilled day: stored as history at its own date, without a notification
+    # and without replacing the property's latest run
+    backfill: bool = False
 
 # Temporal Activities (individual tasks)
 @activity.defn
@@ -62,58 +127,192 @@ async def fetch_ga4_data(property_id: str, start_date: str, end_date: str) -> Di
         "date_range": f"{start_date} to {end_date}"
     }
 
+# Source of fetch_ga4_aggregates results without GA4_REPORTING_URL; never stored
+MOCK_SOURCE = "mock"
+
+def data_source() -> str:
+    """Where fetch_ga4_aggregates reads events from, as part of the aggregate store's key"""
+    if os.environ.get('EVENT_SOURCE') == 'collector':
+        return "collector"
+    reporting_url = reporting_url_from_env()
+    return f"ga4:{reporting_url}" if reporting_url else MOCK_SOURCE
+
+@activity.defn
+async def fetch_ga4_aggregates(property_id: str, start_date: str, end_date: str) -> Dict[str, Any]:
+    """Stream GA4 report pages, folding each page into running per-button aggregates
+
+    The page cursor and running aggregates are heartbeated after every page, so a
+    retried attempt resumes from the last completed page instead of starting over.
+    With EVENT_SOURCE=collector the first-party event log is read instead, one
+    segment per page. Without GA4_REPORTING_URL the mock events from
+    fetch_ga4_data are aggregated. Report results are cached per property,
+    date range and report shape (see fetch_cache.py), and report pages wait
+    for the shared GA4 quota (see rate_limiter.py).
+    """
+    if os.environ.get('EVENT_SOURCE') == 'collector':
+        return await _aggregate_event_log(property_id, start_date, end_date)
+
+    reporting_url = reporting_url_from_env()
+    if not reporting_url:
+        raw_data = await fetch_ga4_data(property_id, start_date, end_date)
+        return {
+            "partials": compute_partials({"columns": events_to_columns(raw_data["events"])}),
+            "total_events": raw_data.get("total_events", 0),
+            "date_range": raw_data.get("date_range"),
+            "pages": 1
+        }
+
+    # Identical report queries reuse cached results and share one in-flight fetch
+    query_shape = {"url": reporting_url, "dimensions": REPORT_DIMENSIONS, "metrics": REPORT_METRICS}
+    return await get_fetch_cache().get_or_fetch(
+        property_id, start_date, end_date, query_shape,
+        lambda: _stream_report_aggregates(reporting_url, property_id, start_date, end_date),
+        while_waiting=activity.heartbeat
+    )
+
+async def _stream_report_aggregates(reporting_url: str, property_id: str, start_date: str,
+                                    end_date: str) -> Dict[str, Any]:
+    """Fold every report page into partials, resuming from the heartbeated row offset"""
+    state = {"offset": 0, "partials": {}, "total_events": 0, "pages": 0, "complete": False}
+    heartbeat_details = activity.info().heartbeat_details
+    if heartbeat_details:
+        state.update(heartbeat_details[0])
+        activity.logger.info(f"Resuming GA4 fetch after {state['pages']} pages")
+
+    client = GA4ReportingClient(reporting_url, page_size=page_size_from_env())
+    while not state["complete"]:
+        # Every page draws on the worker's shared "core" quota, fairly between properties
+        await acquire_quota(property_id)
+        try:
+            page = await asyncio.to_thread(
+                client.run_report_page, property_id, start_date, end_date, state["offset"]
+            )
+        except QuotaExceeded as e:
+            # Over quota anyway (e.g. other workers share it): back off and retry the same page
+            QUOTA_EXCEEDED.inc(quota_class='core')
+            activity.heartbeat(state)
+            await asyncio.sleep(e.retry_after)
+            continue
+        page_partials, page_events = await run_cpu(_page_partials, page)
+        merge_partials(state["partials"], page_partials)
+        state["total_events"] += page_events
+        state["pages"] += 1
+        offset = next_offset(page, state["offset"])
+        state["complete"] = offset is None
+        if offset is not None:
+            state["offset"] = offset
+        activity.heartbeat(state)
+
+    return {
+        "partials": state["partials"],
+        "total_events": state["total_events"],
+        "date_range": f"{start_date} to {end_date}",
+        "pages": state["pages"]
+    }
+
+def _page_partials(page: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Partials and event count of one report page (runs in the CPU pool)"""
+    columns = page_to_columns(page)
+    return compute_partials({"columns": columns}), sum(columns["event_count"])
+
+COLLECTOR_CHUNK_EVENTS = 50000
+
+def _aggregate_segment(path: str) -> Dict[str, Any]:
+    """Fold one event log segment into partials, a bounded chunk of events at a time"""
+    partials, total_events = {}, 0
+    events = read_segment(path)
+    while True:
+        chunk = list(islice(events, COLLECTOR_CHUNK_EVENTS))
+        if not chunk:
+            return {"partials": partials, "total_events": total_events}
+        merge_partials(partials, compute_partials({"columns": events_to_columns(chunk)}))
+        total_events += len(chunk)
+
+async def _aggregate_event_log(property_id: str, start_date: str, end_date: str) -> Dict[str, Any]:
+    """Stream the first-party event log like GA4 pages, heartbeating the segment cursor"""
+    paths = segment_paths(property_log_dir(property_id), start_date, end_date)
+    state = {"segment": 0, "partials": {}, "total_events": 0}
+    heartbeat_details = activity.info().heartbeat_details
+    if heartbeat_details:
+        state.update(heartbeat_details[0])
+
+    while state["segment"] < len(paths):
+        segment = await run_cpu(_aggregate_segment, paths[state["segment"]])
+        merge_partials(state["partials"], segment["partials"])
+        state["total_events"] += segment["total_events"]
+        state["segment"] += 1
+        activity.heartbeat(state)
+
+    return {
+        "partials": state["partials"],
+        "total_events": state["total_events"],
+        "date_range": f"{start_date} to {end_date}",
+        "pages": len(paths)
+    }
+
+@activity.defn
+async def fetch_collected_events(property_id: str, start_date: str, end_date: str) -> Dict[str, Any]:
+    """fetch_ga4_data-compatible read of the first-party event log (see /api/events)"""
+    def read():
+        return [
+            event
+            for path in segment_paths(property_log_dir(property_id), start_date, end_date)
+            for event in read_segment(path)
+        ]
+
+    events = await asyncio.to_thread(read)
+    return {
+        "events": events,
+        "total_events": len(events),
+        "date_range": f"{start_date} to {end_date}"
+    }
+
+@activity.defn
+async def plan_incremental_fetch(property_id: str, days: List[str]) -> List[str]:
+    """Days of the window that are not yet stored as final for the current data source and must be fetched"""
+    return await asyncio.to_thread(AggregateStore().days_to_fetch, property_id, data_source(), days)
+
+@activity.defn
+async def combine_daily_aggregates(property_id: str, days: List[str], fresh: Dict[str, Dict[str, Any]],
+                                   lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> Dict[str, Any]:
+    """Store freshly fetched days, then merge stored and fresh aggregates for the whole window
+
+    Mock fallback results are merged but never stored, so they cannot stand in
+    for real data once GA4_REPORTING_URL is set.
+    """
+    def combine():
+        store, source = AggregateStore(), data_source()
+        if source != MOCK_SOURCE:
+            for day, result in fresh.items():
+                store.save_day(property_id, source, day, result, is_final=is_final_day(day, lookback_days))
+        results = {**store.load_days(property_id, source, [day for day in days if day not in fresh]), **fresh}
+        return merge_partition_results([results[day] for day in days if day in results])
+
+    return await asyncio.to_thread(combine)
+
 @activity.defn
 async def process_button_metrics(raw_data: Dict[str, Any]) -> List[ButtonMetrics]:
     """Process raw GA4 data into button metrics"""
-    events = raw_data.get("events", [])
-    
-    # Group events by button type and page variant
-    button_groups = {}
-    for event in events:
-        key = f"{event.get('button_type', 'unknown')}_{event.get('page_variant', 'unknown')}"
-        if key not in button_groups:
-            button_groups[key] = {
-                'clicks': 0,
-                'hovers': 0,
-                'hover_durations': [],
-                'engagement_times': []
-            }
-        
-        if event.get('event_name') in ['cta_click', 'navigation_click', 'feature_click']:
-            button_groups[key]['clicks'] += 1
-            button_groups[key]['engagement_times'].append(event.get('total_engagement', 0))
-        
-        if event.get('event_name') in ['button_hover_start', 'nav_hover_start', 'feature_hover_start']:
-            button_groups[key]['hovers'] += 1
-            button_groups[key]['hover_durations'].append(event.get('hover_duration', 0))
-    
-    # Calculate metrics for each button group
-    metrics = []
-    for key, data in button_groups.items():
-        button_type, page_variant = key.split('_', 1)
-        
-        avg_hover_duration = sum(data['hover_durations']) / len(data['hover_durations']) if data['hover_durations'] else 0
-        click_through_rate = data['clicks'] / data['hovers'] if data['hovers'] > 0 else 0
-        avg_engagement = sum(data['engagement_times']) / len(data['engagement_times']) if data['engagement_times'] else 0
-        
-        # Calculate engagement score (combination of CTR, hover time, and clicks)
-        engagement_score = (click_through_rate * 0.4 + 
-                          (avg_hover_duration / 1000) * 0.3 + 
-                          (data['clicks'] / 10) * 0.3)
-        
-        metrics.append(ButtonMetrics(
-            button_id=key,
-            button_type=button_type,
-            page_variant=page_variant,
-            total_clicks=data['clicks'],
-            total_hovers=data['hovers'],
-            avg_hover_duration=avg_hover_duration,
-            click_through_rate=click_through_rate,
-            engagement_score=engagement_score,
-            conversion_rate=click_through_rate
-        ))
-    
-    return metrics
+    # Group events by button type and page variant with columnar reductions;
+    # raw_data carries row-wise "events", a columnar "columns" batch, or
+    # already-folded "partials" from fetch_ga4_aggregates
+    # The reductions run in the worker's CPU process pool so the event loop keeps heartbeating
+    start = time.perf_counter()
+    rows = await run_cpu(compute_metric_rows, raw_data)
+    elapsed = time.perf_counter() - start
+    n_events = _event_count(raw_data)
+    EVENTS_PROCESSED.inc(n_events)
+    if elapsed > 0:
+        EVENTS_PER_SECOND.set(n_events / elapsed)
+    return [ButtonMetrics(**row) for row in rows]
+
+def _event_count(raw_data: Dict[str, Any]) -> int:
+    if "total_events" in raw_data:
+        return raw_data["total_events"]
+    if "columns" in raw_data:
+        columns = raw_data["columns"]
+        return int(sum(columns["event_count"])) if "event_count" in columns else len(columns["hover_duration"])
+    return len(raw_data.get("events", []))
 
 @activity.defn
 async def generate_button_insights(metrics: List[ButtonMetrics]) -> ButtonInsights:
@@ -156,6 +355,15 @@ async def generate_button_insights(metrics: List[ButtonMetrics]) -> ButtonInsigh
     
     if best_button.click_through_rate < 0.5:
         recommendations.append("🎯 Focus on improving button visibility and call-to-action clarity")
+
+    significance = await run_cpu(compare_variants, [asdict(m) for m in metrics])
+    for button_type, comparison in significance.get("button_types", {}).items():
+        for variant, ctr in comparison["ctr"].items():
+            if (ctr["prob_beats_control"] or 0) >= SIGNIFICANT_PROBABILITY:
+                recommendations.append(
+                    f"📈 {variant} lifts {button_type} CTR over {CONTROL_VARIANT} "
+                    f"({ctr['prob_beats_control']:.0%} probability)"
+                )
     
     # Performance summary
     performance_summary = {
@@ -164,7 +372,21 @@ async def generate_button_insights(metrics: List[ButtonMetrics]) -> ButtonInsigh
         "best_engagement_score": best_button.engagement_score,
         "worst_engagement_score": worst_button.engagement_score,
         "most_clicked_button": max(metrics, key=lambda x: x.total_clicks).button_id,
-        "highest_ctr_button": max(metrics, key=lambda x: x.click_through_rate).button_id
+        "highest_ctr_button": max(metrics, key=lambda x: x.click_through_rate).button_id,
+        "slowest_hover_p90_button": max(metrics, key=lambda x: x.hover_duration_p90).button_id,
+        "highest_visitor_ctr_button": max(metrics, key=lambda x: x.visitor_click_through_rate).button_id,
+        "unique_visitors_by_button": {m.button_id: m.unique_visitors for m in metrics},
+        "duration_percentiles": {
+            m.button_id: {
+                "hover_p50": m.hover_duration_p50,
+                "hover_p90": m.hover_duration_p90,
+                "hover_p99": m.hover_duration_p99,
+                "engagement_p50": m.engagement_p50,
+                "engagement_p90": m.engagement_p90,
+                "engagement_p99": m.engagement_p99
+            }
+            for m in metrics
+        }
     }
     
     return ButtonInsights(
@@ -172,27 +394,50 @@ async def generate_button_insights(metrics: List[ButtonMetrics]) -> ButtonInsigh
         worst_performing_button=f"{worst_button.button_type} on {worst_button.page_variant}",
         most_engaging_variant=most_engaging_variant,
         button_recommendations=recommendations,
-        performance_summary=performance_summary
+        performance_summary=performance_summary,
+        significance=significance
     )
 
 @activity.defn
-async def save_insights_to_database(insights: ButtonInsights) -> str:
-    """Save insights to database or file"""
-    # In a real implementation, this would save to a database
-    # For demo, saving to a JSON file
+async def save_insights_to_database(insights: ButtonInsights, metrics: Optional[List[ButtonMetrics]] = None,
+                                    property_id: str = "", run_date: Optional[str] = None) -> str:
+    """Record the run in the insights history store and refresh the property's latest-insights snapshot
+
+    run_date (YYYY-MM-DD) marks a backfilled day: the run is stored at that date
+    as history only, and neither it nor the snapshot becomes the latest run.
+    """
+    run_time = datetime.strptime(run_date, "%Y-%m-%d").replace(tzinfo=timezone.utc) if run_date else None
     insights_data = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": (run_time or datetime.now()).isoformat(),
         "best_performing_button": insights.best_performing_button,
         "worst_performing_button": insights.worst_performing_button,
         "most_engaging_variant": insights.most_engaging_variant,
         "recommendations": insights.button_recommendations,
-        "performance_summary": insights.performance_summary
+        "performance_summary": insights.performance_summary,
+        "significance": insights.significance
     }
-    
-    with open("button_insights.json", "w") as f:
-        json.dump(insights_data, f, indent=2)
-    
-    return f"Insights saved to button_insights.json at {datetime.now()}"
+    metric_rows = [asdict(metric) for metric in metrics or []]
+
+    def save() -> int:
+        store = InsightsStore()
+        try:
+            run_id = store.save_run(property_id, insights_data, metric_rows,
+                                    created_at=run_time.timestamp() if run_time else None,
+                                    historical=run_time is not None)
+        finally:
+            store.close()
+        if run_time is not None:
+            return run_id
+        # The JSON snapshot is kept for CLI users; write-then-rename so readers never see a partial file
+        snapshot_path = insights_snapshot_path(property_id)
+        tmp_path = f"{snapshot_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(insights_data, f, indent=2)
+        os.replace(tmp_path, snapshot_path)
+        return run_id
+
+    run_id = await asyncio.to_thread(save)
+    return f"Insights run {run_id} saved to the insights store at {datetime.now()}"
 
 @activity.defn
 async def send_insights_notification(insights: ButtonInsights) -> str:
@@ -212,67 +457,142 @@ async def send_insights_notification(insights: ButtonInsights) -> str:
     print(f"📧 Notification sent: {message}")
     return f"Notification sent at {datetime.now()}"
 
+def partition_date_range(start_date: datetime, end_date: datetime, partition_days: int = 1) -> List[Tuple[str, str]]:
+    """Split the inclusive date range into consecutive (start, end) day ranges"""
+    step = max(1, partition_days)
+    first = start_date.date()
+    last = end_date.date()
+    partitions = []
+    while first <= last:
+        partition_end = min(first + timedelta(days=step - 1), last)
+        partitions.append((first.strftime("%Y-%m-%d"), partition_end.strftime("%Y-%m-%d")))
+        first = partition_end + timedelta(days=1)
+    return partitions
+
+def merge_partition_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fan-in: combine fetch_ga4_aggregates results from several partitions"""
+    merged = {"partials": {}, "total_events": 0, "pages": 0}
+    for result in results:
+        merge_partials(merged["partials"], result.get("partials", {}))
+        merged["total_events"] += result.get("total_events", 0)
+        merged["pages"] += result.get("pages", 0)
+    return merged
+
 # Temporal Workflow (DAG-like orchestration)
 @workflow.defn
 class ButtonAnalyticsWorkflow:
     """Main workflow for processing GA4 button analytics"""
     
+    STEPS = ("fetch", "process", "insights", "save", "notify")
+
+    def __init__(self) -> None:
+        self._steps = {step: "pending" for step in self.STEPS}
+        self._partitions_total = 0
+        self._partitions_done = 0
+
+    @workflow.query
+    def progress(self) -> Dict[str, Any]:
+        """Per-step status ("pending", "running", "completed", "skipped") and partition counts"""
+        return {
+            "steps": dict(self._steps),
+            "partitions_total": self._partitions_total,
+            "partitions_done": self._partitions_done
+        }
+
     @workflow.run
-    async def run(self, property_id: str, days_back: int = 7) -> Dict[str, Any]:
-        """Main workflow execution"""
+    async def run(self, params: ButtonAnalysisInput) -> Dict[str, Any]:
+        """Main workflow execution
+
+        In incremental mode the window is handled per day: only days that are not
+        stored as final are fetched, and stored days are merged back in.
+        """
+        property_id, max_concurrent_partitions = params.property_id, params.max_concurrent_partitions
         
-        # Calculate date range
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days_back)
+        # Calculate date range (workflow.now() keeps replays deterministic)
+        if params.end_date:
+            window_end = datetime.strptime(params.end_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        else:
+            window_end = workflow.now()
+        start_date = window_end - timedelta(days=params.days_back)
         
-        # Step 1: Fetch GA4 data
-        workflow.logger.info("🔄 Fetching GA4 data...")
-        raw_data = await workflow.execute_activity(
-            fetch_ga4_data,
-            args=[property_id, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")],
-            start_to_close_timeout=timedelta(minutes=5)
-        )
+        # Step 1: Fetch GA4 data, fanned out over date partitions and merged back
+        self._steps["fetch"] = "running"
+        if params.incremental:
+            days = [day for day, _ in partition_date_range(start_date, window_end, 1)]
+            days_to_fetch = await workflow.execute_activity(
+                plan_incremental_fetch,
+                args=[property_id, days],
+                start_to_close_timeout=timedelta(minutes=1)
+            )
+            workflow.logger.info(f"🔄 Fetching GA4 data for {len(days_to_fetch)} of {len(days)} days...")
+            partitions = [(day, day) for day in days_to_fetch]
+            results = await self._fetch_partitions(property_id, partitions, max_concurrent_partitions)
+            raw_data = await workflow.execute_activity(
+                combine_daily_aggregates,
+                args=[property_id, days, {day: result for day, result in zip(days_to_fetch, results)}, params.lookback_days],
+                start_to_close_timeout=timedelta(minutes=5)
+            )
+            date_range = f"{days[0]} to {days[-1]}"
+        else:
+            partitions = partition_date_range(start_date, window_end, params.partition_days)
+            workflow.logger.info(f"🔄 Fetching GA4 data in {len(partitions)} partitions...")
+            raw_data = merge_partition_results(
+                await self._fetch_partitions(property_id, partitions, max_concurrent_partitions)
+            )
+            date_range = f"{partitions[0][0]} to {partitions[-1][1]}"
+        raw_data["date_range"] = date_range
+        self._steps["fetch"] = "completed"
         
         # Step 2: Process button metrics
         workflow.logger.info("📊 Processing button metrics...")
+        self._steps["process"] = "running"
         metrics = await workflow.execute_activity(
             process_button_metrics,
             args=[raw_data],
             start_to_close_timeout=timedelta(minutes=3)
         )
+        self._steps["process"] = "completed"
         
         # Step 3: Generate insights
         workflow.logger.info("🧠 Generating insights...")
+        self._steps["insights"] = "running"
         insights = await workflow.execute_activity(
             generate_button_insights,
             args=[metrics],
             start_to_close_timeout=timedelta(minutes=2)
         )
+        self._steps["insights"] = "completed"
         
-        # Step 4: Save insights (parallel with notification)
+        # Step 4: Save insights (parallel with notification); a backfilled day is stored at its own date
         workflow.logger.info("💾 Saving insights...")
-        save_task = workflow.execute_activity(
+        run_date = window_end.strftime("%Y-%m-%d") if params.backfill else None
+        save_task = self._run_step("save", workflow.execute_activity(
             save_insights_to_database,
-            args=[insights],
-            start_to_close_timeout=timedelta(minutes=1)
-        )
-        
-        # Step 5: Send notification (parallel with save)
-        workflow.logger.info("📧 Sending notification...")
-        notify_task = workflow.execute_activity(
-            send_insights_notification,
-            args=[insights],
+            args=[insights, metrics, property_id, run_date],
             start_to_close_timeout=timedelta(minutes=1)
-        )
+        ))
         
-        # Wait for both parallel tasks to complete
-        save_result, notify_result = await asyncio.gather(save_task, notify_task)
+        # Step 5: Send notification (parallel with save); nobody needs one per backfilled day
+        if params.backfill:
+            self._steps["notify"] = "skipped"
+            save_result, notify_result = await save_task, None
+        else:
+            workflow.logger.info("📧 Sending notification...")
+            notify_task = self._run_step("notify", workflow.execute_activity(
+                send_insights_notification,
+                args=[insights],
+                start_to_close_timeout=timedelta(minutes=1)
+            ))
+            
+            # Wait for both parallel tasks to complete
+            save_result, notify_result = await asyncio.gather(save_task, notify_task)
         
         # Return workflow results
         return {
             "status": "completed",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": workflow.now().isoformat(),
             "data_points_processed": raw_data.get("total_events", 0),
+            "partitions_fetched": len(partitions),
             "buttons_analyzed": len(metrics),
             "best_button": insights.best_performing_button,
             "recommendations_count": len(insights.button_recommendations),
@@ -280,19 +600,98 @@ class ButtonAnalyticsWorkflow:
             "notification_result": notify_result
         }
 
+    async def _run_step(self, step: str, activity_call) -> Any:
+        self._steps[step] = "running"
+        result = await activity_call
+        self._steps[step] = "completed"
+        return result
+
+    async def _fetch_partitions(self, property_id: str, partitions: List[Tuple[str, str]],
+                                max_concurrent: int) -> List[Dict[str, Any]]:
+        """Fetch every partition as its own activity, at most max_concurrent at a time"""
+        semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self._partitions_total = len(partitions)
+
+        async def fetch(partition_start: str, partition_end: str) -> Dict[str, Any]:
+            async with semaphore:
+                result = await workflow.execute_activity(
+                    fetch_ga4_aggregates,
+                    args=[property_id, partition_start, partition_end],
+                    start_to_close_timeout=timedelta(minutes=30),
+                    heartbeat_timeout=timedelta(minutes=1)
+                )
+                self._partitions_done += 1
+                return result
+
+        return list(await asyncio.gather(*(fetch(start, end) for start, end in partitions)))
+
+@workflow.defn
+class MultiPropertyAnalyticsWorkflow:
+    """Batch parent: one ButtonAnalyticsWorkflow child per property, a bounded number at a time
+
+    Each child stores its run under its own property id. The children's GA4
+    requests share the quota buckets (see rate_limiter.py), which
+    keep them under the quota and share it fairly between properties.
+    """
+
+    def __init__(self) -> None:
+        self._properties: Dict[str, str] = {}
+
+    @workflow.query
+    def progress(self) -> Dict[str, Any]:
+        """Per-property status ("pending", "running", "completed", "failed")"""
+        return {"properties": dict(self._properties)}
+
+    @workflow.run
+    async def run(self, property_ids: List[str], days_back: int = 7,
+                  max_concurrent_properties: int = 4) -> Dict[str, Any]:
+        property_ids = list(dict.fromkeys(property_ids))
+        self._properties = {property_id: "pending" for property_id in property_ids}
+        semaphore = asyncio.Semaphore(max(1, max_concurrent_properties))
+
+        async def analyze(property_id: str) -> Dict[str, Any]:
+            async with semaphore:
+                self._properties[property_id] = "running"
+                try:
+                    result = await workflow.execute_child_workflow(
+                        ButtonAnalyticsWorkflow.run,
+                        ButtonAnalysisInput(property_id, days_back),
+                        id=f"{workflow.info().workflow_id}-{property_id}"
+                    )
+                except ChildWorkflowError as e:
+                    # One failing property does not fail the batch
+                    self._properties[property_id] = "failed"
+                    return {"status": "failed", "error": str(e.cause or e)}
+                self._properties[property_id] = "completed"
+                return result
+
+        workflow.logger.info(f"🏬 Analyzing {len(property_ids)} properties, "
+                             f"{max_concurrent_properties} at a time...")
+        results = dict(zip(property_ids, await asyncio.gather(*(analyze(p) for p in property_ids))))
+        failed = [property_id for property_id, status in self._properties.items() if status == "failed"]
+        return {
+            "status": "completed" if not failed else "partial",
+            "timestamp": workflow.now().isoformat(),
+            "properties_analyzed": len(property_ids) - len(failed),
+            "failed_properties": failed,
+            "results": results
+        }
+
 # Workflow execution function
 async def run_button_analytics_workflow(property_id: str, days_back: int = 7):
     """Execute the button analytics workflow"""
     
     # Connect to Temporal server
-    client = await Client.connect("localhost:7233")
+    client = await Client.connect(os.environ.get('TEMPORAL_ADDRESS', 'localhost:7233'),
+                                  data_converter=create_data_converter(),
+                                  interceptors=client_interceptors())
     
     # Start the workflow
     workflow_id = f"button-analytics-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
     
     result = await client.execute_workflow(
         ButtonAnalyticsWorkflow.run,
-        args=[property_id, days_back],
+        ButtonAnalysisInput(property_id, days_back),
         id=workflow_id,
         task_queue="button-analytics"
     )
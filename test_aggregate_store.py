@@ -0,0 +1,97 @@
+"""
+Tests for the incremental per-day aggregation store
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+import hyperloglog
+from aggregate_store import AggregateStore, is_final_day
+from mock_ga4_server import MockGA4ReportingServer
+from temporal_workflows import (
+    combine_daily_aggregates,
+    fetch_ga4_aggregates,
+    merge_partition_results,
+    plan_incremental_fetch,
+    process_button_metrics
+)
+
+DAYS = ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "aggregates.db")
+    monkeypatch.setenv('AGGREGATE_STORE_PATH', path)
+    monkeypatch.setenv('FETCH_CACHE_PATH', str(tmp_path / "fetch_cache.db"))
+    return path
+
+def run_activity(fn, *args):
+    return asyncio.run(ActivityEnvironment().run(fn, *args))
+
+def test_is_final_day():
+    today = datetime(2024, 1, 10, tzinfo=timezone.utc)
+    assert is_final_day("2024-01-06", 3, today)
+    assert not is_final_day("2024-01-07", 3, today)
+    assert not is_final_day("2024-01-10", 3, today)
+
+def test_round_trip_keeps_group_order(store_path):
+    store = AggregateStore()
+    partials = {
+        "nav_sizes": {"clicks": 2, "hovers": 4, "hover_duration_sum": 900.0, "engagement_sum": 10.0,
+                      "hover_duration_sketch": {"300": 4}, "engagement_sketch": {"117": 2},
+                      "visitor_hll": hyperloglog.sketch_from_values(["u1", "u2"]),
+                      "clicker_hll": hyperloglog.sketch_from_values(["u1"]), "session_hll": ""},
+        "cta_original": {"clicks": 1, "hovers": 0, "hover_duration_sum": 0.0, "engagement_sum": 5.5,
+                         "hover_duration_sketch": {}, "engagement_sketch": {"87": 1},
+                         "visitor_hll": "", "clicker_hll": "", "session_hll": ""}
+    }
+    store.save_day("G-TEST", "ga4", "2024-01-01", {"partials": partials, "total_events": 6, "pages": 1}, is_final=True)
+
+    loaded = store.load_days("G-TEST", "ga4", DAYS)
+    assert list(loaded) == ["2024-01-01"]
+    assert list(loaded["2024-01-01"]["partials"].items()) == list(partials.items())
+    assert store.days_to_fetch("G-TEST", "ga4", DAYS) == ["2024-01-02", "2024-01-03"]
+    assert store.days_to_fetch("G-OTHER", "ga4", DAYS) == DAYS
+    assert store.days_to_fetch("G-TEST", "collector", DAYS) == DAYS and not store.load_days("G-TEST", "collector", DAYS)
+
+def test_open_days_are_refetched(store_path):
+    store = AggregateStore()
+    today = datetime.now(timezone.utc).date().strftime("%Y-%m-%d")
+    store.save_day("G-TEST", "ga4", today, {"partials": {}, "total_events": 0}, is_final=is_final_day(today))
+    assert store.days_to_fetch("G-TEST", "ga4", [today]) == [today]
+
+def test_second_run_only_fetches_missing_days(store_path, monkeypatch):
+    with MockGA4ReportingServer(events_per_day=300) as server:
+        monkeypatch.setenv('GA4_REPORTING_URL', server.url)
+
+        def incremental_run(days):
+            days_to_fetch = run_activity(plan_incremental_fetch, "G-TEST", days)
+            fresh = {day: run_activity(fetch_ga4_aggregates, "G-TEST", day, day) for day in days_to_fetch}
+            return days_to_fetch, run_activity(combine_daily_aggregates, "G-TEST", days, fresh, 3)
+
+        fetched, first = incremental_run(DAYS[:2])
+        assert fetched == DAYS[:2]
+
+        fetched, second = incremental_run(DAYS)
+        assert fetched == ["2024-01-03"]
+        assert server.request_count == 3
+
+        full = merge_partition_results([run_activity(fetch_ga4_aggregates, "G-TEST", day, day) for day in DAYS])
+        assert second["total_events"] == full["total_events"] == 900
+        assert asyncio.run(process_button_metrics(second)) == asyncio.run(process_button_metrics(full))
+
+def test_mock_fallback_is_never_stored(store_path, monkeypatch):
+    monkeypatch.delenv('GA4_REPORTING_URL', raising=False)
+    monkeypatch.delenv('EVENT_SOURCE', raising=False)
+    fresh = {day: run_activity(fetch_ga4_aggregates, "G-TEST", day, day) for day in DAYS}
+    combined = run_activity(combine_daily_aggregates, "G-TEST", DAYS, fresh, 3)
+    assert combined["total_events"] == sum(result["total_events"] for result in fresh.values())
+    assert run_activity(plan_incremental_fetch, "G-TEST", DAYS) == DAYS
+
+    # Once a real reporting endpoint is configured, every day is fetched from it
+    with MockGA4ReportingServer(events_per_day=300) as server:
+        monkeypatch.setenv('GA4_REPORTING_URL', server.url)
+        assert run_activity(plan_incremental_fetch, "G-TEST", DAYS) == DAYS
@@ -0,0 +1,85 @@
+"""
+Tests for the static asset pipeline: CSS deltas, fingerprinting and precompressed serving
+"""
+
+import gzip
+import os
+import re
+
+import pytest
+
+import app as app_module
+from assets import ASSET_URL_PREFIX, IMMUTABLE_CACHE_CONTROL, css_delta, minify_css, serialize_css
+
+BASE = """
+/* base */
+.button { color: #333; padding: 10px 20px; }
+h1 { font-size: 2em; margin: 0 }
+@media (max-width: 768px) {
+    h1 { font-size: 1.5em; }
+}
+"""
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module.asset_pipeline, 'build_dir', str(tmp_path / "assets"))
+    monkeypatch.setattr(app_module.asset_pipeline, '_manifest', None)
+    # Pre-rendered pages link the assets of the build they were rendered with
+    app_module.pages.invalidate()
+    with app_module.app.test_client() as client:
+        yield client
+    app_module.pages.invalidate()
+
+def test_minify():
+    assert minify_css(BASE) == (".button{color:#333;padding:10px 20px}h1{font-size:2em;margin:0}"
+                                "@media (max-width:768px){h1{font-size:1.5em}}")
+    assert minify_css("a { opacity: 0.5; transition: all 0.3s, color 10.5s }") == "a{opacity:.5;transition:all .3s,color 10.5s}"
+
+def test_delta_keeps_cascade_order():
+    variant = BASE.replace("h1 { font-size: 2em", "h1 { font-size: 3em")
+    # The unchanged mobile rule must still win over the changed desktop size
+    assert serialize_css(css_delta(BASE, variant)) == "h1{font-size:3em}@media (max-width:768px){h1{font-size:1.5em}}"
+    assert css_delta(BASE, BASE) == []
+    assert serialize_css(css_delta(BASE, BASE + ".new { gap: 4px }")) == ".new{gap:4px}"
+
+def test_delta_cannot_remove_base_rules():
+    assert css_delta(BASE, BASE.replace("margin: 0", "")) is None
+    assert css_delta(BASE, BASE.replace(".button { color: #333; padding: 10px 20px; }", "")) is None
+
+def _page_requests(html):
+    return re.findall(r'(?:href|src)="(/(?:assets|static)/[^"]+)"', html)
+
+def test_variant_page_loads_base_and_inlines_delta(client):
+    html = client.get('/colors').get_data(as_text=True)
+    urls = _page_requests(html)
+    assert len(urls) == 2 and all(url.startswith(ASSET_URL_PREFIX) for url in urls)
+    assert '#4facfe' in html and '/static/css/colors.css' not in html
+    assert re.search(r'/assets/css/style\.[0-9a-f]{12}\.css', html)
+    assert re.search(r'/assets/js/main\.[0-9a-f]{12}\.js', html)
+
+def test_assets_are_precompressed_and_immutable(client):
+    url = next(url for url in _page_requests(client.get('/').get_data(as_text=True)) if url.endswith('.css'))
+    plain = client.get(url)
+    assert plain.status_code == 200 and plain.mimetype == 'text/css'
+    assert plain.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    compressed = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert compressed.headers['Content-Encoding'] == 'gzip' and compressed.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(compressed.data) == plain.data
+    # q-values count: a refused encoding is never picked, whatever the header mentions
+    assert 'Content-Encoding' not in client.get(url, headers={'Accept-Encoding': 'gzip;q=0, identity'}).headers
+    assert client.get(url, headers={'Accept-Encoding': 'br;q=0, gzip'}).headers['Content-Encoding'] == 'gzip'
+    assert client.get(url, headers={'Accept-Encoding': '*'}).headers['Content-Encoding'] in ('br', 'gzip')
+    assert client.get(url, headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+    assert client.get(f'{ASSET_URL_PREFIX}/manifest.json').status_code == 404
+    assert client.get(f'{ASSET_URL_PREFIX}/../app.py').status_code == 404
+
+def test_page_view_is_smaller_and_needs_fewer_requests(client):
+    static = app_module.app.static_folder
+    before_bytes = sum(os.path.getsize(os.path.join(static, name))
+                       for name in ('css/style.css', 'css/sizes.css', 'js/main.js'))
+
+    html = client.get('/sizes').get_data(as_text=True)
+    urls = _page_requests(html)
+    after_bytes = sum(len(client.get(url, headers={'Accept-Encoding': 'gzip'}).data) for url in urls)
+    assert len(urls) == 2  # was 3: style.css, sizes.css, main.js
+    assert after_bytes < before_bytes / 3
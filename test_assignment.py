@@ -0,0 +1,82 @@
+"""
+Tests for server-side landing variant assignment
+"""
+
+from collections import Counter
+
+import pytest
+
+import app as app_module
+from assignment import (ALLOCATION_SLOTS, VARIANT_COOKIE, VISITOR_COOKIE, VariantAssigner,
+                        allocation_table, bucket, thompson_shares)
+from variants import variant_names
+
+VARIANTS = variant_names()
+
+def _row(variant, clicks, hovers, button_type='cta'):
+    return {'button_type': button_type, 'page_variant': variant, 'total_clicks': clicks, 'total_hovers': hovers}
+
+def test_bucketing_is_deterministic_and_salted():
+    assert bucket('visitor-1', b'a') == bucket('visitor-1', b'a')
+    slots = [bucket(f'visitor-{i}', b'a') for i in range(2000)]
+    assert all(0 <= slot < ALLOCATION_SLOTS for slot in slots)
+    assert slots != [bucket(f'visitor-{i}', b'b') for i in range(2000)]
+
+def test_shares_shift_toward_the_better_variant_but_keep_exploring():
+    rows = [_row(variant, 20, 1000) for variant in VARIANTS if variant != 'colors'] + [_row('colors', 60, 1000)]
+    shares = thompson_shares(rows, VARIANTS)
+    assert sum(shares.values()) == pytest.approx(1)
+    assert shares['colors'] > 0.7
+    assert min(shares.values()) >= 0.05
+
+def test_no_data_means_even_split():
+    shares = thompson_shares([_row('colors', 5, 10, button_type='feature')], VARIANTS)
+    assert all(share == pytest.approx(1 / len(VARIANTS), abs=0.02) for share in shares.values())
+
+def test_table_matches_shares_and_moves_few_slots():
+    before = allocation_table({'a': 0.5, 'b': 0.3, 'c': 0.2}, 'abc')
+    after = allocation_table({'a': 0.45, 'b': 0.35, 'c': 0.2}, 'abc')
+    assert len(before) == ALLOCATION_SLOTS and Counter(before) == {'a': 5000, 'b': 3000, 'c': 2000}
+    assert sum(x != y for x, y in zip(before, after)) == 500
+
+def test_assigner_reallocates_on_new_runs_only(caplog):
+    runs = {'run_id': None, 'rows': []}
+    assigner = VariantAssigner(VARIANTS, lambda: (runs['run_id'], runs['rows']), salt=b'test')
+    assigner._thread = object()  # no background refresh in tests
+    initial = assigner.allocation
+    assert assigner.refresh() is initial
+
+    runs.update(run_id=1, rows=[_row('typography', 90, 1000)] + [_row(v, 10, 1000) for v in VARIANTS[:-1]])
+    with caplog.at_level('INFO', logger='assignment'):
+        allocation = assigner.refresh()
+    assert allocation.run_id == 1 and assigner.refresh() is allocation
+    assert [record.name for record in caplog.records] == ['assignment']
+    served = Counter(assigner.assign(f'visitor-{i}')[1] for i in range(5000))
+    assert served.most_common(1)[0][0] == 'typography'
+
+    # A returning visitor keeps their variant whatever the allocation says
+    assert assigner.assign('visitor-1', 'spacing') == ('visitor-1', 'spacing')
+    assert assigner.assign('visitor-1', 'retired')[1] in VARIANTS
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module.assigner, '_thread', object())
+    with app_module.app.test_client() as client:
+        yield client
+
+def test_landing_serves_a_sticky_variant(client):
+    first = client.get('/')
+    assert first.status_code == 200
+    assert 'Cookie' in first.headers['Vary'] and first.headers['Cache-Control'] == 'private, no-cache'
+    variant = client.get_cookie(VARIANT_COOKIE).value
+    assert client.get_cookie(VISITOR_COOKIE) is not None
+    assert f"window.pageVariant = '{variant}'" in first.get_data(as_text=True)
+    for _ in range(3):
+        again = client.get('/')
+        assert f"window.pageVariant = '{variant}'" in again.get_data(as_text=True)
+        assert 'Set-Cookie' not in again.headers
+
+def test_allocation_endpoint(client):
+    body = client.get('/api/allocation').get_json()
+    assert body['status'] == 'success'
+    assert set(body['shares']) == set(VARIANTS)
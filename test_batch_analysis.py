@@ -0,0 +1,143 @@
+"""
+Tests for multi-property batch analysis and quota-aware GA4 rate limiting
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+import requests
+from temporalio.testing import ActivityEnvironment
+
+from ga4_reporting import GA4ReportingClient, QuotaExceeded
+from instrumentation import QUOTA_EXCEEDED
+from mock_ga4_server import MockGA4ReportingServer
+from rate_limiter import FairTokenBucket, QuotaClass, SharedTokenStore, get_rate_limiter
+from temporal_workflows import MultiPropertyAnalyticsWorkflow, fetch_ga4_aggregates
+from workflow_trigger import TASK_QUEUE, start_batch_analysis
+
+def test_tokens_go_round_robin_between_keys():
+    bucket = FairTokenBucket(QuotaClass('core', rate=200, burst=1))
+    granted = []
+
+    async def request(key):
+        await bucket.acquire(key)
+        granted.append(key)
+
+    async def main():
+        big = [asyncio.create_task(request('big')) for _ in range(20)]
+        await asyncio.sleep(0)
+        small = [asyncio.create_task(request(key)) for key in ('small-1', 'small-2') for _ in range(3)]
+        await asyncio.gather(*big, *small)
+
+    asyncio.run(main())
+    # The small keys are served within the first rounds instead of after all of big's requests
+    last_small = max(i for i, key in enumerate(granted) if key != 'big')
+    assert last_small <= 10 and len(granted) == 26
+
+def test_limiter_is_configured_per_quota_class(monkeypatch, tmp_path):
+    monkeypatch.setenv('GA4_QUOTA_STORE_PATH', str(tmp_path / 'quota.db'))
+    monkeypatch.delenv('GA4_QUOTA_CORE_RATE', raising=False)
+    assert get_rate_limiter('core') is None
+    monkeypatch.setenv('GA4_QUOTA_CORE_RATE', '5')
+    limiter = get_rate_limiter('core')
+    assert limiter.quota == QuotaClass('core', 5.0, 5.0) and get_rate_limiter('core') is limiter
+    assert limiter.store.path == str(tmp_path / 'quota.db')
+
+def test_worker_processes_share_one_bucket(tmp_path):
+    # Two workers (own event loops and buckets) drawing on one store get the quota between them
+    quota = QuotaClass('core', rate=40, burst=2)
+    path = str(tmp_path / 'quota.db')
+    granted = []
+
+    def worker(name):
+        bucket = FairTokenBucket(quota, store=SharedTokenStore(path))
+
+        async def main():
+            for _ in range(10):
+                await bucket.acquire(name)
+                granted.append(time.monotonic())
+
+        asyncio.run(main())
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(name,)) for name in ('worker-1', 'worker-2')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 20 tokens at 40/s after a burst of 2 take at least 0.45s, not the 0.2s each worker alone would allow
+    assert len(granted) == 20 and max(granted) - started >= (20 - 2) / 40 * 0.95
+
+def test_mock_server_enforces_quota():
+    with MockGA4ReportingServer(events_per_day=10, quota_rate=2, quota_burst=2) as server:
+        client = GA4ReportingClient(server.url)
+        client.run_report_page("G-1", "2024-01-01", "2024-01-01")
+        client.run_report_page("G-2", "2024-01-01", "2024-01-01")
+        with pytest.raises(QuotaExceeded) as exceeded:
+            client.run_report_page("G-1", "2024-01-01", "2024-01-01")
+        assert exceeded.value.retry_after == pytest.approx(0.5)
+        assert (server.request_count, server.throttled_count) == (2, 1)
+        with pytest.raises(requests.HTTPError):
+            requests.post(f"{server.url}/v1beta/unknown").raise_for_status()
+
+@pytest.fixture
+def quota_server(monkeypatch, tmp_path):
+    monkeypatch.setenv('FETCH_CACHE_PATH', str(tmp_path / 'fetch_cache.db'))
+    monkeypatch.setenv('GA4_QUOTA_STORE_PATH', str(tmp_path / 'quota.db'))
+    monkeypatch.setenv('GA4_REPORT_PAGE_SIZE', '100')
+    monkeypatch.delenv('GA4_QUOTA_CORE_RATE', raising=False)
+    with MockGA4ReportingServer(events_per_day=700, quota_rate=50, quota_burst=5) as server:
+        monkeypatch.setenv('GA4_REPORTING_URL', server.url)
+        yield server
+
+async def _fetch_all(ranges):
+    finished = {}
+    started = time.monotonic()
+
+    async def fetch(property_id, start_date, end_date):
+        result = await ActivityEnvironment().run(fetch_ga4_aggregates, property_id, start_date, end_date)
+        finished[property_id] = time.monotonic() - started
+        return result
+
+    results = await asyncio.gather(*(fetch(*r) for r in ranges))
+    return results, finished, time.monotonic() - started
+
+def test_rejected_pages_are_retried(quota_server):
+    before = QUOTA_EXCEEDED.value(quota_class='core')
+    results, _, _ = asyncio.run(_fetch_all([("G-BIG", "2024-01-01", "2024-01-03"),
+                                            ("G-SMALL", "2024-01-01", "2024-01-01")]))
+    assert [result["total_events"] for result in results] == [2100, 700]
+    assert quota_server.throttled_count > 0
+    assert QUOTA_EXCEEDED.value(quota_class='core') - before == quota_server.throttled_count
+
+def test_shared_limiter_runs_near_quota_without_starving_small_properties(quota_server, monkeypatch):
+    monkeypatch.setenv('GA4_QUOTA_CORE_RATE', '45')
+    monkeypatch.setenv('GA4_QUOTA_CORE_BURST', '5')
+    ranges = [("G-BIG", "2024-01-01", "2024-01-05"),
+              ("G-SMALL-1", "2024-01-01", "2024-01-01"),
+              ("G-SMALL-2", "2024-01-01", "2024-01-01")]
+    results, finished, elapsed = asyncio.run(_fetch_all(ranges))
+
+    assert [result["pages"] for result in results] == [35, 7, 7]
+    assert quota_server.throttled_count == 0
+    # 49 pages at 45/s (after a burst of 5) take about a second; close to the ceiling, never above it
+    assert (49 - 5) / 45 * 0.95 <= elapsed and quota_server.request_count / elapsed > 0.75 * 45
+    assert max(finished["G-SMALL-1"], finished["G-SMALL-2"]) < 0.6 * finished["G-BIG"]
+
+class FakeClient:
+    def __init__(self):
+        self.started = []
+
+    async def start_workflow(self, workflow, *, args, id, task_queue):
+        self.started.append((workflow, args, id, task_queue))
+        return type("Handle", (), {"id": id})()
+
+def test_batch_entry_point_starts_one_parent_workflow():
+    client = FakeClient()
+    workflow_id = asyncio.run(start_batch_analysis(client, ["G-1", "G-2", "G-3"], days_back=3, max_concurrent=2))
+    (workflow, args, started_id, task_queue), = client.started
+    assert workflow == MultiPropertyAnalyticsWorkflow.run and started_id == workflow_id
+    assert workflow_id.startswith("button-analytics-batch-") and task_queue == TASK_QUEUE
+    assert args == [["G-1", "G-2", "G-3"], 3, 2]
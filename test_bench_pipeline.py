@@ -0,0 +1,45 @@
+"""
+Tests for the synthetic event generator and the benchmark suite
+"""
+
+import numpy as np
+
+import bench_pipeline
+from bench_metrics_engine import python_metric_rows
+from metrics_engine import compute_metric_rows
+from synthetic_events import VARIANT_CLICK_RATES, columns_to_events, generate_columns
+
+def test_generator_is_seeded():
+    first, second = generate_columns(5000, seed=3), generate_columns(5000, seed=3)
+    for name, column in first.items():
+        codes = column["codes"] if isinstance(column, dict) else column
+        other = second[name]["codes"] if isinstance(column, dict) else second[name]
+        assert np.array_equal(codes, other)
+    assert not np.array_equal(generate_columns(5000, seed=4)["page_variant"]["codes"],
+                              first["page_variant"]["codes"])
+
+def test_generator_distributions():
+    rows = compute_metric_rows({"columns": generate_columns(200_000, seed=1)})
+    ctr = {}
+    for row in rows:
+        clicks, hovers = ctr.get(row["page_variant"], (0, 0))
+        ctr[row["page_variant"]] = (clicks + row["total_clicks"], hovers + row["total_hovers"])
+    for variant, (clicks, hovers) in ctr.items():
+        assert abs(clicks / hovers - VARIANT_CLICK_RATES[variant]) < 0.02
+    assert all(0 < row["unique_visitors"] <= row["total_clicks"] + row["total_hovers"] for row in rows)
+    assert all(500 < row["hover_duration_p50"] < 1500 for row in rows)
+
+def test_columns_match_events():
+    columns = generate_columns(2000, seed=7)
+    assert compute_metric_rows({"columns": columns}) == python_metric_rows(columns_to_events(columns))
+
+async def test_suite_records_timings_and_compares():
+    results = await bench_pipeline.run_suite([1000], repeat=1, e2e_max_events=0)
+    activities = results["sizes"]["1000"]["activities"]
+    assert activities["process_button_metrics_s"] > 0 and activities["generate_button_insights_s"] > 0
+    assert "skipped" in results["sizes"]["1000"]["workflow"]
+
+    slower = {"sizes": {"1000": {"activities": {"process_button_metrics_s": activities["process_button_metrics_s"] * 2}}}}
+    rows = bench_pipeline.compare(slower, results)
+    assert [row["timing"] for row in rows] == ["1000/activities/process_button_metrics_s"]
+    assert rows[0]["regression"] and rows[0]["ratio"] == 2.0
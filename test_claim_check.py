@@ -0,0 +1,55 @@
+"""
+Tests for claim-check payload offloading
+"""
+
+import os
+
+import pytest
+from temporalio.api.common.v1 import Payload
+
+from claim_check import ENCODING, BlobStore, ClaimCheckCodec, claim_check_data_converter
+from synthetic_events import columns_to_events, generate_columns
+
+def raw_data(n_events):
+    return {"events": columns_to_events(generate_columns(n_events, seed=1)), "total_events": n_events}
+
+async def test_small_payloads_stay_inline(tmp_path):
+    codec = ClaimCheckCodec(BlobStore(str(tmp_path)), threshold_bytes=1024)
+    payload = Payload(metadata={"encoding": b"json/plain"}, data=b'{"status": "ok"}')
+    assert await codec.encode([payload]) == [payload]
+    assert not os.listdir(tmp_path)
+
+async def test_large_payloads_round_trip_through_blobs(tmp_path):
+    converter = claim_check_data_converter(BlobStore(str(tmp_path)), threshold_bytes=4096)
+    small, large = raw_data(5000), raw_data(50_000)
+
+    encoded = await converter.encode([small, large])
+    assert all(payload.metadata["encoding"] == ENCODING for payload in encoded)
+    # The history-side reference stays a few hundred bytes whatever the event volume
+    assert all(payload.ByteSize() < 256 for payload in encoded)
+    assert not encoded[1].data
+    assert await converter.decode(encoded, [dict, dict]) == [small, large]
+
+async def test_identical_payloads_share_one_blob(tmp_path):
+    store = BlobStore(str(tmp_path))
+    converter = claim_check_data_converter(store, threshold_bytes=4096)
+    first, second = await converter.encode([raw_data(5000), raw_data(5000)])
+    assert first == second
+    assert sum(len(files) for _, _, files in os.walk(tmp_path)) == 1
+
+async def test_missing_blob_fails_loudly(tmp_path):
+    codec = ClaimCheckCodec(BlobStore(str(tmp_path)), threshold_bytes=16)
+    [reference] = await codec.encode([Payload(metadata={"encoding": b"binary/plain"}, data=b"x" * 100)])
+    for root, _, files in os.walk(tmp_path):
+        for name in files:
+            os.unlink(os.path.join(root, name))
+    with pytest.raises(FileNotFoundError):
+        await codec.decode([reference])
+
+def test_prune_removes_old_blobs(tmp_path):
+    store = BlobStore(str(tmp_path))
+    old, fresh = store.put(b"old"), store.put(b"fresh")
+    os.utime(store.path(old), (0, 0))
+    assert store.prune(max_age_seconds=3600) == 1
+    assert store.get(fresh) == b"fresh"
+    assert not os.path.exists(store.path(old))
@@ -0,0 +1,61 @@
+"""
+Tests for running CPU-bound activity work in the process pool
+"""
+
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import cpu_pool
+from synthetic_events import generate_columns
+from temporal_workflows import generate_button_insights, process_button_metrics
+
+@pytest.fixture
+def process_pool():
+    cpu_pool.configure_cpu_pool(1)
+    yield
+    cpu_pool.shutdown_cpu_pool()
+
+def _pid():
+    return os.getpid()
+
+async def test_without_pool_work_runs_on_a_thread():
+    assert cpu_pool.cpu_pool_size() == 0
+    assert await cpu_pool.run_cpu(_pid) == os.getpid()
+
+async def test_activities_match_in_process_results(process_pool):
+    assert cpu_pool.cpu_pool_size() == 1
+    assert await cpu_pool.run_cpu(_pid) != os.getpid()
+
+    raw_data = {"columns": generate_columns(200_000, seed=4)}
+    pooled = await process_button_metrics(raw_data)
+    pooled_insights = await generate_button_insights(pooled)
+    cpu_pool.shutdown_cpu_pool()
+    assert await process_button_metrics(raw_data) == pooled
+    assert await generate_button_insights(pooled) == pooled_insights
+
+async def test_broken_pool_is_replaced_once(process_pool):
+    broken = cpu_pool._pool
+    results = await asyncio.gather(cpu_pool.run_cpu(os._exit, 1), cpu_pool.run_cpu(os._exit, 1),
+                                   return_exceptions=True)
+    assert all(isinstance(result, BrokenProcessPool) for result in results)
+    replacement = cpu_pool._pool
+    assert replacement is not broken and cpu_pool.cpu_pool_size() == 1
+    assert await cpu_pool.run_cpu(_pid) != os.getpid() and cpu_pool._pool is replacement
+
+async def test_event_loop_keeps_running_during_cpu_work(process_pool):
+    await cpu_pool.run_cpu(_pid)  # start the pool process before timing
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    await process_button_metrics({"columns": generate_columns(1_000_000, seed=4)})
+    task.cancel()
+    assert ticks >= 10
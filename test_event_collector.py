@@ -0,0 +1,97 @@
+"""
+Tests for the first-party /api/events collector and its event log
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import re
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+import app as app_module
+from bench_metrics_engine import python_metric_rows
+from event_log import EventLog, parse_event_batch, read_segment, segment_paths
+from metrics_engine import CLICK_EVENTS, HOVER_EVENTS
+from temporal_workflows import ButtonMetrics, fetch_collected_events, fetch_ga4_aggregates, process_button_metrics
+
+EVENTS = [
+    {"event_name": "button_hover_start", "button_type": "cta", "page_variant": "colors", "hover_duration": 900},
+    {"event_name": "cta_click", "button_type": "cta", "page_variant": "colors", "total_engagement": 1500},
+    {"event_name": "navigation_click", "button_type": "navigation", "page_variant": "sizes", "total_engagement": 300}
+]
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('EVENT_LOG_DIR', str(tmp_path))
+    monkeypatch.setattr(app_module, '_event_log', None)
+    with app_module.app.test_client() as client:
+        yield client
+    if app_module._event_log is not None:
+        app_module._event_log.close()
+
+def post(client, body, content_type='application/json'):
+    return client.post('/api/events', data=body, content_type=content_type)
+
+def test_collects_plain_and_gzipped_batches(client):
+    assert post(client, json.dumps({"events": EVENTS[:2]})).status_code == 204
+    assert post(client, gzip.compress(json.dumps(EVENTS[2:]).encode()), 'text/plain').status_code == 204
+
+    app_module._event_log.flush()
+    result = asyncio.run(ActivityEnvironment().run(
+        fetch_collected_events, app_module.GA4_MEASUREMENT_ID, "2000-01-01", "2100-01-01"
+    ))
+    assert result["total_events"] == 3
+    assert [e["event_name"] for e in result["events"]] == [e["event_name"] for e in EVENTS]
+    assert all("received_at" in e for e in result["events"])
+
+def test_rejects_invalid_batches(client):
+    assert post(client, b'not json').status_code == 400
+    assert post(client, json.dumps({"events": [{"button_type": "cta"}]})).status_code == 400
+    assert post(client, json.dumps({"events": "nope"})).status_code == 400
+    assert post(client, gzip.compress(b'{"events": [' + b' ' * (3 * 1024 * 1024) + b']}')).status_code == 400
+    assert post(client, b'[' + b' ' * (300 * 1024) + b']').status_code == 413
+
+def test_parse_drops_nested_values():
+    events = parse_event_batch(json.dumps([{"event_name": "cta_click", "extra": {"a": 1}, "x": "y" * 1000}]).encode())
+    assert events == [{"event_name": "cta_click", "x": "y" * 256}]
+
+def test_segments_roll_over_and_torn_lines_are_skipped(tmp_path):
+    log = EventLog(str(tmp_path), segment_max_bytes=200)
+    for _ in range(5):
+        log.append(EVENTS)
+    log.close()
+
+    paths = segment_paths(str(tmp_path), "2000-01-01", "2100-01-01")
+    assert len(paths) == 5
+    with open(paths[-1], 'ab') as f:
+        f.write(b'{"event_name": "cta_cl')
+    assert sum(len(list(read_segment(path))) for path in paths) == 15
+
+def test_collector_source_for_streaming_aggregates(client, monkeypatch):
+    for _ in range(4):
+        post(client, json.dumps({"events": EVENTS}))
+    app_module._event_log.flush()
+
+    monkeypatch.setenv('EVENT_SOURCE', 'collector')
+    result = asyncio.run(ActivityEnvironment().run(
+        fetch_ga4_aggregates, app_module.GA4_MEASUREMENT_ID, "2000-01-01", "2100-01-01"
+    ))
+    assert result["total_events"] == 12
+    metrics = asyncio.run(process_button_metrics(result))
+    assert metrics == [ButtonMetrics(**row) for row in python_metric_rows(EVENTS * 4)]
+
+def test_tracker_sends_every_event_the_metrics_consume(client):
+    with open(os.path.join(app_module.app.static_folder, 'js', 'main.js')) as f:
+        script = f.read()
+    sent = set(re.findall(r"(?:hover|click): '(\w+)'", script))
+    assert set(CLICK_EVENTS) | set(HOVER_EVENTS) <= sent
+    for field in ('hover_duration', 'total_engagement', 'button_type', 'visitor_id', 'session_id'):
+        assert field in script
+
+    # main.js is the only tracker on the page: no second scroll/click tracker, no automatic page_view
+    html = client.get('/').get_data(as_text=True)
+    assert "addEventListener('scroll'" not in html and "addEventListener('click'" not in html
+    assert 'send_page_view: false' in html
@@ -0,0 +1,120 @@
+"""
+Tests for the GA4 fetch cache: TTL for open days, LRU size bound, single flight
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+import fetch_cache
+from fetch_cache import FetchCache, get_fetch_cache
+from mock_ga4_server import MockGA4ReportingServer
+from temporal_workflows import fetch_ga4_aggregates
+
+SHAPE = {"dimensions": ["eventName"]}
+CLOSED_DAY = "2024-01-01"
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "fetch_cache.db")
+    monkeypatch.setenv('FETCH_CACHE_PATH', path)
+    return path
+
+def today():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+async def test_closed_days_are_permanent_and_open_days_expire(cache_path):
+    cache = FetchCache(cache_path, ttl_seconds=0.2)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {"total_events": len(calls)}
+
+    for _ in range(2):
+        assert await cache.get_or_fetch("G-1", CLOSED_DAY, CLOSED_DAY, SHAPE, fetch) == {"total_events": 1}
+    # Open days are reused within the TTL and refetched after it
+    assert await cache.get_or_fetch("G-1", CLOSED_DAY, today(), SHAPE, fetch) == {"total_events": 2}
+    assert await cache.get_or_fetch("G-1", CLOSED_DAY, today(), SHAPE, fetch) == {"total_events": 2}
+    await asyncio.sleep(0.3)
+    assert await cache.get_or_fetch("G-1", CLOSED_DAY, today(), SHAPE, fetch) == {"total_events": 3}
+    assert await cache.get_or_fetch("G-1", CLOSED_DAY, CLOSED_DAY, SHAPE, fetch) == {"total_events": 1}
+    # A different report shape is a different entry
+    assert await cache.get_or_fetch("G-1", CLOSED_DAY, CLOSED_DAY, {"dimensions": []}, fetch) == {"total_events": 4}
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"]) == (3, 4, 1)
+
+async def test_lru_eviction_keeps_cache_bounded(cache_path):
+    cache = FetchCache(cache_path, max_bytes=250)
+    value = {"payload": "x" * 80}
+
+    async def fetch():
+        return value
+
+    for day in ("2024-01-01", "2024-01-02"):
+        await cache.get_or_fetch("G-1", day, day, SHAPE, fetch)
+    # Touch the first entry so the second is the least recently used
+    await cache.get_or_fetch("G-1", "2024-01-01", "2024-01-01", SHAPE, fetch)
+    await cache.get_or_fetch("G-1", "2024-01-03", "2024-01-03", SHAPE, fetch)
+
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] <= 250 and stats["evictions"] == 1
+    assert stats["hits"] == 1
+    await cache.get_or_fetch("G-1", "2024-01-01", "2024-01-01", SHAPE, fetch)
+    assert cache.stats()["hits"] == 2
+
+async def test_concurrent_identical_fetches_share_one_call(cache_path, monkeypatch):
+    monkeypatch.setattr(fetch_cache, 'WAIT_CALLBACK_SECONDS', 0.05)
+    cache = FetchCache(cache_path)
+    calls, waits = [], []
+    release = asyncio.Event()
+
+    async def fetch():
+        calls.append(1)
+        await release.wait()
+        return {"total_events": 7}
+
+    tasks = [asyncio.create_task(cache.get_or_fetch("G-1", CLOSED_DAY, CLOSED_DAY, SHAPE, fetch,
+                                                    while_waiting=lambda: waits.append(1)))
+             for _ in range(5)]
+    await asyncio.sleep(0.2)
+    release.set()
+    assert await asyncio.gather(*tasks) == [{"total_events": 7}] * 5
+    assert len(calls) == 1
+    assert cache.stats()["shared"] == 4
+    # Waiters kept heartbeating while the shared fetch ran
+    assert waits
+
+async def test_failed_fetch_lets_waiters_retry(cache_path):
+    cache = FetchCache(cache_path)
+    attempts = []
+
+    async def fetch():
+        attempts.append(1)
+        await asyncio.sleep(0.05)
+        if len(attempts) == 1:
+            raise RuntimeError("quota exceeded")
+        return {"total_events": 1}
+
+    results = await asyncio.gather(
+        cache.get_or_fetch("G-1", CLOSED_DAY, CLOSED_DAY, SHAPE, fetch),
+        cache.get_or_fetch("G-1", CLOSED_DAY, CLOSED_DAY, SHAPE, fetch),
+        return_exceptions=True
+    )
+    # Either caller may win the flight; the other retries after it fails
+    failed = [result for result in results if isinstance(result, RuntimeError)]
+    assert len(failed) == 1 and {"total_events": 1} in results
+    assert len(attempts) == 2
+
+def test_activity_hits_cache_instead_of_reporting_api(cache_path, monkeypatch):
+    with MockGA4ReportingServer(events_per_day=300) as server:
+        monkeypatch.setenv('GA4_REPORTING_URL', server.url)
+        env = ActivityEnvironment()
+        first = asyncio.run(env.run(fetch_ga4_aggregates, "G-TEST", "2024-01-01", "2024-01-02"))
+        requests_after_first = server.request_count
+        second = asyncio.run(env.run(fetch_ga4_aggregates, "G-TEST", "2024-01-01", "2024-01-02"))
+        assert second == first and server.request_count == requests_after_first
+        assert get_fetch_cache().stats()["hits"] == 1
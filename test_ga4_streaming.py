@@ -0,0 +1,146 @@
+"""
+Tests for the streaming GA4 fetch against the local mock reporting server
+"""
+
+import asyncio
+import dataclasses
+import json
+import tracemalloc
+from datetime import datetime
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+from bench_metrics_engine import python_metric_rows
+from ga4_reporting import GA4ReportingClient, next_offset, page_to_columns
+from metrics_engine import compute_metric_rows
+from mock_ga4_server import MockGA4ReportingServer
+from temporal_workflows import (
+    ButtonMetrics,
+    fetch_ga4_aggregates,
+    merge_partition_results,
+    partition_date_range,
+    process_button_metrics
+)
+
+class SimulatedCrash(Exception):
+    pass
+
+@pytest.fixture
+def mock_server(monkeypatch, tmp_path):
+    monkeypatch.setenv('FETCH_CACHE_PATH', str(tmp_path / 'fetch_cache.db'))
+    with MockGA4ReportingServer(events_per_day=700) as server:
+        monkeypatch.setenv('GA4_REPORTING_URL', server.url)
+        monkeypatch.setenv('GA4_REPORT_PAGE_SIZE', '500')
+        yield server
+
+def run_activity(env, *args):
+    return asyncio.run(env.run(fetch_ga4_aggregates, *args))
+
+def test_streamed_aggregates_match_full_fetch(mock_server):
+    heartbeats = []
+    env = ActivityEnvironment()
+    env.on_heartbeat = lambda *details: heartbeats.append(dict(details[0]))
+
+    result = run_activity(env, "G-TEST", "2024-01-01", "2024-01-05")
+
+    events = mock_server.events("G-TEST", "2024-01-01", "2024-01-05")
+    assert result["total_events"] == len(events) == 3500
+    assert result["pages"] == mock_server.request_count == 7
+    assert len(heartbeats) == 7 and heartbeats[-1]["complete"]
+    assert [heartbeat["offset"] for heartbeat in heartbeats] == [500, 1000, 1500, 2000, 2500, 3000, 3000]
+
+    metrics = asyncio.run(process_button_metrics(result))
+    assert metrics == [ButtonMetrics(**row) for row in python_metric_rows(events)]
+
+def test_retry_resumes_from_heartbeated_cursor(mock_server):
+    heartbeats = []
+
+    def crash_after_three_pages(details):
+        heartbeats.append(json.loads(json.dumps(details)))
+        if len(heartbeats) == 3:
+            raise SimulatedCrash()
+
+    first_attempt = ActivityEnvironment()
+    first_attempt.on_heartbeat = crash_after_three_pages
+    with pytest.raises(SimulatedCrash):
+        run_activity(first_attempt, "G-TEST", "2024-01-01", "2024-01-05")
+    assert mock_server.request_count == 3
+
+    retry = ActivityEnvironment()
+    retry.info = dataclasses.replace(retry.info, attempt=2, heartbeat_details=[heartbeats[-1]])
+    result = run_activity(retry, "G-TEST", "2024-01-01", "2024-01-05")
+
+    # Only the four remaining pages are fetched on the retry
+    assert mock_server.request_count == 7
+    assert result["pages"] == 7
+
+    events = mock_server.events("G-TEST", "2024-01-01", "2024-01-05")
+    metrics = asyncio.run(process_button_metrics(result))
+    assert metrics == [ButtonMetrics(**row) for row in python_metric_rows(events)]
+
+def test_pages_by_offset_up_to_row_count(mock_server):
+    client = GA4ReportingClient(mock_server.url, page_size=300)
+    first = client.run_report_page("G-TEST", "2024-01-01", "2024-01-01")
+    last = client.run_report_page("G-TEST", "2024-01-01", "2024-01-01", offset=600)
+    assert (len(first["rows"]), first["rowCount"], next_offset(first, 0)) == (300, 700, 300)
+    assert (len(last["rows"]), next_offset(last, 600)) == (100, None)
+    events = mock_server.events("G-TEST", "2024-01-01", "2024-01-01")
+    assert page_to_columns(last)["session_id"] == [event["session_id"] for event in events[600:]]
+
+def _report_row(event_name, visitor, event_count, hover_sum, engagement_sum):
+    return {
+        "dimensionValues": [{"value": value} for value in (event_name, "cta", "colors", visitor, "(not set)")],
+        "metricValues": [{"value": str(value)} for value in (event_count, hover_sum, engagement_sum)]
+    }
+
+def test_rows_are_weighted_by_event_count():
+    page = {"rows": [_report_row("button_hover_start", "v1", 3, 1500, 0),
+                     _report_row("cta_click", "v1", 2, 0, 5000),
+                     _report_row("cta_click", "(not set)", 0, 0, 0)], "rowCount": 3}
+    columns = page_to_columns(page)
+    assert columns["event_name"] == ["button_hover_start", "cta_click"]
+    assert columns["event_count"] == [3, 2] and columns["hover_duration"] == [500, 0]
+    assert columns["visitor_id"] == ["v1"] * 2 and columns["session_id"] == [None] * 2
+    row, = compute_metric_rows({"columns": columns})
+    assert (row["total_hovers"], row["total_clicks"], row["avg_hover_duration"]) == (3, 2, 500)
+    assert row["unique_visitors"] == 1
+
+    # Same metrics and sketches as the events the rows stand for
+    expanded = {name: [value for value, count in zip(values, columns["event_count"]) for _ in range(count)]
+                for name, values in columns.items() if name != "event_count"}
+    assert row == compute_metric_rows({"columns": expanded})[0]
+
+def test_event_count_does_not_grow_memory():
+    page = {"rows": [_report_row("button_hover_start", "v1", 2_000_000, 1_000_000_000, 0)], "rowCount": 1}
+    tracemalloc.start()
+    try:
+        row, = compute_metric_rows({"columns": page_to_columns(page)})
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert row["total_hovers"] == 2_000_000 and row["avg_hover_duration"] == 500
+    assert sum(row["hover_duration_sketch"].values()) == 2_000_000
+    assert peak < 1_000_000
+
+def test_falls_back_to_mock_events_without_reporting_url(monkeypatch):
+    monkeypatch.delenv('GA4_REPORTING_URL', raising=False)
+    result = run_activity(ActivityEnvironment(), "G-TEST", "2024-01-01", "2024-01-08")
+    assert result["pages"] == 1
+    assert len(asyncio.run(process_button_metrics(result))) == 2
+
+def test_partition_date_range():
+    start, end = datetime(2024, 1, 1, 15, 30), datetime(2024, 1, 8, 15, 30)
+    assert partition_date_range(start, end) == [(f"2024-01-0{d}", f"2024-01-0{d}") for d in range(1, 9)]
+    assert partition_date_range(start, end, 3) == [
+        ("2024-01-01", "2024-01-03"), ("2024-01-04", "2024-01-06"), ("2024-01-07", "2024-01-08")
+    ]
+
+def test_merged_partitions_match_single_fetch(mock_server):
+    partitions = partition_date_range(datetime(2024, 1, 1), datetime(2024, 1, 5), 2)
+    results = [run_activity(ActivityEnvironment(), "G-TEST", start, end) for start, end in partitions]
+    merged = merge_partition_results(results)
+
+    whole = run_activity(ActivityEnvironment(), "G-TEST", "2024-01-01", "2024-01-05")
+    assert merged["total_events"] == whole["total_events"]
+    assert asyncio.run(process_button_metrics(merged)) == asyncio.run(process_button_metrics(whole))
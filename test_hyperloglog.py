@@ -0,0 +1,59 @@
+"""
+Tests for the HyperLogLog distinct visitor and session counts
+"""
+
+import numpy as np
+
+import hyperloglog
+from bench_metrics_engine import python_metric_rows
+from metrics_engine import compute_metric_rows, compute_partials, merge_partials
+
+def test_estimate_error_and_size():
+    for n in (10, 1_000, 100_000):
+        sketch = hyperloglog.sketch_from_values(f"visitor-{i}" for i in range(n))
+        assert abs(hyperloglog.estimate(sketch) - n) <= max(1, 0.05 * n)
+        assert len(sketch) <= 4 * hyperloglog.N_REGISTERS // 3 + 4
+    assert hyperloglog.estimate(hyperloglog.EMPTY) == 0
+
+def test_merge_is_union_and_ignores_duplicates():
+    first = hyperloglog.sketch_from_values(f"v{i}" for i in range(5000))
+    second = hyperloglog.sketch_from_values(f"v{i}" for i in range(2500, 7500))
+    assert hyperloglog.merge(first, second) == hyperloglog.sketch_from_values(f"v{i}" for i in range(7500))
+    assert hyperloglog.merge(first, first) == first
+    assert hyperloglog.merge(hyperloglog.EMPTY, first) == first
+
+def make_events(n, seed=5):
+    rng = np.random.default_rng(seed)
+    names = ['cta_click', 'button_hover_start', 'page_view']
+    return [
+        {
+            "event_name": names[rng.integers(3)],
+            "button_type": "cta",
+            "page_variant": ["colors", "sizes"][rng.integers(2)],
+            "visitor_id": f"v{rng.integers(n // 50)}",
+            "session_id": f"s{rng.integers(n // 20)}"
+        }
+        for _ in range(n)
+    ]
+
+def test_one_heavy_visitor_does_not_inflate_unique_counts():
+    events = make_events(5000)
+    events += [{"event_name": "cta_click", "button_type": "cta", "page_variant": "colors", "visitor_id": "fan"}] * 5000
+    rows = {row["button_id"]: row for row in compute_metric_rows({"events": events})}
+    assert rows == {row["button_id"]: row for row in python_metric_rows(events)}
+
+    colors = rows["cta_colors"]
+    assert colors["total_clicks"] > 5000
+    assert abs(colors["unique_visitors"] - 101) <= 5
+    assert colors["unique_clickers"] <= colors["unique_visitors"]
+    assert 0 < colors["visitor_click_through_rate"] <= 1
+
+def test_distinct_counts_survive_partial_merges():
+    events = make_events(20_000)
+    partials = compute_partials({"events": events[:7000]})
+    merge_partials(partials, compute_partials({"events": events[7000:]}))
+    assert compute_metric_rows({"partials": partials}) == compute_metric_rows({"events": events})
+
+def test_events_without_ids_count_nothing():
+    [row] = compute_metric_rows({"events": [{"event_name": "cta_click", "button_type": "cta", "page_variant": "x"}]})
+    assert (row["unique_visitors"], row["unique_sessions"], row["visitor_click_through_rate"]) == (0, 0, 0.0)
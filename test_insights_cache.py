@@ -0,0 +1,83 @@
+"""
+Tests for the cached /api/button-insights endpoint
+"""
+
+import gzip
+import json
+from email.utils import formatdate
+
+import pytest
+
+import app as app_module
+from insights_store import InsightsStore
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = InsightsStore(str(tmp_path / "insights.db"))
+    monkeypatch.setattr(app_module, '_insights_store', store)
+    app_module.insights_cache.invalidate()
+    yield store
+    app_module.insights_cache.invalidate()
+    store.close()
+
+@pytest.fixture
+def insights(store):
+    store.save_run(app_module.GA4_MEASUREMENT_ID, {"most_engaging_variant": "colors", "recommendations": []}, [])
+    return store
+
+@pytest.fixture
+def client():
+    with app_module.app.test_client() as client:
+        yield client
+
+def test_etag_and_conditional_get(client, insights):
+    response = client.get('/api/button-insights')
+    assert response.status_code == 200
+    assert response.json["most_engaging_variant"] == "colors"
+    assert response.headers['ETag'] and response.headers['Last-Modified']
+
+    revalidated = client.get('/api/button-insights', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+def test_last_modified_is_the_run_time(client, store):
+    store.save_run(app_module.GA4_MEASUREMENT_ID, {"most_engaging_variant": "colors"}, [], created_at=1700000000.0)
+    first = client.get('/api/button-insights')
+    # A rebuilt body (restart, other worker) claims the same time: when the run was saved
+    app_module.insights_cache.invalidate()
+    second = client.get('/api/button-insights')
+    assert first.headers['Last-Modified'] == second.headers['Last-Modified'] == formatdate(1700000000.0, usegmt=True)
+
+def test_gzip_body(client, insights):
+    response = client.get('/api/button-insights', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))["most_engaging_variant"] == "colors"
+    assert client.get('/api/button-insights', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    refused = client.get('/api/button-insights', headers={'Accept-Encoding': 'gzip;q=0, br'})
+    assert 'Content-Encoding' not in refused.headers and refused.json["most_engaging_variant"] == "colors"
+
+def test_reloads_when_a_new_run_is_saved(client, insights):
+    first = client.get('/api/button-insights')
+    insights.save_run(app_module.GA4_MEASUREMENT_ID, {"most_engaging_variant": "sizes", "recommendations": ["x"]}, [])
+
+    second = client.get('/api/button-insights', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.json["most_engaging_variant"] == "sizes"
+    assert second.headers['ETag'] != first.headers['ETag']
+
+def test_body_is_cached_between_requests(insights):
+    cache = app_module.insights_cache
+    assert cache.get() is cache.get()
+    cache.invalidate()
+    assert cache.get() is not None
+
+def test_empty_store_is_404(client, store):
+    assert client.get('/api/button-insights').status_code == 404
+
+def test_other_properties_runs_are_not_served(client, insights):
+    first = client.get('/api/button-insights')
+    insights.save_run("G-OTHER", {"most_engaging_variant": "sizes", "recommendations": []}, [])
+    second = client.get('/api/button-insights', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+    app_module.insights_cache.invalidate()
+    assert client.get('/api/button-insights').json["most_engaging_variant"] == "colors"
@@ -0,0 +1,112 @@
+"""
+Tests for the historical insights store and its range query API
+"""
+
+import asyncio
+import json
+import sqlite3
+from dataclasses import asdict
+from datetime import datetime, timezone
+
+import pytest
+
+import app as app_module
+from insights_store import METRIC_FIELDS, InsightsStore, parse_time
+from temporal_workflows import ButtonInsights, ButtonMetrics, save_insights_to_database
+
+def metric(button_id, page_variant, clicks):
+    row = asdict(ButtonMetrics(
+        button_id=button_id, button_type=button_id.split("_")[0], page_variant=page_variant,
+        total_clicks=clicks, total_hovers=2, avg_hover_duration=500.0, click_through_rate=0.5,
+        engagement_score=10.0, conversion_rate=0.1, hover_duration_p90=505.0, unique_visitors=2
+    ))
+    return {field: row[field] for field in METRIC_FIELDS}
+
+def day(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = InsightsStore(str(tmp_path / "insights.db"))
+    monkeypatch.setattr(app_module, '_insights_store', store)
+    for i, date in enumerate(["2026-01-05", "2026-02-10", "2026-03-15"]):
+        store.save_run("G-A", {"most_engaging_variant": "colors", "run": i},
+                       [metric("cta_colors", "colors", i), metric("cta_sizes", "sizes", 10 + i)],
+                       created_at=day(f"{date}T12:00:00"))
+    store.save_run("G-B", {"most_engaging_variant": "sizes"}, [metric("cta_sizes", "sizes", 99)],
+                   created_at=day("2026-02-11T00:00:00"))
+    yield store
+    store.close()
+
+def test_wal_mode_and_indexes(store):
+    conn = sqlite3.connect(store.path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT run_id FROM run_metrics WHERE page_variant = 'sizes' AND created_at >= 0"
+    ))
+    assert "idx_metrics_variant_created" in plan
+
+def test_range_and_property_filters(store):
+    runs = store.query_runs(start=day("2026-02-01"), end=parse_time("2026-03-15", end_of_day=True))
+    assert [run["insights"].get("run") for run in runs] == [1, None, 2]
+    assert [run["property_id"] for run in store.query_runs(property_id="G-B")] == ["G-B"]
+    assert len(store.query_runs(limit=2)) == 2
+
+def test_variant_filter_returns_only_that_variants_metrics(store):
+    runs = store.query_runs(variant="colors")
+    assert [run["insights"]["run"] for run in runs] == [0, 1, 2]
+    assert all([m["page_variant"] for m in run["metrics"]] == ["colors"] for run in runs)
+    assert store.query_runs(variant="missing") == []
+
+def test_latest(store):
+    assert store.latest() == {"most_engaging_variant": "sizes"}
+    assert store.latest("G-A")["run"] == 2
+    assert store.latest("G-C") is None
+
+def test_range_query_endpoint(store):
+    with app_module.app.test_client() as client:
+        response = client.get('/api/button-insights?from=2026-02-01&to=2026-02-11&variant=sizes&property=G-A')
+        assert response.status_code == 200
+        [run] = response.json["runs"]
+        assert run["metrics"] == [metric("cta_sizes", "sizes", 11)]
+        assert run["created_at"].startswith("2026-02-10T12:00:00")
+        assert client.get('/api/button-insights?from=yesterday').status_code == 400
+
+def test_save_activity_keeps_every_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GA4_MEASUREMENT_ID", "G-A")
+    insights = ButtonInsights("cta_colors", "cta_sizes", "colors", ["Keep colors"], {"total_buttons_analyzed": 1})
+    for _ in range(2):
+        asyncio.run(save_insights_to_database(insights, [ButtonMetrics(**metric("cta_colors", "colors", 3))], "G-A"))
+
+    store = InsightsStore()
+    runs = store.query_runs(property_id="G-A")
+    store.close()
+    assert len(runs) == 2 and runs[0]["metrics"] == [metric("cta_colors", "colors", 3)]
+    with open(tmp_path / "button_insights.json") as f:
+        assert json.load(f)["recommendations"] == ["Keep colors"]
+
+def test_backfilled_runs_are_history_not_latest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GA4_MEASUREMENT_ID", "G-A")
+    insights = ButtonInsights("cta_colors", "cta_sizes", "colors", ["Keep colors"], {"total_buttons_analyzed": 1})
+    asyncio.run(save_insights_to_database(insights, [], "G-A"))
+    backfilled = ButtonInsights("cta_sizes", "cta_colors", "sizes", ["Old advice"], {"total_buttons_analyzed": 1})
+    asyncio.run(save_insights_to_database(backfilled, [], "G-A", "2024-01-03"))
+
+    store = InsightsStore()
+    latest, runs = store.latest("G-A"), store.query_runs(property_id="G-A")
+    store.close()
+    assert latest["recommendations"] == ["Keep colors"]
+    assert runs[0]["created_at"] == "2024-01-03T00:00:00+00:00" and runs[0]["insights"]["timestamp"].startswith("2024-01-03")
+    with open(tmp_path / "button_insights.json") as f:
+        assert json.load(f)["recommendations"] == ["Keep colors"]
+
+def test_other_properties_get_their_own_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GA4_MEASUREMENT_ID", "G-SITE")
+    insights = ButtonInsights("cta_colors", "cta_sizes", "colors", ["Keep colors"], {"total_buttons_analyzed": 1})
+    asyncio.run(save_insights_to_database(insights, [], "G-SHOP1"))
+    assert not (tmp_path / "button_insights.json").exists()
+    with open(tmp_path / "button_insights-G-SHOP1.json") as f:
+        assert json.load(f)["recommendations"] == ["Keep colors"]
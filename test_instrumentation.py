@@ -0,0 +1,105 @@
+"""
+Tests for the metrics registry, activity timing and the /metrics endpoints
+"""
+
+import asyncio
+import socket
+import urllib.request
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+from temporalio.worker import ActivityInboundInterceptor, ExecuteActivityInput
+
+import app as app_module
+import instrumentation
+from data_converter import create_data_converter
+from insights_store import InsightsStore
+from instrumentation import Counter, Histogram, Registry
+
+def test_histogram_exposition_is_cumulative():
+    registry = Registry()
+    latency = registry.register(Histogram('demo_seconds', 'Demo latency', ('route',), buckets=(0.1, 1)))
+    requests = registry.register(Counter('demo_total', 'Demo requests', ('route',)))
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, route='/a')
+    requests.inc(route='/a "quoted"')
+
+    lines = registry.render().splitlines()
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_sum{route="/a"} 5.55' in lines and 'demo_seconds_count{route="/a"} 3' in lines
+    assert 'demo_total{route="/a \\"quoted\\""} 1' in lines
+    assert '# TYPE demo_seconds histogram' in lines
+
+class FailingNext(ActivityInboundInterceptor):
+    def __init__(self):
+        pass
+
+    async def execute_activity(self, input):
+        raise RuntimeError("upstream down")
+
+class PassingNext(FailingNext):
+    async def execute_activity(self, input):
+        return "ok"
+
+def test_activity_interceptor_records_latency_and_status():
+    before_ok = instrumentation.ACTIVITY_DURATION.count(activity='unknown', status='ok')
+    before_error = instrumentation.ACTIVITY_DURATION.count(activity='unknown', status='error')
+    execute_input = ExecuteActivityInput(fn=lambda: None, args=[], executor=None, headers={})
+    interceptor = instrumentation.ActivityMetricsInterceptor()
+
+    async def run(next_interceptor):
+        return await interceptor.intercept_activity(next_interceptor).execute_activity(execute_input)
+
+    env = ActivityEnvironment()
+    assert asyncio.run(env.run(run, PassingNext())) == "ok"
+    with pytest.raises(RuntimeError):
+        asyncio.run(env.run(run, FailingNext()))
+    assert instrumentation.ACTIVITY_DURATION.count(activity='unknown', status='ok') == before_ok + 1
+    assert instrumentation.ACTIVITY_DURATION.count(activity='unknown', status='error') == before_error + 1
+
+async def test_payload_sizes_are_recorded(tmp_path):
+    from claim_check import BlobStore
+    before = instrumentation.PAYLOAD_BYTES.count(stage='stored')
+    converter = create_data_converter(BlobStore(str(tmp_path)))
+    await converter.encode([{"clicks": list(range(1000))}])
+    assert instrumentation.PAYLOAD_BYTES.count(stage='converted') >= 1
+    assert instrumentation.PAYLOAD_BYTES.count(stage='stored') == before + 1
+
+def test_flask_metrics_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setenv('FETCH_CACHE_PATH', str(tmp_path / 'fetch_cache.db'))
+    store = InsightsStore(str(tmp_path / "insights.db"))
+    monkeypatch.setattr(app_module, '_insights_store', store)
+    app_module.insights_cache.invalidate()
+    store.save_run(app_module.GA4_MEASUREMENT_ID, {"most_engaging_variant": "colors"}, [])
+    try:
+        with app_module.app.test_client() as client:
+            for _ in range(2):
+                assert client.get('/api/button-insights').status_code == 200
+            response = client.get('/metrics')
+    finally:
+        app_module.insights_cache.invalidate()
+        store.close()
+
+    assert response.status_code == 200 and response.content_type.startswith('text/plain')
+    body = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{route="/api/button-insights",method="GET",status="200"}' in body
+    assert 'cache_requests_total{cache="insights",result="hit"}' in body
+    assert 'ga4_fetch_cache_requests_total{result="hits"} 0' in body
+
+def test_worker_metrics_server(monkeypatch):
+    monkeypatch.setenv('WORKER_METRICS_PORT', '0')
+    assert instrumentation.start_metrics_server() is None
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = instrumentation.start_metrics_server(port, host='127.0.0.1')
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+            body = response.read().decode()
+        assert '# TYPE button_analytics_activity_duration_seconds histogram' in body
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,104 @@
+"""
+Tests for the live sliding-window aggregates and their SSE stream
+"""
+
+import json
+import threading
+
+import pytest
+
+import app as app_module
+from live_aggregates import LiveAggregator
+
+EVENTS = [
+    {"event_name": "button_hover_start", "button_type": "cta", "page_variant": "colors", "hover_duration": 900},
+    {"event_name": "cta_click", "button_type": "cta", "page_variant": "colors", "total_engagement": 1500},
+    {"event_name": "page_view", "page_variant": "colors"}
+]
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+def _rows(aggregator, window):
+    return json.loads(aggregator.snapshot_json())["windows"][window]
+
+def test_counts_slide_out_of_each_window():
+    clock = Clock()
+    aggregator = LiveAggregator(clock=clock)
+    assert aggregator.record(EVENTS) == 2
+    row, = _rows(aggregator, '5m')
+    assert (row['clicks'], row['hovers'], row['click_through_rate']) == (1, 1, 1.0)
+    assert (row['avg_hover_duration'], row['avg_engagement']) == (900, 1500)
+
+    clock.now += 200
+    aggregator.record(EVENTS[:1])
+    assert _rows(aggregator, '5m')[0]['hovers'] == 2
+
+    clock.now += 150
+    assert _rows(aggregator, '5m')[0]['hovers'] == 1
+    assert _rows(aggregator, '1h')[0]['hovers'] == 2
+
+    clock.now += 86400
+    assert all(not rows for rows in json.loads(aggregator.snapshot_json())["windows"].values())
+
+def test_ignores_batches_without_button_events():
+    aggregator = LiveAggregator()
+    assert aggregator.record(EVENTS[2:]) == 0
+    assert aggregator.version == 0
+
+def test_stream_coalesces_bursts():
+    aggregator = LiveAggregator()
+    stream = aggregator.stream(push_interval=0.2, keepalive=0.2)
+    assert json.loads(next(stream).split("data: ", 1)[1])["version"] == 0
+
+    # Events arriving while the stream waits out the push interval go out as one message
+    burst = threading.Timer(0.05, lambda: [aggregator.record(EVENTS) for _ in range(10)])
+    burst.start()
+    message = next(stream)
+    burst.join()
+    snapshot = json.loads(message.split("data: ", 1)[1])
+    assert message.startswith("event: aggregates") and snapshot["version"] == 10
+    assert snapshot["windows"]["5m"][0]["clicks"] == 10
+    assert next(stream) == ": keepalive\n\n"
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('EVENT_LOG_DIR', str(tmp_path))
+    monkeypatch.setattr(app_module, '_event_log', None)
+    monkeypatch.setattr(app_module, 'live_aggregates', LiveAggregator())
+    with app_module.app.test_client() as client:
+        yield client
+    if app_module._event_log is not None:
+        app_module._event_log.close()
+
+def test_collected_events_show_up_live(client):
+    assert client.post('/api/events', json={"events": EVENTS}).status_code == 204
+    row, = client.get('/api/live').get_json()["windows"]["24h"]
+    assert (row['button_type'], row['page_variant'], row['clicks']) == ('cta', 'colors', 1)
+
+    response = client.get('/api/live/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream' and response.headers['Cache-Control'] == 'no-cache'
+    first = next(response.response)
+    response.close()
+    assert json.loads(first.split(b"data: ", 1)[1])["windows"]["5m"][0]["hovers"] == 1
+
+def test_concurrent_streams_are_capped(monkeypatch):
+    monkeypatch.setattr(app_module, 'live_aggregates', LiveAggregator(max_streams=1))
+    # Separate clients: each streaming response keeps its own request context open
+    first = app_module.app.test_client().get('/api/live/stream', buffered=False)
+    next(first.response)
+    refused = app_module.app.test_client().get('/api/live/stream')
+    assert refused.status_code == 503 and refused.headers['Retry-After']
+    # A disconnected client gives its slot back
+    first.close()
+    again = app_module.app.test_client().get('/api/live/stream', buffered=False)
+    assert again.status_code == 200
+    again.close()
+
+def test_dashboard_renders_live_values_as_text(client):
+    html = client.get('/analytics').get_data(as_text=True)
+    assert 'liveRows.innerHTML' not in html and 'td.textContent = text' in html
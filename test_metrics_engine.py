@@ -0,0 +1,79 @@
+"""
+Tests for the columnar metrics engine
+Checks that process_button_metrics matches the original per-event implementation
+"""
+
+import asyncio
+import random
+
+from bench_metrics_engine import python_metric_rows
+from metrics_engine import compute_metric_rows, events_to_columns
+from temporal_workflows import ButtonMetrics, fetch_ga4_data, process_button_metrics
+
+EVENT_NAMES = [
+    'cta_click', 'navigation_click', 'feature_click',
+    'button_hover_start', 'nav_hover_start', 'feature_hover_start',
+    'button_hover_end', 'page_view', None
+]
+
+def random_events(n_events, seed=7):
+    rng = random.Random(seed)
+    events = []
+    for _ in range(n_events):
+        event = {
+            "event_name": rng.choice(EVENT_NAMES),
+            "button_type": rng.choice(['cta', 'navigation', 'feature']),
+            "page_variant": rng.choice(['original', 'colors', 'sizes', 'spacing', 'typography']),
+            "hover_duration": rng.choice([rng.randint(0, 5000), rng.uniform(0, 5000)]),
+            "total_engagement": rng.randint(0, 10000)
+        }
+        # Drop fields at random to exercise the defaults
+        for field in list(event):
+            if rng.random() < 0.05:
+                del event[field]
+        events.append(event)
+    return events
+
+def encode(events):
+    """Columnar, dictionary-encoded form of the same events"""
+    columns = {}
+    for name, default in (('event_name', None), ('button_type', 'unknown'), ('page_variant', 'unknown')):
+        values = [e.get(name, default) for e in events]
+        index = {value: code for code, value in enumerate(dict.fromkeys(values))}
+        columns[name] = {"values": list(index), "codes": [index[value] for value in values]}
+    columns['hover_duration'] = [e.get('hover_duration', 0) for e in events]
+    columns['total_engagement'] = [e.get('total_engagement', 0) for e in events]
+    return columns
+
+def test_matches_reference_on_random_events():
+    events = random_events(5000)
+    assert compute_metric_rows({"events": events}) == python_metric_rows(events)
+
+def test_columnar_input_matches_row_input():
+    events = random_events(5000, seed=11)
+    assert compute_metric_rows({"columns": encode(events)}) == python_metric_rows(events)
+
+def test_event_dicts_convert_to_the_same_columns():
+    events = random_events(5000, seed=12) + [{"event_name": "cta_click"}, {"event_name": "nav_hover_start"}]
+    assert compute_metric_rows({"columns": events_to_columns(events)}) == python_metric_rows(events)
+
+def test_group_order_and_key_folding():
+    events = [
+        {"event_name": "page_view", "button_type": "a_b", "page_variant": "c"},
+        {"event_name": "cta_click", "button_type": "a", "page_variant": "b_c"},
+        {"event_name": "button_hover_start", "button_type": "z", "page_variant": "original", "hover_duration": 10},
+        {"event_name": "cta_click", "button_type": "a_b", "page_variant": "c"},
+    ]
+    rows = compute_metric_rows({"events": events})
+    assert rows == python_metric_rows(events)
+    assert [row["button_id"] for row in rows] == ["a_b_c", "z_original"]
+
+def test_empty_input():
+    assert compute_metric_rows({"events": []}) == []
+    assert compute_metric_rows({"columns": {}}) == []
+
+def test_process_button_metrics_on_mock_data():
+    raw_data = asyncio.run(fetch_ga4_data("G-TEST", "2024-01-01", "2024-01-08"))
+    metrics = asyncio.run(process_button_metrics(raw_data))
+    assert metrics == [ButtonMetrics(**row) for row in python_metric_rows(raw_data["events"])]
+    assert all(type(m.total_clicks) is int for m in metrics)
@@ -0,0 +1,66 @@
+"""
+Tests for payload compression and the compact dataclass converter
+"""
+
+import os
+from typing import List
+
+import pytest
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import DataConverter
+
+import payload_compression
+from claim_check import BlobStore
+from data_converter import create_data_converter
+from metrics_engine import compute_metric_rows
+from payload_compression import ZLIB_ENCODING, CompressionCodec
+from synthetic_events import generate_columns
+from temporal_workflows import ButtonInsights, ButtonMetrics
+
+@pytest.fixture(scope="module")
+def metrics():
+    return [ButtonMetrics(**row) for row in compute_metric_rows({"columns": generate_columns(100_000, seed=2)})]
+
+async def test_zlib_round_trip():
+    codec = CompressionCodec(use_zstd=False)
+    payload = Payload(metadata={"encoding": b"json/plain"}, data=b'{"clicks": 1}' * 200)
+    [encoded] = await codec.encode([payload])
+    assert encoded.metadata["encoding"] == ZLIB_ENCODING and encoded.ByteSize() < payload.ByteSize() / 10
+    assert await codec.decode([encoded]) == [payload]
+
+async def test_zstd_round_trip():
+    pytest.importorskip("zstandard")
+    codec = CompressionCodec()
+    payload = Payload(metadata={"encoding": b"json/plain"}, data=b'{"clicks": 1}' * 200)
+    [encoded] = await codec.encode([payload])
+    assert encoded.metadata["encoding"] == payload_compression.ZSTD_ENCODING
+    # A zlib-only worker still reads zstd payloads as long as the package is installed
+    assert await CompressionCodec(use_zstd=False).decode([encoded]) == [payload]
+
+async def test_small_and_incompressible_payloads_pass_through():
+    codec = CompressionCodec(use_zstd=False)
+    small = Payload(metadata={"encoding": b"json/plain"}, data=b'1')
+    noise = Payload(metadata={"encoding": b"binary/plain"}, data=os.urandom(4096))
+    assert await codec.encode([small, noise]) == [small, noise]
+
+async def test_metrics_round_trip_and_shrink(metrics, tmp_path):
+    converter = create_data_converter(BlobStore(str(tmp_path)), threshold_bytes=2 ** 62)
+    [payload] = await converter.encode([metrics])
+    [default_payload] = await DataConverter.default.encode([metrics])
+    assert payload.ByteSize() * 4 < default_payload.ByteSize()
+    assert await converter.decode([payload], [List[ButtonMetrics]]) == [metrics]
+
+async def test_compact_converter_without_type_hint(metrics):
+    converter = DataConverter(payload_converter_class=create_data_converter().payload_converter_class)
+    [payload] = await converter.encode([metrics[:2]])
+    assert payload.metadata["encoding"] == b"json/dataclass-columns"
+    [decoded] = await converter.decode([payload])
+    assert decoded[0]["button_id"] == metrics[0].button_id
+    assert decoded[1]["hover_duration_sketch"] == metrics[1].hover_duration_sketch
+
+async def test_other_values_use_default_encodings(tmp_path):
+    converter = create_data_converter(BlobStore(str(tmp_path)))
+    insights = ButtonInsights("a", "b", "colors", ["tip"], {"total_buttons_analyzed": 2})
+    values = [insights, [], ["x", "y"], {"status": "ok"}]
+    payloads = await converter.encode(values)
+    assert await converter.decode(payloads, [ButtonInsights, list, List[str], dict]) == values
@@ -0,0 +1,104 @@
+"""
+Tests for on-demand activity profiling
+"""
+
+import dataclasses
+import json
+import pstats
+
+import pytest
+from temporalio.api.common.v1 import Payload
+from temporalio.testing import ActivityEnvironment
+from temporalio.worker import ActivityInboundInterceptor, ExecuteActivityInput
+
+import app as app_module
+import cpu_pool
+from profiling import PROFILE_HEADER, ProfilingInterceptor, current_profile, requested_activities
+from synthetic_events import generate_columns
+from temporal_workflows import process_button_metrics
+from workflow_trigger import profile_memo, start_button_analysis
+
+class CallActivity(ActivityInboundInterceptor):
+    def __init__(self):
+        pass
+
+    async def execute_activity(self, input):
+        return await input.fn(*input.args)
+
+def run_intercepted(interceptor, activity_type, fn, args, headers=None):
+    env = ActivityEnvironment()
+    env.info = dataclasses.replace(env.info, activity_type=activity_type, workflow_id="button-analytics-wf/1")
+    execute_input = ExecuteActivityInput(fn=fn, args=args, executor=None, headers=headers or {})
+
+    async def run():
+        return await interceptor.intercept_activity(CallActivity()).execute_activity(execute_input)
+
+    return env.run(run)
+
+@pytest.fixture
+def raw_data():
+    return {"columns": generate_columns(50_000, seed=9)}
+
+def test_requested_activities():
+    assert requested_activities(True) == ["process_button_metrics", "generate_button_insights"]
+    assert requested_activities(" process_button_metrics, all") == ["process_button_metrics", "all"]
+    assert requested_activities(None) == [] and requested_activities(False) == []
+    assert profile_memo(None) is None
+    assert profile_memo(["fetch_ga4_aggregates"]) == {"profile_activities": ["fetch_ga4_aggregates"]}
+
+async def test_worker_setting_profiles_selected_activity(tmp_path, raw_data):
+    interceptor = ProfilingInterceptor(["process_button_metrics"], str(tmp_path))
+    metrics = await run_intercepted(interceptor, "process_button_metrics", process_button_metrics, [raw_data])
+    assert metrics == await process_button_metrics(raw_data)
+    assert current_profile() is None
+
+    base = tmp_path / "button-analytics-wf_1" / "process_button_metrics"
+    summary = json.loads((base.with_suffix('.json')).read_text())
+    assert summary["cpu_calls"] == 1 and summary["wall_seconds"] > 0
+    assert summary["worker_peak_memory_bytes"] > 0
+    assert any("compute_metric_rows" in row["function"] for row in summary["top_functions"])
+    stats = pstats.Stats(str(base.with_suffix('.pstats')))
+    assert any(name == "compute_metric_rows" for _, _, name in stats.stats)
+    for line in base.with_suffix('.collapsed').read_text().splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0 and ':' in stack
+
+async def test_unselected_activity_is_not_profiled(tmp_path, raw_data):
+    interceptor = ProfilingInterceptor([], str(tmp_path))
+    await run_intercepted(interceptor, "process_button_metrics", process_button_metrics, [raw_data])
+    assert not list(tmp_path.iterdir())
+
+async def test_header_from_workflow_memo_selects_activity(tmp_path, raw_data):
+    interceptor = ProfilingInterceptor([], str(tmp_path))
+    header = Payload(metadata={"encoding": b"json/plain"}, data=json.dumps(["process_button_metrics"]).encode())
+    await run_intercepted(interceptor, "process_button_metrics", process_button_metrics, [raw_data],
+                          headers={PROFILE_HEADER: header})
+    assert (tmp_path / "button-analytics-wf_1" / "process_button_metrics.json").exists()
+
+async def test_profiles_cpu_work_in_pool_process(tmp_path, raw_data):
+    cpu_pool.configure_cpu_pool(1)
+    try:
+        interceptor = ProfilingInterceptor(["all"], str(tmp_path))
+        await run_intercepted(interceptor, "process_button_metrics", process_button_metrics, [raw_data])
+    finally:
+        cpu_pool.shutdown_cpu_pool()
+    summary = json.loads((tmp_path / "button-analytics-wf_1" / "process_button_metrics.json").read_text())
+    # Peak memory of the CPU work is traced in the pool process itself
+    assert summary["cpu_calls"] == 1 and summary["cpu_peak_memory_bytes"] > 0
+    assert any("compute_metric_rows" in row["function"] for row in summary["top_functions"])
+
+class FakeRunner:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, fn, *args):
+        self.calls.append((fn, args))
+        return "button-analytics-1"
+
+def test_analyze_endpoint_passes_profile_request(monkeypatch):
+    runner = FakeRunner()
+    monkeypatch.setattr(app_module, 'get_temporal_runner', lambda: runner)
+    with app_module.app.test_client() as client:
+        response = client.post('/api/analyze-buttons', json={"days_back": 3, "profile": True})
+    assert response.status_code == 202
+    assert runner.calls == [(start_button_analysis, (app_module.GA4_MEASUREMENT_ID, 3, True))]
@@ -0,0 +1,45 @@
+"""
+Tests for the mergeable duration quantile sketches
+"""
+
+import numpy as np
+
+from metrics_engine import compute_metric_rows, compute_partials, merge_partials
+from quantile_sketch import (
+    N_BUCKETS,
+    RELATIVE_ACCURACY,
+    merge_sketch,
+    sketch_from_values,
+    sketch_quantiles
+)
+
+def test_quantiles_within_relative_accuracy():
+    values = np.random.default_rng(7).lognormal(mean=7, sigma=1.5, size=100_000)
+    estimates = sketch_quantiles(sketch_from_values(values), (0.5, 0.9, 0.99))
+    ordered = np.sort(values)
+    for q, estimate in zip((0.5, 0.9, 0.99), estimates):
+        exact = ordered[int(q * (len(values) - 1))]
+        assert abs(estimate - exact) <= RELATIVE_ACCURACY * exact
+
+def test_size_is_bounded_and_merge_matches_single_pass():
+    rng = np.random.default_rng(3)
+    first, second = rng.exponential(800, 50_000), rng.exponential(5000, 50_000)
+    merged = merge_sketch(sketch_from_values(first), sketch_from_values(second))
+    assert merged == sketch_from_values(np.concatenate([first, second]))
+    assert len(merged) <= N_BUCKETS
+
+def test_zero_and_empty():
+    assert sketch_quantiles({}) == [0.0, 0.0, 0.0]
+    assert sketch_quantiles(sketch_from_values([0, 0, 0.5])) == [0.0, 0.0, 0.0]
+
+def test_percentiles_survive_partial_merges():
+    events = [
+        {"event_name": "button_hover_start", "button_type": "cta", "page_variant": "colors", "hover_duration": d}
+        for d in range(100, 10_100, 100)
+    ]
+    partials = compute_partials({"events": events[:30]})
+    merge_partials(partials, compute_partials({"events": events[30:]}))
+    [row] = compute_metric_rows({"partials": partials})
+    assert row == compute_metric_rows({"events": events})[0]
+    assert abs(row["hover_duration_p50"] - 5000) <= 5000 * RELATIVE_ACCURACY + 100
+    assert abs(row["hover_duration_p99"] - 9900) <= 9900 * RELATIVE_ACCURACY + 100
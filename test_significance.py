@@ -0,0 +1,78 @@
+"""
+Tests for the vectorized A/B significance engine
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from metrics_engine import compute_metric_rows
+from significance import compare_variants
+
+def make_events(n, lifts, seed=11):
+    """Hover/click events where variant v clicks with probability lifts[v] per hover"""
+    rng = np.random.default_rng(seed)
+    events = []
+    for variant, (ctr, hover_ms) in lifts.items():
+        for _ in range(n):
+            events.append({"event_name": "button_hover_start", "button_type": "cta", "page_variant": variant,
+                           "hover_duration": float(rng.exponential(hover_ms))})
+            if rng.random() < ctr:
+                events.append({"event_name": "cta_click", "button_type": "cta", "page_variant": variant,
+                               "total_engagement": float(rng.exponential(2 * hover_ms))})
+    return events
+
+def test_detects_a_real_lift_and_not_a_null_one():
+    rows = compute_metric_rows({"events": make_events(3000, {
+        "original": (0.10, 800), "colors": (0.16, 800), "sizes": (0.10, 1600)
+    })})
+    cta = compare_variants(rows)["button_types"]["cta"]
+
+    assert cta["control"] == "original" and cta["variants"] == ["original", "colors", "sizes"]
+    assert cta["ctr"]["colors"]["prob_beats_control"] > 0.99
+    assert 0.02 < cta["ctr"]["sizes"]["prob_beats_control"] < 0.98
+    assert cta["best_ctr_variant"] == "colors"
+    assert abs(cta["ctr_prob_beats"]["colors"]["sizes"] + cta["ctr_prob_beats"]["sizes"]["colors"] - 1) < 1e-9
+
+    sizes_hover = cta["hover_duration"]["sizes"]["diff_vs_control"]
+    assert sizes_hover["ci_low"] > 0 and sizes_hover["prob_greater"] > 0.99
+    colors_hover = cta["hover_duration"]["colors"]["diff_vs_control"]
+    assert colors_hover["ci_low"] < 0 < colors_hover["ci_high"]
+    assert cta["hover_duration"]["original"]["ci_low"] < 800 < cta["hover_duration"]["original"]["ci_high"]
+
+def test_missing_cells_and_control():
+    rows = compute_metric_rows({"events": make_events(200, {"colors": (0.2, 500), "sizes": (0.3, 500)})})
+    result = compare_variants(rows)["button_types"]["cta"]
+    assert result["control"] is None
+    assert result["ctr"]["colors"]["prob_beats_control"] is None
+    assert result["hover_duration"]["sizes"]["diff_vs_control"] is None
+    assert compare_variants([]) == {}
+
+def test_all_variants_and_types_in_under_a_second():
+    rng = np.random.default_rng(2)
+    variants = ["original", "colors", "sizes", "spacing", "typography"]
+    events = [
+        {"event_name": ["cta_click", "navigation_click", "feature_click", "button_hover_start"][rng.integers(4)],
+         "button_type": ["cta", "navigation", "feature"][rng.integers(3)], "page_variant": variants[rng.integers(5)],
+         "hover_duration": float(rng.integers(50, 5000)), "total_engagement": float(rng.integers(100, 10000))}
+        for _ in range(30_000)
+    ]
+    rows = compute_metric_rows({"events": events})
+    started = time.perf_counter()
+    result = compare_variants(rows)
+    assert time.perf_counter() - started < 1.0
+    assert result["bootstrap_resamples"] * len(rows) >= 50_000
+    assert all(len(entry["variants"]) == 5 for entry in result["button_types"].values())
+
+def test_constant_durations_give_a_zero_width_interval():
+    # Clicks without total_engagement and hovers of identical length: every event lands in one bucket
+    events = [{"event_name": "button_hover_start", "button_type": "cta", "page_variant": variant,
+               "hover_duration": 500} for variant in ("original", "colors") for _ in range(200)]
+    events += [{"event_name": "cta_click", "button_type": "cta", "page_variant": "colors"} for _ in range(150)]
+    cta = compare_variants(compute_metric_rows({"events": events}))["button_types"]["cta"]
+
+    hover = cta["hover_duration"]["colors"]
+    assert hover["ci_low"] == pytest.approx(hover["mean"]) and hover["ci_high"] == pytest.approx(hover["mean"])
+    assert hover["diff_vs_control"]["ci_low"] == pytest.approx(0, abs=1e-9)
+    assert hover["diff_vs_control"]["ci_high"] == pytest.approx(0, abs=1e-9)
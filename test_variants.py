@@ -0,0 +1,69 @@
+"""
+Tests for the variant registry and its pre-rendered pages
+"""
+
+import gzip
+import os
+from email.utils import formatdate
+
+import pytest
+from flask import Flask
+
+import app as app_module
+import variants
+from variants import DASHBOARD, VARIANTS, PageVariant, PrerenderedPages
+
+@pytest.fixture
+def client():
+    app_module.pages.invalidate()
+    with app_module.app.test_client() as client:
+        yield client
+    app_module.pages.invalidate()
+
+def test_every_registered_page_is_served(client):
+    for page in VARIANTS + (DASHBOARD,):
+        response = client.get(page.path)
+        assert response.status_code == 200 and response.mimetype == 'text/html'
+        assert f"window.pageVariant = '{page.name}'" in response.get_data(as_text=True)
+
+def test_conditional_get_and_gzip(client):
+    response = client.get('/colors', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'Color Variation' in gzip.decompress(response.data)
+    assert client.get('/colors', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+def test_last_modified_is_the_newest_source_mtime(client):
+    response = client.get('/colors')
+    assert response.headers['Last-Modified'] == formatdate(app_module.pages.version(), usegmt=True)
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    monkeypatch.setattr(variants, 'VERSION_CHECK_SECONDS', 0)
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "page.html").write_text("{{ page_variant }} v1 {{ url_for('dark') }}")
+    app = Flask(__name__, root_path=str(tmp_path))
+    renders = []
+
+    def context(page):
+        renders.append(page.name)
+        return {'page_variant': page.name}
+
+    pages = PrerenderedPages(app, context, pages=[PageVariant('dark', '/dark', 'page.html', 'dark')])
+    return app, tmp_path / "templates" / "page.html", renders
+
+def test_new_variant_needs_only_a_registry_entry(site):
+    app, _, renders = site
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get('/dark').get_data(as_text=True) == "dark v1 /dark"
+    assert renders == ['dark']
+
+def test_template_change_rerenders(site):
+    app, template, renders = site
+    client = app.test_client()
+    assert client.get('/dark').get_data(as_text=True).startswith("dark v1")
+    template.write_text("{{ page_variant }} v2")
+    stat = os.stat(template)
+    os.utime(template, (stat.st_atime, stat.st_mtime + 10))
+    assert client.get('/dark').get_data(as_text=True) == "dark v2"
+    assert renders == ['dark', 'dark']
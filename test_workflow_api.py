@@ -0,0 +1,77 @@
+"""
+Tests for the non-blocking workflow start and status endpoints
+"""
+
+import threading
+
+import pytest
+from temporalio.service import RPCError, RPCStatusCode
+
+import app as app_module
+import workflow_trigger
+from workflow_trigger import TemporalClientRunner, get_workflow_status, start_button_analysis
+
+class FakeRunner:
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def run(self, fn, *args, timeout=30.0):
+        self.calls.append((fn, args))
+        result = self.results[fn]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+@pytest.fixture
+def client():
+    with app_module.app.test_client() as client:
+        yield client
+
+def test_analyze_returns_workflow_id_immediately(client, monkeypatch):
+    runner = FakeRunner({start_button_analysis: "button-analytics-1"})
+    monkeypatch.setattr(app_module, 'get_temporal_runner', lambda: runner)
+
+    response = client.post('/api/analyze-buttons', json={"days_back": 14})
+    assert response.status_code == 202
+    assert response.json["workflow_id"] == "button-analytics-1"
+    assert response.json["status_url"] == "/api/workflows/button-analytics-1"
+    assert runner.calls == [(start_button_analysis, (app_module.GA4_MEASUREMENT_ID, 14))]
+
+def test_workflow_status(client, monkeypatch):
+    status = {"workflow_id": "wf", "status": "RUNNING", "progress": {"steps": {"fetch": "running"}}}
+    monkeypatch.setattr(app_module, 'get_temporal_runner', lambda: FakeRunner({get_workflow_status: status}))
+    response = client.get('/api/workflows/wf')
+    assert response.status_code == 200
+    assert response.json == status
+
+def test_unknown_workflow_is_404(client, monkeypatch):
+    error = RPCError("not found", RPCStatusCode.NOT_FOUND, b"")
+    monkeypatch.setattr(app_module, 'get_temporal_runner', lambda: FakeRunner({get_workflow_status: error}))
+    assert client.get('/api/workflows/missing').status_code == 404
+
+def test_runner_connects_once_for_concurrent_callers(monkeypatch):
+    connects = []
+
+    async def fake_connect(target_host, **kwargs):
+        connects.append(target_host)
+        return object()
+
+    monkeypatch.setattr(workflow_trigger.Client, 'connect', fake_connect)
+    runner = TemporalClientRunner("temporal:7233")
+
+    async def client_id(client):
+        return id(client)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(runner.run(client_id))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert connects == ["temporal:7233"]
+    assert len(set(results)) == 1 and len(results) == 20
+
+def test_workflow_ids_are_unique():
+    assert len({workflow_trigger.new_workflow_id() for _ in range(100)}) == 100
@@ -0,0 +1,100 @@
+"""
+Landing page variants and their pre-rendered pages
+A page's HTML only depends on its variant and the GA4 measurement id, so each
+one is rendered once (at startup, and again when a template or static asset
+changes) and served from memory through response_cache: gzip-precompressed,
+with an ETag so repeat views are a 304. Adding a variant is one entry in
+VARIANTS plus its template (and stylesheet); no route function needed.
+Each variant has its own path; `/` picks one per visitor (see assignment.py)
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from flask import Flask, render_template
+
+from response_cache import VersionedBodyCache, send_cached
+
+# How often templates and assets are checked for changes
+VERSION_CHECK_SECONDS = 1.0
+
+@dataclass(frozen=True)
+class PageVariant:
+    """A page: `name` is the page_variant reported to GA4, `endpoint` the url_for name"""
+    name: str
+    path: str
+    template: str
+    endpoint: str
+
+VARIANTS: Tuple[PageVariant, ...] = (
+    PageVariant('original', '/original', 'index.html', 'home'),
+    PageVariant('colors', '/colors', 'colors.html', 'colors'),
+    PageVariant('sizes', '/sizes', 'sizes.html', 'sizes'),
+    PageVariant('spacing', '/spacing', 'spacing.html', 'spacing'),
+    PageVariant('typography', '/typography', 'typography.html', 'typography'),
+)
+DASHBOARD = PageVariant('analytics', '/analytics', 'analytics.html', 'analytics_dashboard')
+
+def variant_names() -> Tuple[str, ...]:
+    return tuple(variant.name for variant in VARIANTS)
+
+class PrerenderedPages:
+    """Registers a route per page and serves its HTML from a VersionedBodyCache"""
+
+    def __init__(self, app: Flask, context_fn: Callable[[PageVariant], Dict[str, Any]],
+                 pages: Iterable[PageVariant] = VARIANTS + (DASHBOARD,),
+                 extra_version_fn: Callable[[], float] = lambda: 0.0):
+        self.app = app
+        self.context_fn = context_fn
+        self.pages = tuple(pages)
+        self.extra_version_fn = extra_version_fn
+        self._lock = threading.Lock()
+        self._version: Optional[float] = None
+        self._checked_at = 0.0
+        self.caches = {page.endpoint: self._cache(page) for page in self.pages}
+        for page in self.pages:
+            app.add_url_rule(page.path, page.endpoint, self._view(page))
+
+    def _cache(self, page: PageVariant) -> VersionedBodyCache:
+        # Last-Modified is the newest template/asset mtime, the same in every worker
+        return VersionedBodyCache(self.version, lambda: (self.render(page), self.version()), name='pages',
+                                  encode=str.encode)
+
+    def _view(self, page: PageVariant):
+        cache = self.caches[page.endpoint]
+
+        def view():
+            return send_cached(cache.get(), 'text/html')
+        view.__doc__ = f"Pre-rendered {page.name} page"
+        return view
+
+    def render(self, page: PageVariant) -> str:
+        with self.app.test_request_context(page.path):
+            return render_template(page.template, **self.context_fn(page))
+
+    def version(self) -> float:
+        """Newest mtime of the templates and assets, re-read at most every VERSION_CHECK_SECONDS"""
+        now = time.monotonic()
+        if self._version is None or now - self._checked_at >= VERSION_CHECK_SECONDS:
+            with self._lock:
+                self._checked_at = now
+                templates = os.path.join(self.app.root_path, self.app.template_folder)
+                mtimes = [os.path.getmtime(os.path.join(templates, name)) for name in os.listdir(templates)]
+                version = max(mtimes + [self.extra_version_fn()])
+                if self._version is not None and version != self._version and self.app.jinja_env.cache:
+                    # Outside debug mode Jinja keeps compiled templates; drop them so the change shows
+                    self.app.jinja_env.cache.clear()
+                self._version = version
+        return self._version
+
+    def invalidate(self):
+        for cache in self.caches.values():
+            cache.invalidate()
+
+    def warm(self):
+        """Render every page now, e.g. before the server starts taking requests"""
+        for cache in self.caches.values():
+            cache.get()
@@ -3,33 +3,171 @@ Workflow Trigger for Button Analytics
 This script triggers the Temporal workflow to analyze button performance
 """
 
+import argparse
 import asyncio
+import contextvars
 import json
-from datetime import datetime
-from temporalio.client import Client
-from temporal_workflows import ButtonAnalyticsWorkflow
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from temporalio.client import (
+    Client,
+    Schedule,
+    ScheduleActionStartWorkflow,
+    ScheduleAlreadyRunningError,
+    ScheduleCalendarSpec,
+    ScheduleOverlapPolicy,
+    SchedulePolicy,
+    ScheduleRange,
+    ScheduleSpec,
+    ScheduleUpdate,
+    WorkflowExecutionStatus,
+    WorkflowFailureError
+)
+from temporalio.common import WorkflowIDReusePolicy
+from temporalio.exceptions import WorkflowAlreadyStartedError
+from data_converter import create_data_converter
+from instrumentation import client_interceptors
+from profiling import PROFILE_MEMO_KEY, requested_activities
+from temporal_workflows import ButtonAnalysisInput, ButtonAnalyticsWorkflow, MultiPropertyAnalyticsWorkflow
 
-async def trigger_button_analysis(property_id: str = "G-JHSVNWL6QH", days_back: int = 7):
-    """Trigger the button analytics workflow"""
+TEMPORAL_ADDRESS = os.environ.get('TEMPORAL_ADDRESS', 'localhost:7233')
+TASK_QUEUE = "button-analytics"
+
+async def connect_client(target_host: str = TEMPORAL_ADDRESS) -> Client:
+    """Temporal client using the data converter shared with the worker (see data_converter.py)"""
+    return await Client.connect(target_host, data_converter=create_data_converter(),
+                                interceptors=client_interceptors())
+
+class TemporalClientRunner:
+    """Process-wide Temporal client for synchronous callers such as Flask views
+
+    The client lives on a dedicated event loop thread and is connected once, on
+    first use; request threads submit coroutines to it and wait only for the
+    short start/describe calls, never for a whole workflow run.
+    """
+
+    def __init__(self, target_host: str = TEMPORAL_ADDRESS):
+        self.target_host = target_host
+        self._client: Optional[Client] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="temporal-client", daemon=True)
+        self._thread.start()
+
+    async def _get_client(self) -> Client:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._client is None:
+                self._client = await connect_client(self.target_host)
+        return self._client
+
+    async def _call(self, context: contextvars.Context, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        # Carry the caller's context variables (e.g. the request's trace span) onto the loop thread
+        for var, value in context.items():
+            var.set(value)
+        return await fn(await self._get_client(), *args)
+
+    def run(self, fn: Callable[..., Awaitable[Any]], *args: Any, timeout: float = 30.0) -> Any:
+        """Run fn(client, *args) on the client loop and wait for its result"""
+        call = self._call(contextvars.copy_context(), fn, *args)
+        return asyncio.run_coroutine_threadsafe(call, self._loop).result(timeout)
+
+_runner: Optional[TemporalClientRunner] = None
+_runner_lock = threading.Lock()
+
+def get_temporal_runner() -> TemporalClientRunner:
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = TemporalClientRunner()
+    return _runner
+
+def new_workflow_id(prefix: str = "button-analytics") -> str:
+    """Unique workflow id; the timestamp keeps ids sortable, the suffix avoids collisions"""
+    return f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+def profile_memo(profile: Any = None) -> Optional[Dict[str, Any]]:
+    """Workflow memo asking the worker to profile activities: True for the default set, or activity names"""
+    activities = requested_activities(profile)
+    return {PROFILE_MEMO_KEY: activities} if activities else None
+
+async def start_button_analysis(client: Client, property_id: str, days_back: int = 7, profile: Any = None) -> str:
+    """Start the button analytics workflow without waiting for it; returns the workflow id"""
+    handle = await client.start_workflow(
+        ButtonAnalyticsWorkflow.run,
+        ButtonAnalysisInput(property_id, days_back),
+        id=new_workflow_id(),
+        task_queue=TASK_QUEUE,
+        memo=profile_memo(profile)
+    )
+    return handle.id
+
+async def start_batch_analysis(client: Client, property_ids: List[str], days_back: int = 7,
+                               max_concurrent: int = 4) -> str:
+    """Start one batch workflow analyzing every property (max_concurrent at a time); returns its id"""
+    handle = await client.start_workflow(
+        MultiPropertyAnalyticsWorkflow.run,
+        args=[property_ids, days_back, max_concurrent],
+        id=new_workflow_id("button-analytics-batch"),
+        task_queue=TASK_QUEUE
+    )
+    return handle.id
+
+async def get_workflow_status(client: Client, workflow_id: str) -> Dict[str, Any]:
+    """Status, per-step progress and (once finished) result or error of a workflow run"""
+    handle = client.get_workflow_handle(workflow_id)
+    description = await handle.describe()
+    status = description.status
+
+    info: Dict[str, Any] = {
+        "workflow_id": workflow_id,
+        "status": status.name if status else "UNKNOWN",
+        "start_time": description.start_time.isoformat() if description.start_time else None,
+        "close_time": description.close_time.isoformat() if description.close_time else None
+    }
+
+    try:
+        info["progress"] = await handle.query(ButtonAnalyticsWorkflow.progress)
+    except Exception:
+        # Queries need a running worker; status is still useful without progress
+        info["progress"] = None
+
+    if status == WorkflowExecutionStatus.COMPLETED:
+        info["result"] = await handle.result()
+    elif status is not None and status != WorkflowExecutionStatus.RUNNING:
+        try:
+            await handle.result()
+        except WorkflowFailureError as e:
+            info["error"] = str(e.cause or e)
+    return info
+
+async def trigger_button_analysis(property_id: str = "G-JHSVNWL6QH", days_back: int = 7, profile: Any = None):
+    """Trigger the button analytics workflow; `profile` profiles activities on the worker (see profiling.py)"""
     
     print(f"🚀 Starting button analytics workflow for property: {property_id}")
     print(f"📅 Analyzing data from the last {days_back} days")
     
     try:
         # Connect to Temporal server
-        client = await Client.connect("localhost:7233")
+        client = await connect_client()
         
         # Start the workflow
-        workflow_id = f"button-analytics-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        workflow_id = new_workflow_id()
         
         print(f"🔄 Starting workflow: {workflow_id}")
         
         # Execute the workflow
         result = await client.execute_workflow(
             ButtonAnalyticsWorkflow.run,
-            args=[property_id, days_back],
+            ButtonAnalysisInput(property_id, days_back),
             id=workflow_id,
-            task_queue="button-analytics"
+            task_queue=TASK_QUEUE,
+            memo=profile_memo(profile)
         )
         
         print("✅ Workflow completed successfully!")
@@ -41,31 +179,97 @@ async def trigger_button_analysis(property_id: str = "G-JHSVNWL6QH", days_back:
         print(f"❌ Error running workflow: {e}")
         return {"error": str(e)}
 
-async def schedule_recurring_analysis(property_id: str = "G-JHSVNWL6QH"):
-    """Schedule recurring button analysis (daily)"""
+SCHEDULE_ID = "button-analytics-daily"
+
+# Overlap policies offered for the recurring schedule: "skip" drops a run while one is
+# still going, "buffer_one" queues at most one run behind it; neither lets runs pile up
+OVERLAP_POLICIES = {
+    "skip": ScheduleOverlapPolicy.SKIP,
+    "buffer_one": ScheduleOverlapPolicy.BUFFER_ONE
+}
+
+def build_analysis_schedule(property_id: str, days_back: int = 1, hour_utc: int = 6,
+                            overlap: str = "skip") -> Schedule:
+    """Daily schedule that starts ButtonAnalyticsWorkflow at hour_utc:00 UTC"""
+    return Schedule(
+        action=ScheduleActionStartWorkflow(
+            ButtonAnalyticsWorkflow.run,
+            ButtonAnalysisInput(property_id, days_back),
+            # Temporal appends the scheduled time, so every run gets its own id
+            id=f"scheduled-button-analytics-{property_id}",
+            task_queue=TASK_QUEUE
+        ),
+        spec=ScheduleSpec(calendars=[ScheduleCalendarSpec(hour=[ScheduleRange(hour_utc)])]),
+        policy=SchedulePolicy(overlap=OVERLAP_POLICIES[overlap], catchup_window=timedelta(hours=12))
+    )
+
+async def schedule_recurring_analysis(property_id: str = "G-JHSVNWL6QH", days_back: int = 1, hour_utc: int = 6,
+                                      overlap: str = "skip", client: Optional[Client] = None) -> str:
+    """Create (or update) the daily Temporal Schedule for button analysis; returns the schedule id"""
     
     print("⏰ Setting up recurring button analysis...")
-    
+    client = client or await connect_client()
+    schedule = build_analysis_schedule(property_id, days_back, hour_utc, overlap)
+    schedule_id = f"{SCHEDULE_ID}-{property_id}"
+
     try:
-        client = await Client.connect("localhost:7233")
-        
-        # Schedule daily analysis
-        workflow_id = f"recurring-button-analysis-{datetime.now().strftime('%Y%m%d')}"
-        
-        # Start recurring workflow
-        result = await client.execute_workflow(
-            ButtonAnalyticsWorkflow.run,
-            args=[property_id, 1],  # Analyze last 1 day
-            id=workflow_id,
-            task_queue="button-analytics"
-        )
-        
-        print("✅ Recurring analysis scheduled!")
-        return result
-        
-    except Exception as e:
-        print(f"❌ Error scheduling recurring analysis: {e}")
-        return {"error": str(e)}
+        await client.create_schedule(schedule_id, schedule)
+        print(f"✅ Schedule {schedule_id} created: daily at {hour_utc:02d}:00 UTC, overlap={overlap}")
+    except ScheduleAlreadyRunningError:
+        await client.get_schedule_handle(schedule_id).update(lambda _: ScheduleUpdate(schedule=schedule))
+        print(f"✅ Schedule {schedule_id} updated: daily at {hour_utc:02d}:00 UTC, overlap={overlap}")
+    return schedule_id
+
+def backfill_days(start_day: str, end_day: str) -> List[str]:
+    """Inclusive list of YYYY-MM-DD days"""
+    first = datetime.strptime(start_day, "%Y-%m-%d")
+    last = datetime.strptime(end_day, "%Y-%m-%d")
+    return [(first + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((last - first).days + 1)]
+
+async def backfill_analysis(client: Client, property_id: str, start_day: str, end_day: str,
+                            max_concurrent: int = 4) -> Dict[str, Any]:
+    """Analyze every day in [start_day, end_day], at most max_concurrent workflows at a time
+
+    Each day runs under a fixed workflow id, so re-running a backfill waits on (or
+    returns) days that are already running or done instead of analyzing them twice.
+    Backfilled runs are stored at the day they analyze, send no notification and
+    never replace the latest run the dashboard and landing allocation read.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+
+    async def run_day(day: str) -> Any:
+        async with semaphore:
+            workflow_id = f"button-analytics-backfill-{property_id}-{day}"
+            try:
+                handle = await client.start_workflow(
+                    ButtonAnalyticsWorkflow.run,
+                    ButtonAnalysisInput(property_id, days_back=0, max_concurrent_partitions=1,
+                                        end_date=day, backfill=True),
+                    id=workflow_id,
+                    task_queue=TASK_QUEUE,
+                    id_reuse_policy=WorkflowIDReusePolicy.ALLOW_DUPLICATE_FAILED_ONLY
+                )
+            except WorkflowAlreadyStartedError:
+                handle = client.get_workflow_handle(workflow_id)
+            try:
+                return await handle.result()
+            except WorkflowFailureError as e:
+                return {"status": "failed", "error": str(e.cause or e)}
+
+    days = backfill_days(start_day, end_day)
+    results = await asyncio.gather(*(run_day(day) for day in days))
+    return dict(zip(days, results))
+
+async def run_batch(property_ids: List[str], days_back: int, max_concurrent: int) -> Dict[str, Any]:
+    print(f"🏬 Analyzing {len(property_ids)} properties ({max_concurrent} at a time)...")
+    client = await connect_client()
+    workflow_id = await start_batch_analysis(client, property_ids, days_back, max_concurrent)
+    print(f"🔄 Started batch workflow: {workflow_id}")
+    result = await client.get_workflow_handle(workflow_id).result()
+    failed = result["failed_properties"]
+    print(f"✅ {result['properties_analyzed']} properties analyzed"
+          + (f", ❌ failed: {', '.join(failed)}" if failed else ""))
+    return result
 
 def run_analysis_now():
     """Run analysis immediately (synchronous wrapper)"""
@@ -75,12 +279,47 @@ def schedule_daily_analysis():
     """Schedule daily analysis (synchronous wrapper)"""
     return asyncio.run(schedule_recurring_analysis())
 
+async def run_backfill(property_id: str, start_day: str, end_day: str, max_concurrent: int):
+    print(f"🗓️ Backfilling {property_id} from {start_day} to {end_day} ({max_concurrent} at a time)...")
+    client = await connect_client()
+    results = await backfill_analysis(client, property_id, start_day, end_day, max_concurrent)
+    failed = [day for day, result in results.items() if result.get("status") == "failed"]
+    print(f"✅ {len(results) - len(failed)} days analyzed" + (f", ❌ failed: {', '.join(failed)}" if failed else ""))
+    return results
+
 if __name__ == "__main__":
-    # Run immediate analysis
-    print("🎯 Running immediate button analysis...")
-    result = run_analysis_now()
-    
-    if "error" not in result:
-        print("\n📈 Analysis completed! Check button_insights.json for detailed results.")
+    parser = argparse.ArgumentParser(description="Button analytics workflows")
+    parser.add_argument("--property", default="G-JHSVNWL6QH")
+    commands = parser.add_subparsers(dest="command")
+    run_parser = commands.add_parser("run", help="run one analysis now (default)")
+    run_parser.add_argument("--profile", nargs="?", const=True, default=None, metavar="ACTIVITIES",
+                            help="profile activities on the worker (comma-separated, default: metrics and insights)")
+    schedule_parser = commands.add_parser("schedule", help="create or update the daily schedule")
+    schedule_parser.add_argument("--hour", type=int, default=6, help="hour of day (UTC)")
+    schedule_parser.add_argument("--days-back", type=int, default=1)
+    schedule_parser.add_argument("--overlap", choices=sorted(OVERLAP_POLICIES), default="skip")
+    backfill_parser = commands.add_parser("backfill", help="analyze historical days in parallel")
+    backfill_parser.add_argument("start", help="first day (YYYY-MM-DD)")
+    backfill_parser.add_argument("end", help="last day (YYYY-MM-DD)")
+    backfill_parser.add_argument("--concurrency", type=int, default=4)
+    batch_parser = commands.add_parser("batch", help="analyze several properties in one batch workflow")
+    batch_parser.add_argument("properties", nargs="+", metavar="PROPERTY")
+    batch_parser.add_argument("--days-back", type=int, default=7)
+    batch_parser.add_argument("--concurrency", type=int, default=4, help="properties analyzed at a time")
+    cli = parser.parse_args()
+
+    if cli.command == "schedule":
+        asyncio.run(schedule_recurring_analysis(cli.property, cli.days_back, cli.hour, cli.overlap))
+    elif cli.command == "backfill":
+        asyncio.run(run_backfill(cli.property, cli.start, cli.end, cli.concurrency))
+    elif cli.command == "batch":
+        asyncio.run(run_batch(cli.properties, cli.days_back, cli.concurrency))
     else:
-        print(f"\n❌ Analysis failed: {result['error']}")
+        # Run immediate analysis
+        print("🎯 Running immediate button analysis...")
+        result = asyncio.run(trigger_button_analysis(cli.property, profile=getattr(cli, "profile", None)))
+
+        if "error" not in result:
+            print("\n📈 Analysis completed! Check button_insights.json for detailed results.")
+        else:
+            print(f"\n❌ Analysis failed: {result['error']}")